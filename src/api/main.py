@@ -1,11 +1,198 @@
-from fastapi import FastAPI
-from typing import Union
+import asyncio
+import contextlib
+import os
+import sys
+from typing import Optional
+from urllib.parse import urlsplit
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+# The provider modules import each other by bare name from their directory
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "providers", "manga")
+)
+
+from http_client import RequestError, get_async_client  # noqa: E402
+from image_fetch import BlockedAddress, image_headers, open_image  # noqa: E402
+from image_store import StoredImage, get_image_store  # noqa: E402
+from transcoder import Variant, get_transcoder  # noqa: E402
 
 app = FastAPI()
 
+# Client headers passed on to the image host, and upstream headers passed back
+FORWARDED_REQUEST_HEADERS = ("Range", "If-Range", "If-None-Match", "If-Modified-Since")
+FORWARDED_RESPONSE_HEADERS = (
+    "Content-Type",
+    "Content-Length",
+    "Content-Range",
+    "Accept-Ranges",
+    "Cache-Control",
+    "Expires",
+    "ETag",
+    "Last-Modified",
+)
+IMAGE_CHUNK_SIZE = 64 * 1024
+# (connect, read) seconds; a read timeout lets large images take their time
+IMAGE_TIMEOUT = (10.0, 30.0)
+
+image_client = get_async_client()
+
+
 @app.get("/")
 def read_root():
     return {"Hello": "World"}
 
 
-# Working on it!
\ No newline at end of file
+async def _stored_file(entry: Optional[StoredImage]) -> Optional[FileResponse]:
+    if entry is None:
+        return None
+    try:
+        stat_result = await asyncio.to_thread(os.stat, entry.path)
+    except FileNotFoundError:
+        # Another request's commit evicted it after store.get(); the caller
+        # fetches upstream instead
+        return None
+    return FileResponse(
+        entry.path,
+        stat_result=stat_result,
+        media_type=entry.content_type,
+        headers={"Cache-Control": entry.cache_control} if entry.cache_control else None,
+    )
+
+
+async def _transcoded(url: str, referer: Optional[str], format: str, width: Optional[int]):
+    transcoder = get_transcoder()
+    if transcoder is None:
+        raise HTTPException(status_code=501, detail="Image transcoding is not configured")
+    try:
+        variant = Variant(format, width)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        entry = await transcoder.variant_async(
+            url, variant, {"Referer": referer} if referer else None, public_only=True
+        )
+    except BlockedAddress as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except RequestError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except OSError as e:
+        raise HTTPException(status_code=502, detail=f"Could not transcode {url}: {e}")
+    response = await _stored_file(entry)
+    if response is None:
+        raise HTTPException(status_code=503, detail="Transcoded image was evicted, retry")
+    return response
+
+
+@app.get("/image")
+async def image(
+    request: Request,
+    url: str,
+    referer: Optional[str] = None,
+    format: Optional[str] = None,
+    width: Optional[int] = None,
+):
+    """
+    Streams the image at `url` to the client, requesting it with `referer`
+    (the Referer of a page's headerForImage) so hot-link protected hosts
+    serve it. Range and conditional requests are passed through, and the
+    upstream status, length and caching headers come back unchanged.
+
+    Only images on public hosts are fetched: URLs (and redirects) leading
+    to loopback, private or link-local addresses are refused with 403.
+
+    With an image store configured, stored images are served from disk
+    (ranges included) and complete 200 image responses are added to the
+    store while they are relayed, unless marked no-store or private.
+
+    `format` (webp, avif, jpeg, png) and/or `width` ask for a re-encoded
+    variant from the transcoder instead; `width` alone means WebP.
+    """
+    if urlsplit(url).scheme not in ("http", "https"):
+        raise HTTPException(status_code=400, detail="url must be an http(s) URL")
+
+    if format or width:
+        return await _transcoded(url, referer, format or "webp", width)
+
+    store = get_image_store()
+    response = await _stored_file(store.get(url) if store is not None else None)
+    if response is not None:
+        return response
+
+    headers = image_headers({"Referer": referer} if referer else None)
+    for name in FORWARDED_REQUEST_HEADERS:
+        value = request.headers.get(name)
+        if value:
+            headers[name] = value
+
+    # The upstream response stays open until the body has been relayed
+    stack = contextlib.AsyncExitStack()
+    try:
+        upstream = await stack.enter_async_context(
+            open_image(image_client, url, headers, IMAGE_TIMEOUT, public_only=True)
+        )
+    except BlockedAddress as e:
+        await stack.aclose()
+        raise HTTPException(status_code=403, detail=str(e))
+    except RequestError as e:
+        await stack.aclose()
+        raise HTTPException(status_code=502, detail=str(e))
+
+    response_headers = {
+        name: upstream.headers[name]
+        for name in FORWARDED_RESPONSE_HEADERS
+        if name in upstream.headers
+    }
+    if "Content-Encoding" in upstream.headers:
+        # The body arrives decoded, so the upstream length no longer holds
+        response_headers.pop("Content-Length", None)
+
+    content_type = upstream.headers.get("Content-Type")
+    cache_control = upstream.headers.get("Cache-Control")
+    writer = None
+    if (
+        store is not None
+        and upstream.status_code == 200
+        and "Range" not in headers
+        and store.accepts(content_type, cache_control)
+    ):
+        with contextlib.suppress(OSError):
+            writer = await asyncio.to_thread(store.writer, url, content_type, cache_control)
+
+    async def body():
+        nonlocal writer
+        try:
+            async for chunk in upstream.iter_chunks(IMAGE_CHUNK_SIZE):
+                yield chunk
+                if writer is not None:
+                    try:
+                        await asyncio.to_thread(writer.write, chunk)
+                    except OSError:
+                        writer.abort()
+                        writer = None
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+        finally:
+            await stack.aclose()
+        if writer is not None:
+            # A store that can't take the image doesn't fail the response
+            with contextlib.suppress(OSError):
+                await asyncio.to_thread(writer.commit)
+
+    async def release():
+        await stack.aclose()
+        if writer is not None:
+            # No-op once committed
+            writer.abort()
+
+    return StreamingResponse(
+        body(),
+        status_code=upstream.status_code,
+        headers=response_headers,
+        # Also releases the upstream when the body is never iterated
+        background=BackgroundTask(release),
+    )
@@ -1,101 +1,101 @@
-import requests
-from bs4 import BeautifulSoup
 from typing import List, Dict, Optional, Union
+import soupsieve as sv
+from provider import MangaProvider
 
 
-class AsuraScans:
+class AsuraScans(MangaProvider):
+    TITLE = sv.compile(".text-white.cursor-pointer.text-sm.shrink-0")
+    IMAGE = sv.compile("img.rounded.mx-auto")
+    IMAGES = sv.compile("img")
+    DESCRIPTION = sv.compile('meta[name="description"]')
+    DETAILS = sv.compile("div.px-2.py-2.flex.items-center.justify-between h3")
+    SERIALIZATION = sv.compile(
+        r".grid.grid-cols-1.md\:grid-cols-2.gap-5.mt-8 > div:nth-child(1) > h3"
+    )
+    AUTHORS = sv.compile(".grid.grid-cols-1.gap-5.mt-8 div:nth-child(2) h3:nth-child(2)")
+    ARTIST = sv.compile(".grid.grid-cols-1.gap-5.mt-8 div:nth-child(3) h3:nth-child(2)")
+    GENRES = sv.compile('button[class*="bg-themecolor"]')
+    CHAPTERS = sv.compile('div[class*="border rounded-md group"] h3.text-sm.text-white a')
+    CHAPTER_TITLE = sv.compile("h3.text-sm.text-white.font-medium a span")
+    SERIES_CARDS = sv.compile(".grid.grid-cols-2.gap-3.p-4 > a")
+    RELATED_TITLE = sv.compile("div > h2.font-bold")
+    RELATED_IMAGE = sv.compile("div > div > img")
+    RELATED_LATEST = sv.compile("div > h2:nth-child(3)")
+    RELATED_STATUS = sv.compile("div > div:nth-child(1) > span")
+    RELATED_RATING = sv.compile("div > div.block > span > label")
+    PAGES = sv.compile(".w-full.mx-auto.center > img")
+    SEARCH_TITLE = sv.compile("div > div > div:nth-child(2) > span:nth-child(1)")
+    SEARCH_IMAGE = sv.compile("div > div > div:nth-child(1) > img")
+    SEARCH_STATUS = sv.compile("div > div > div:nth-child(1) > span")
+    SEARCH_LATEST = sv.compile("div > div > div:nth-child(2) > span:nth-child(2)")
+    SEARCH_RATING = sv.compile("div > div > div:nth-child(2) > span:nth-child(3) > label")
+    PAGINATION = sv.compile(".flex.items-center.justify-center > a")
+
     def __init__(self):
+        super().__init__()
         self.name = "AsuraScans"
         self.base_url = "https://asuracomic.net"
         self.logo = "https://asuracomic.net/images/logo.png"
         self.class_path = "MANGA.AsuraScans"
 
-    def fetch_manga_info(self, manga_id: str) -> Dict:
+    async def fetch_manga_info_async(self, manga_id: str) -> Dict:
         try:
-            response = requests.get(f"{self.base_url}/series/{manga_id}")
-            soup = BeautifulSoup(response.text, "html.parser")
+            response = await self.client.get(f"{self.base_url}/series/{manga_id}")
+            soup = self.parse_html(response.text)
+
+            details = self.DETAILS.select(soup)
+            authors = self.AUTHORS.select_one(soup)
+            # Every chapter row shows the series title, so read it once
+            chapter_title = self.CHAPTER_TITLE.select_one(soup)
 
             info = {
                 "id": manga_id,
-                "title": soup.select_one(
-                    ".text-white.cursor-pointer.text-sm.shrink-0"
-                ).text.strip(),
-                "image": soup.select_one("img.rounded.mx-auto")["src"].strip(),
-                "cover": soup.select("img")[2]["src"].strip(),
-                "description": soup.select_one('meta[name="description"]')[
-                    "content"
-                ].strip(),
-                "status": (
-                    soup.select("div.px-2.py-2.flex.items-center.justify-between h3")[
-                        1
-                    ].text.strip()
-                ),
-                "serialization": (
-                    soup.select(
-                        ".grid.grid-cols-1.md\:grid-cols-2.gap-5.mt-8 > div:nth-child(1) > h3"
-                    )[-1].text.strip()
-                ),
+                "title": self.TITLE.select_one(soup).text.strip(),
+                "image": self.IMAGE.select_one(soup)["src"].strip(),
+                "cover": self.IMAGES.select(soup, limit=3)[2]["src"].strip(),
+                "description": self.DESCRIPTION.select_one(soup)["content"].strip(),
+                "status": details[1].text.strip(),
+                "serialization": self.SERIALIZATION.select(soup)[-1].text.strip(),
                 "authors": [
                     author.strip()
                     for author in (
-                        soup.select_one(
-                            ".grid.grid-cols-1.gap-5.mt-8 div:nth-child(2) h3:nth-child(2)"
-                        )
-                        .text.strip()
-                        .split("/")
-                        if soup.select_one(
-                            ".grid.grid-cols-1.gap-5.mt-8 div:nth-child(2) h3:nth-child(2)"
-                        )
-                        else []
+                        authors.text.strip().split("/") if authors else []
                     )
                 ],
-                "type": (
-                    soup.select("div.px-2.py-2.flex.items-center.justify-between h3")[
-                        -1
-                    ].text.strip()
-                ),
-                "artist": (
-                    soup.select_one(
-                        ".grid.grid-cols-1.gap-5.mt-8 div:nth-child(3) h3:nth-child(2)"
-                    ).text.strip()
-                ),
+                "type": details[-1].text.strip(),
+                "artist": self.ARTIST.select_one(soup).text.strip(),
                 "genres": [
-                    genre.text.strip()
-                    for genre in soup.select('button[class*="bg-themecolor"]')
+                    genre.text.strip() for genre in self.GENRES.select(soup)
                 ],
                 "chapters": [
                     {
                         "id": chapter["href"].split("/")[-1],
-                        "title": soup.select_one(
-                            "h3.text-sm.text-white.font-medium a span"
-                        ).text.strip(),
+                        "title": chapter_title.text.strip(),
                         "chapter": chapter.text.replace("Chapter", "")
                         .strip()
                         .split()[0],
                         "date": chapter.find_next("h3", class_="text-xs").text.strip(),
                     }
-                    for chapter in soup.select(
-                        'div[class*="border rounded-md group"] h3.text-sm.text-white a'
-                    )
+                    for chapter in self.CHAPTERS.select(soup)
                 ],
                 "related_series": [
                     {
                         "id": related_series["href"].split("/")[-1],
-                        "title": related_series.select_one(
-                            "div > h2.font-bold"
+                        "title": self.RELATED_TITLE.select_one(
+                            related_series
                         ).text.strip(),
-                        "image": related_series.select_one("div > div > img")["src"],
-                        "latestChapter": related_series.select_one(
-                            "div > h2:nth-child(3)"
+                        "image": self.RELATED_IMAGE.select_one(related_series)["src"],
+                        "latestChapter": self.RELATED_LATEST.select_one(
+                            related_series
                         ).text.strip(),
-                        "status": related_series.select_one(
-                            "div > div:nth-child(1) > span"
+                        "status": self.RELATED_STATUS.select_one(
+                            related_series
                         ).text.strip(),
-                        "rating": related_series.select_one(
-                            "div > div.block > span > label"
+                        "rating": self.RELATED_RATING.select_one(
+                            related_series
                         ).text.strip(),
                     }
-                    for related_series in soup.select(".grid.grid-cols-2.gap-3.p-4 > a")
+                    for related_series in self.SERIES_CARDS.select(soup)
                 ],
             }
 
@@ -103,57 +103,49 @@ class AsuraScans:
         except Exception as e:
             raise RuntimeError(f"Error fetching manga info: {str(e)}")
 
-    def fetch_chapter_pages(self, chapter_id: str) -> List[Dict[str, Union[str, int]]]:
+    async def fetch_chapter_pages_async(self, chapter_id: str) -> List[Dict[str, Union[str, int]]]:
         try:
-            response = requests.get(f"{self.base_url}/series/{chapter_id}")
-            soup = BeautifulSoup(response.text, "html.parser")
+            response = await self.client.get(f"{self.base_url}/series/{chapter_id}")
+            soup = self.parse_html(response.text)
 
             pages = [
                 {
                     "img": img["src"],
                     "page": index + 1,
                 }
-                for index, img in enumerate(soup.select(".w-full.mx-auto.center > img"))
+                for index, img in enumerate(self.PAGES.select(soup))
             ]
 
             return pages
         except Exception as e:
             raise RuntimeError(f"Error fetching chapter pages: {str(e)}")
 
-    def search(self, query: str, page: int = 1) -> Dict:
+    async def search_async(self, query: str, page: int = 1) -> Dict:
         try:
             formatted_query = query.lower()
-            response = requests.get(
+            response = await self.client.get(
                 f"{self.base_url}/series?page={page}&name={formatted_query}"
             )
-            soup = BeautifulSoup(response.text, "html.parser")
+            soup = self.parse_html(response.text)
 
             results = [
                 {
                     "id": result["href"].replace("series/", ""),
-                    "title": result.select_one(
-                        "div > div > div:nth-child(2) > span:nth-child(1)"
-                    ).get_text(strip=True),
-                    "image": result.select_one("div > div > div:nth-child(1) > img")[
-                        "src"
-                    ],
-                    "status": result.select_one(
-                        "div > div > div:nth-child(1) > span"
-                    ).get_text(strip=True),
-                    "latestChapter": result.select_one(
-                        "div > div > div:nth-child(2) > span:nth-child(2)"
-                    ).get_text(strip=True),
-                    "rating": result.select_one(
-                        "div > div > div:nth-child(2) > span:nth-child(3) > label"
-                    ).get_text(strip=True),
+                    "title": self.SEARCH_TITLE.select_one(result).get_text(strip=True),
+                    "image": self.SEARCH_IMAGE.select_one(result)["src"],
+                    "status": self.SEARCH_STATUS.select_one(result).get_text(strip=True),
+                    "latestChapter": self.SEARCH_LATEST.select_one(result).get_text(
+                        strip=True
+                    ),
+                    "rating": self.SEARCH_RATING.select_one(result).get_text(strip=True),
                 }
-                for result in soup.select(".grid.grid-cols-2.gap-3.p-4 > a")
+                for result in self.SERIES_CARDS.select(soup)
             ]
 
             search_results = {
                 "currentPage": page,
                 "hasNextPage": "pointer-events:auto"
-                in soup.select_one(".flex.items-center.justify-center > a")["style"],
+                in self.PAGINATION.select_one(soup)["style"],
                 "results": results,
             }
 
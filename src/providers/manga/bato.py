@@ -1,17 +1,41 @@
-import requests
-from bs4 import BeautifulSoup
 from typing import List, Dict
-import json
-class Bato:
+from types import MappingProxyType
+import soupsieve as sv
+import fast_json
+from html_parser import find_attribute
+from http_client import HTTPError, RequestError
+from provider import MangaProvider
+class Bato(MangaProvider):
+    TITLE = sv.compile(r"h3.text-lg.md\:text-2xl.font-bold a")
+    IMAGE = sv.compile("img.w-full.not-prose")
+    DESCRIPTION = sv.compile("div.limit-html-p")
+    AUTHORS = sv.compile("a[href*='v3x-search?word=']")
+    GENRES = sv.compile("span.font-bold")
+    CHAPTERS = sv.compile(r"a.link-hover.link-primary.visited\:text-accent")
+    ALT_TITLES = sv.compile(r"div.mt-1.text-xs.md\:text-base.opacity-80 span")
+    STATUS = sv.compile("span.font-bold.uppercase.text-warning")
+    LANGUAGES = sv.compile("div.whitespace-nowrap.overflow-hidden span")
+    RATING = sv.compile(r"div.inline-flex.relative.text-xs.md\:text-sm")
+    UPLOAD_DATE = sv.compile("time")
+    SEARCH_RESULTS = sv.compile("div.series-list > div.item")
+    SEARCH_COVER = sv.compile("a.item-cover")
+    SEARCH_TITLE = sv.compile("a.item-title")
+    SEARCH_IMAGE = sv.compile("img")
+    SEARCH_ALIASES = sv.compile("div.item-alias")
+    SEARCH_FLAG = sv.compile("em.eflag")
+    SEARCH_TIME = sv.compile("div.item-volch i")
+    PAGINATION = sv.compile("ul.pagination")
+    PAGE_ITEMS = sv.compile("li.page-item")
+
     def __init__(self):
+        super().__init__()
         self.name = "Bato"
         self.base_url = "https://bato.to"
-        self.client = requests.Session()
-        self.client.headers.update({
+        self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        })
+        }
 
-    def fetch_manga_info(self, manga_id: str) -> Dict:
+    async def fetch_manga_info_async(self, manga_id: str) -> Dict:
         manga_info = {
             "id": manga_id,
             "title": "Unknown Title",
@@ -30,31 +54,31 @@ class Bato:
 
         url = f"{self.base_url}/series/{manga_id}"
         try:
-            response = self.client.get(url)
+            response = await self.client.get(url, headers=self.headers)
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
+            soup = self.parse_html(response.text)
 
-            title_element = soup.select_one("h3.text-lg.md\\:text-2xl.font-bold a")
+            title_element = self.TITLE.select_one(soup)
             if title_element:
                 manga_info["title"] = title_element.text.strip()
 
-            image_element = soup.select_one("img.w-full.not-prose")
+            image_element = self.IMAGE.select_one(soup)
             if image_element and "src" in image_element.attrs:
                 manga_info["image"] = image_element["src"]
 
-            description_element = soup.select_one("div.limit-html-p")
+            description_element = self.DESCRIPTION.select_one(soup)
             if description_element:
                 manga_info["description"] = description_element.text.strip()
 
-            authors_element = soup.select_one("a[href*='v3x-search?word=']")
+            authors_element = self.AUTHORS.select_one(soup)
             if authors_element:
                 manga_info["authors"] = [authors_element.text.strip()]
 
-            genres_elements = soup.select("span.font-bold")
+            genres_elements = self.GENRES.select(soup)
             if genres_elements:
                 manga_info["genres"] = [genre.text.strip() for genre in genres_elements]
 
-            chapters_elements = soup.select("a.link-hover.link-primary.visited\\:text-accent")
+            chapters_elements = self.CHAPTERS.select(soup)
             if chapters_elements:
                 manga_info["chapters"] = [
                     {
@@ -64,20 +88,20 @@ class Bato:
                     for el in chapters_elements
                 ]
 
-            alt_titles_elements = soup.select("div.mt-1.text-xs.md\\:text-base.opacity-80 span")
+            alt_titles_elements = self.ALT_TITLES.select(soup)
             if alt_titles_elements:
                 manga_info["alt_titles"] = [title.text.strip() for title in alt_titles_elements]
 
-            pub_status_element = soup.select_one("span.font-bold.uppercase.text-warning")
+            pub_status_element = self.STATUS.select_one(soup)
             if pub_status_element:
                 manga_info["publication_status"] = pub_status_element.text.strip()
 
-            lang_elements = soup.select("div.whitespace-nowrap.overflow-hidden span")
+            lang_elements = self.LANGUAGES.select(soup)
             if lang_elements and len(lang_elements) >= 2:
                 manga_info["original_language"] = lang_elements[1].text.strip()
                 manga_info["translated_language"] = lang_elements[0].text.strip()
 
-            rating_element = soup.select_one("div.inline-flex.relative.text-xs.md\\:text-sm")
+            rating_element = self.RATING.select_one(soup)
             if rating_element:
                 rating_text = rating_element.text.strip()
                 try:
@@ -86,40 +110,44 @@ class Bato:
                     pass
 
 
-            upload_date_element = soup.select_one("time")
+            upload_date_element = self.UPLOAD_DATE.select_one(soup)
             if upload_date_element and "time" in upload_date_element.attrs:
                 manga_info["upload_date"] = upload_date_element["time"]
 
             return manga_info
 
-        except requests.RequestException as e:
-            raise SystemExit(f"Request failed: {e}")
+        except RequestError as e:
+            raise ValueError(f"Request failed: {e}")
         except Exception as e:
             raise ValueError(f"Error parsing manga info: {e}")
             
-    def fetch_chapter_pages(self, chapter_id: str) -> List[Dict]:
+    async def fetch_chapter_pages_async(self, chapter_id: str) -> List[Dict]:
         try:
             url = f"{self.base_url}/chapter/{chapter_id}"
-            response = self.client.get(url, headers={'Referer': url})
+            response = await self.client.get(url, headers={**self.headers, 'Referer': url})
             response.raise_for_status()
 
-            soup = BeautifulSoup(response.text, "html.parser")
-            astro_island = soup.find("astro-island", {"uid": "Z1HVi0v"})
-            if not astro_island:
+            # Only the reader island's props are needed; skip the full DOM
+            props = find_attribute(
+                response.text,
+                "astro-island",
+                "props",
+                {"uid": "Z1HVi0v"},
+                self.parser_backend,
+            )
+            if props is None:
                 raise ValueError("Could not find the <astro-island> component.")
-
-            props = astro_island.get("props")
             if not props:
                 raise ValueError("Missing 'props' attribute.")
 
-            props_data = json.loads(props)
+            props_data = fast_json.loads(props)
             image_files = props_data.get("imageFiles", [])
 
             if not isinstance(image_files, list) or len(image_files) < 2:
                 raise ValueError("Invalid imageFiles structure")
 
             image_entries_str = image_files[1]
-            image_entries = json.loads(image_entries_str)
+            image_entries = fast_json.loads(image_entries_str)
 
             image_urls = []
             for entry in image_entries:
@@ -127,60 +155,63 @@ class Bato:
                     img_url = entry[1]
                     image_urls.append(img_url)
 
+            # One read-only mapping shared by every page of the chapter; kept
+            # out of models.HEADERS, which would gain an entry per chapter
+            header = MappingProxyType({"Referer": url})
             pages = [
                 {
                     "img": img_url,
                     "title": f"Page {i + 1}",
-                    "headerForImage": {"Referer": url}
+                    "headerForImage": header
                 }
                 for i, img_url in enumerate(image_urls)
             ]
 
             return pages
 
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
         
-    def search(self, query: str, page=1) -> Dict:
+    async def search_async(self, query: str, page=1) -> Dict:
         try:
             search_res = {"currentPage": page, "results": [], "hasNextPage": False}
             
             # Make the request to Batoto's search endpoint
             url = f"https://bato.to/search?word={query.replace(' ', '+')}&page={page}"
-            response = self.client.get(url)
+            response = await self.client.get(url, headers=self.headers)
             response.raise_for_status()  # Check for HTTP errors
             
             # Parse the HTML content
-            soup = BeautifulSoup(response.text, "html.parser")
+            soup = self.parse_html(response.text)
             
             results = []
-            for el in soup.select('div.series-list > div.item'):
+            for el in self.SEARCH_RESULTS.select(soup):
                 try:
                     # Extract basic info
                     item = {
-                        "id": el.select_one('a.item-cover')['href'].split('/')[-1],
-                        "title": el.select_one('a.item-title').get_text(strip=True),
-                        "image": el.select_one('img')['src'],
+                        "id": self.SEARCH_COVER.select_one(el)['href'].split('/')[-1],
+                        "title": self.SEARCH_TITLE.select_one(el).get_text(strip=True),
+                        "image": self.SEARCH_IMAGE.select_one(el)['src'],
                         "authors": [],
                         "last_updated": None,
                         "language": None
                     }
 
                     # Extract authors from item-alias divs
-                    alias_divs = el.select('div.item-alias')
+                    alias_divs = self.SEARCH_ALIASES.select(el)
                     if len(alias_divs) >= 2:
                         authors = alias_divs[1].get_text(strip=True)
                         item["authors"] = [a.strip() for a in authors.split(',')]
 
                     # Extract language from flag
-                    flag = el.select_one('em.eflag')
+                    flag = self.SEARCH_FLAG.select_one(el)
                     if flag and 'data-lang' in flag.attrs:
                         item["language"] = flag['data-lang']
 
                     # Extract last updated time
-                    time_element = el.select_one('div.item-volch i')
+                    time_element = self.SEARCH_TIME.select_one(el)
                     if time_element:
                         item["last_updated"] = time_element.get_text(strip=True)
 
@@ -192,9 +223,9 @@ class Bato:
             search_res["results"] = results
 
             # Pagination detection
-            pagination = soup.select('ul.pagination')
+            pagination = self.PAGINATION.select(soup)
             if pagination:
-                page_items = pagination[0].select('li.page-item')
+                page_items = self.PAGE_ITEMS.select(pagination[0])
                 last_page_item = page_items[-1]
                 
                 if 'disabled' not in last_page_item.get('class', []):
@@ -215,7 +246,7 @@ class Bato:
 
             return search_res
 
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
\ No newline at end of file
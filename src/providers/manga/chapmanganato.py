@@ -1,9 +1,41 @@
-import requests
-from bs4 import BeautifulSoup
 from typing import List, Dict
+from types import MappingProxyType
+import soupsieve as sv
+from debug_capture import capture
+from http_client import ConnectError, HTTPError, Timeout
+from provider import MangaProvider
+
+class Manganato(MangaProvider):
+    TITLE = sv.compile("div.panel-story-info > div.story-info-right > h1")
+    ALT_TITLES = sv.compile(
+        "div.story-info-right > table > tbody > tr:nth-child(1) > td.table-value > h2"
+    )
+    DESCRIPTION = sv.compile("#panel-story-info-description")
+    IMAGE = sv.compile("div.story-info-left > span.info-image > img")
+    GENRES = sv.compile(
+        "div.story-info-right > table > tbody > tr:nth-child(4) > td.table-value > a"
+    )
+    STATUS = sv.compile(
+        "div.story-info-right > table > tbody > tr:nth-child(3) > td.table-value"
+    )
+    VIEWS = sv.compile("div.story-info-right > div > p:nth-child(2) > span.stre-value")
+    AUTHORS = sv.compile(
+        "div.story-info-right > table > tbody > tr:nth-child(2) > td.table-value > a"
+    )
+    CHAPTERS = sv.compile("div.container-main-left > div.panel-story-chapter-list > ul > li")
+    CHAPTER_LINK = sv.compile("a")
+    CHAPTER_VIEWS = sv.compile("span.chapter-view.text-nowrap")
+    CHAPTER_TIME = sv.compile("span.chapter-time.text-nowrap")
+    PAGES = sv.compile("div.container-chapter-reader > img")
+    SEARCH_RESULTS = sv.compile("div.search-story-item")
+    SEARCH_LINK = sv.compile("a")
+    SEARCH_IMAGE = sv.compile("img")
+    SEARCH_AUTHORS = sv.compile("div.item-right > span.text-nowrap.item-author")
+    SEARCH_TIMES = sv.compile("div.item-right > span.text-nowrap.item-time")
+    PAGINATION = sv.compile("div.group-page a")
 
-class Manganato:
     def __init__(self):
+        super().__init__()
         self.name = "Manganato"
         self.base_url = "https://chapmanganato.to"
         self.logo = "https://techbigs.com/uploads/2022/1/mangakakalot-apkoptimized.jpg"
@@ -11,109 +43,115 @@ class Manganato:
             "User-Agent": "Mozilla/5.0",
         }
 
-    def _get_request(self, url: str) -> str:
+    async def _get_request(self, url: str) -> str:
         try:
-            response = requests.get(
+            response = await self.client.get(
                 url, 
                 headers=self.headers,
                 timeout=(5, 10)  # (connect timeout, read timeout)
             )
             response.raise_for_status()
             return response.text
-        except requests.Timeout:
+        except Timeout:
             raise ValueError(f"Connection timed out while accessing {url}. The server might be down or blocking requests.")
-        except requests.ConnectionError:
+        except ConnectError:
             raise ValueError(f"Failed to connect to {url}. Please check your internet connection or the website might be down.")
 
-    def fetch_manga_info(self, manga_id: str) -> Dict:
+    async def fetch_manga_info_async(self, manga_id: str) -> Dict:
         manga_info = {
             "id": manga_id,
             "title": "",
         }
         url = manga_id if 'read' in manga_id else f'https://chapmanganato.to/{manga_id}'
         try:
-            html_data = self._get_request(url)
-            soup = BeautifulSoup(html_data, "html.parser")
-            manga_info["title"] = soup.select_one('div.panel-story-info > div.story-info-right > h1').text
-            manga_info["altTitles"] = soup.select_one('div.story-info-right > table > tbody > tr:nth-child(1) > td.table-value > h2').text.split(';')
-            manga_info["description"] = soup.select_one('#panel-story-info-description').text.replace('Description :', '').replace('\n', '').strip()
-            manga_info["image"] = soup.select_one('div.story-info-left > span.info-image > img')['src']
-            manga_info["genres"] = [genre.text for genre in soup.select('div.story-info-right > table > tbody > tr:nth-child(4) > td.table-value > a')]
+            html_data = await self._get_request(url)
+            soup = self.parse_html(html_data)
+            manga_info["title"] = self.TITLE.select_one(soup).text
+            manga_info["altTitles"] = self.ALT_TITLES.select_one(soup).text.split(';')
+            manga_info["description"] = self.DESCRIPTION.select_one(soup).text.replace('Description :', '').replace('\n', '').strip()
+            manga_info["image"] = self.IMAGE.select_one(soup)['src']
+            manga_info["genres"] = [genre.text for genre in self.GENRES.select(soup)]
             
-            status_text = soup.select_one('div.story-info-right > table > tbody > tr:nth-child(3) > td.table-value').text.strip()
+            status_text = self.STATUS.select_one(soup).text.strip()
             manga_info["status"] = {
                 'Completed': 'COMPLETED',
                 'Ongoing': 'ONGOING'
             }.get(status_text, 'UNKNOWN')
-            manga_info["views"] = soup.select_one('div.story-info-right > div > p:nth-child(2) > span.stre-value').text.replace(',', '').strip()
-            manga_info["authors"] = [author.text for author in soup.select('div.story-info-right > table > tbody > tr:nth-child(2) > td.table-value > a')]
+            manga_info["views"] = self.VIEWS.select_one(soup).text.replace(',', '').strip()
+            manga_info["authors"] = [author.text for author in self.AUTHORS.select(soup)]
             
             manga_info["chapters"] = [
-                {
-                    "id": el.select_one('a')['href'].split('/')[-1],
-                    "title": el.select_one('a').text,
-                    "views": el.select_one('span.chapter-view.text-nowrap').text.replace(',', '').strip(),
-                    "releasedDate": el.select_one('span.chapter-time.text-nowrap')['title'],
-                }
-                for el in soup.select('div.container-main-left > div.panel-story-chapter-list > ul > li')
+                self._parse_chapter(el) for el in self.CHAPTERS.select(soup)
             ]
 
             return manga_info
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
 
-    def fetch_chapter_pages(self, chapter_id: str) -> List[Dict]:
+    def _parse_chapter(self, el) -> Dict:
+        link = self.CHAPTER_LINK.select_one(el)
+        return {
+            "id": link['href'].split('/')[-1],
+            "title": link.text,
+            "views": self.CHAPTER_VIEWS.select_one(el).text.replace(',', '').strip(),
+            "releasedDate": self.CHAPTER_TIME.select_one(el)['title'],
+        }
+
+    async def fetch_chapter_pages_async(self, chapter_id: str) -> List[Dict]:
         try:
             url = f"{self.base_url}/{chapter_id}" if '$$READMANGANATO' not in chapter_id else f"https://readmanganato.com/{chapter_id.replace('$$READMANGANATO', '')}"
-            print(url)
-            html_data = self._get_request(url)
-            soup = BeautifulSoup(html_data, "html.parser")
-            with open("chapter_pages.html", "w", encoding="utf-8") as f:
-                f.write(html_data)
+            html_data = await self._get_request(url)
+            soup = self.parse_html(html_data)
+            capture("manganato.chapter_pages", url, html_data)
 
+            # One read-only mapping shared by every page of the chapter; kept
+            # out of models.HEADERS, which would gain an entry per chapter
+            header = MappingProxyType({"Referer": url})
             pages = [
                 {
                     "img": el['src'],
                     "page": i+1,
                     "title": el['alt'].replace(' - Mangakakalot.com', '').replace(' - MangaNato.com', '').strip(),
-                    "headerForImage": {"Referer": url}
+                    "headerForImage": header
                 }
-                for i, el in enumerate(soup.select('div.container-chapter-reader > img'))
+                for i, el in enumerate(self.PAGES.select(soup))
             ]
 
             return pages
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
                 raise ValueError(f"Error: {str(e)}")
-    def search(self, query: str, page=1) -> Dict:
+    async def search_async(self, query: str, page=1) -> Dict:
         try:
             search_res = {"currentPage": page, "results": [], "hasNextPage": False}
-            html_data = self._get_request(f"https://manganato.com/search/story/{query.replace(' ', '_')}?page={page}")
-            soup = BeautifulSoup(html_data, "html.parser")
-            with open('search.html', 'w', encoding='utf-8') as f:
-                f.write(html_data)
+            url = f"https://manganato.com/search/story/{query.replace(' ', '_')}?page={page}"
+            html_data = await self._get_request(url)
+            soup = self.parse_html(html_data)
+            capture("manganato.search", url, html_data)
             
             results = []
-            for el in soup.select('div.search-story-item'):
-                authors_element = el.select_one('div.item-right > span.text-nowrap.item-author')
+            for el in self.SEARCH_RESULTS.select(soup):
+                authors_element = self.SEARCH_AUTHORS.select_one(el)
                 authors = authors_element.text.split(',') if authors_element else []
+                link = self.SEARCH_LINK.select_one(el)
+                times = self.SEARCH_TIMES.select(el)
                 
                 result = {
-                    "id": el.select_one('a')['href'].split('/')[-1],
-                    "title": el.select_one('a')['title'],
-                    "image": el.select_one('img')['src'],
+                    "id": link['href'].split('/')[-1],
+                    "title": link['title'],
+                    "image": self.SEARCH_IMAGE.select_one(el)['src'],
                     "authors": authors,
-                    "last_updated": el.select('div.item-right > span.text-nowrap.item-time')[0].text.replace('Updated : ', ''),
-                    "views": el.select('div.item-right > span.text-nowrap.item-time')[-1].text.replace(',', ''),
+                    "last_updated": times[0].text.replace('Updated : ', ''),
+                    "views": times[-1].text.replace(',', ''),
                 }
                 results.append(result)
             
             search_res["results"] = results
 
-            page_numbers = soup.select('div.group-page a')
+            page_numbers = self.PAGINATION.select(soup)
             if page_numbers:
                 last_page = page_numbers[-1]
                 if 'LAST' in last_page.text:
@@ -123,7 +161,7 @@ class Manganato:
                     search_res["hasNextPage"] = any(int(a.text) > page for a in page_numbers if a.text.isdigit())
 
             return search_res
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
\ No newline at end of file
@@ -1,10 +1,54 @@
+import asyncio
 import requests
-from bs4 import BeautifulSoup
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional, TypedDict
 import cloudscraper
-import json
-class Comick:
+import soupsieve as sv
+from fast_json import decode
+from http_client import mount_pools
+from models import MangaInfo
+from provider import MangaProvider
+
+# Schemas naming only the fields read below (see fast_json.decode)
+class _Comic(TypedDict):
+    hid: str
+
+class _PageProps(TypedDict):
+    comic: _Comic
+
+class _Props(TypedDict):
+    pageProps: _PageProps
+
+class _NextData(TypedDict):
+    props: _Props
+
+class _Chapter(TypedDict, total=False):
+    hid: str
+    chap: Optional[str]
+
+class _Chapters(TypedDict, total=False):
+    chapters: List[_Chapter]
+
+class _Cover(TypedDict, total=False):
+    b2key: str
+
+class _SearchItem(TypedDict, total=False):
+    slug: str
+    title: str
+    md_covers: List[_Cover]
+    desc: Optional[str]
+
+class Comick(MangaProvider):
+    INFO_ONE = sv.compile(r"div.md\:col-span-2.text-sm.md\:text-base")
+    INFO_TWO = sv.compile(r"div.col-span-3.md\:col-span-2.text-sm.md\:text-base.space-y-5")
+    INFO_DIVS = sv.compile("div")
+    INFO_SPANS = sv.compile("span")
+    TABLE_ROWS = sv.compile("table tr")
+    TABLE_CELLS = sv.compile("td")
+    CELL_LINKS = sv.compile("span a")
+    ALT_TITLES = sv.compile(r"div.text-gray-500.dark\:text-gray-400.overflow-auto.mt-3")
+
     def __init__(self):
+        super().__init__()
         self.name = "Comick"
         self.base_url = "https://comick.io"
         self.scraper = cloudscraper.create_scraper(
@@ -14,8 +58,17 @@ class Comick:
             }, 
             interpreter="nodejs"
         )
+        mount_pools(self.scraper)
+
+    async def fetch_manga_info_async(self, manga_id: str) -> Dict:
+        info = await self.fetch_manga_async(manga_id)
+        return await info.to_dict_async()
 
-    def fetch_manga_info(self, manga_id: str) -> Dict:
+    async def fetch_manga_async(self, manga_id: str) -> MangaInfo:
+        """
+        Returns once the comic page is parsed; the chapter list comes from
+        the API and is only requested when the chapters are read.
+        """
         manga_info = {
             "id": manga_id,
             "title": "Unknown Title",
@@ -28,16 +81,17 @@ class Comick:
             "genres": ["Unknown Genre"],
             "authors": ["Unknown Author"],
             "alt_titles": [],
-            "chapters": [],
         }
 
         url = f"{self.base_url}/comic/{manga_id}?lang=en"
         try:
-            response = self.scraper.get(url)
+            # cloudscraper only has a blocking API, so each of its calls runs
+            # in a worker thread to keep the event loop free
+            response = await asyncio.to_thread(self.scraper.get, url)
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-            info_elem_one = soup.select("div.md\:col-span-2.text-sm.md\:text-base")
-            info_elem_two = soup.select("div.col-span-3.md\:col-span-2.text-sm.md\:text-base.space-y-5")
+            soup = self.parse_html(response.text)
+            info_divs = self.INFO_DIVS.select(self.INFO_ONE.select(soup)[0])
+            info_rows = self.TABLE_ROWS.select(self.INFO_TWO.select(soup)[0])
             title_tag = soup.find("h1")
             if title_tag:
                 manga_info["title"] = title_tag.text.strip()
@@ -50,92 +104,74 @@ class Comick:
             if desc_tag:
                 manga_info["description"] = desc_tag.text.strip()
 
-            status_tag = info_elem_one[0].select("div")[7]
+            # The translation status is in this div and the status in the next
+            status_tag = info_divs[7]
             if status_tag:
                 manga_info["status"] = status_tag.find_next_sibling().text.strip().split(" ")[-1]
+                manga_info["translation_status"] = status_tag.text.strip().split(" ")[-1]
 
-            translation_status_tag = info_elem_one[0].select("div")[7]
-            if translation_status_tag:
-                manga_info["translation_status"] = translation_status_tag.text.strip().split(" ")[-1]
-
-            publish_date_tag = info_elem_one[0].select("div")[6].text.split(" ")[-1]
+            publish_date_tag = info_divs[6].text.split(" ")[-1]
             if publish_date_tag:
                 manga_info["publish_date"] = publish_date_tag
 
-            type_tag = info_elem_one[0].select("div")[4].select("span")[-1].text.split(" ")[-1]
+            type_tag = self.INFO_SPANS.select(info_divs[4])[-1].text.split(" ")[-1]
             if type_tag:
                 manga_info["type"] = type_tag
 
-            genres_tag = info_elem_two[0].select("table tr")[2].select("td")[-1].select("span a")
+            genres_tag = self._row_links(info_rows[2])
             if genres_tag:
                 genres = [gen_item.text.strip() for gen_item in genres_tag]
                 manga_info["genres"] = genres
            
-            authors_tag =  info_elem_two[0].select("table tr")[1].select("td")[-1].select("span a")
+            authors_tag = self._row_links(info_rows[1])
             if authors_tag:
                 authors = [auth_item.text.strip() for auth_item in authors_tag]
                 manga_info["authors"] = authors
            
-            manga_info["alt_titles"] = soup.select("div.text-gray-500.dark\:text-gray-400.overflow-auto.mt-3")[0].text.split(" • ")
-
-            chapters_tag = self.fetch_chapters(json.loads(soup.find("script", {"id": "__NEXT_DATA__"}).string)['props']['pageProps']['comic']['hid'], referer=url)
-            if chapters_tag:
-                chapters = []
-                for chapter in chapters_tag['chapters']:
-                    chapters.append(
-                        {
-                            "id": chapter["hid"] + "-" "chapter-"+ chapter["chap"] + "-" + "en",
-                            "num": chapter["chap"]
-                        },
-                    
-                    )
-                manga_info["chapters"] = chapters
-
-            return manga_info
+            manga_info["alt_titles"] = self.ALT_TITLES.select(soup)[0].text.split(" • ")
+
+            hid = decode(soup.find("script", {"id": "__NEXT_DATA__"}).string, _NextData)['props']['pageProps']['comic']['hid']
+            return MangaInfo(manga_info, lambda: self._iter_chapters_async(hid, url))
 
         except requests.RequestException as e:
-            raise SystemExit(f"Request failed: {e}")
+            raise ValueError(f"Request failed: {e}")
         except Exception as e:
             raise ValueError(f"Error parsing manga info: {e}")
     
-    def fetch_chapters(self, id: str, referer: str) -> List[Dict]:
+    def _row_links(self, row) -> list:
+        # The links in the last cell of an info table row
+        return self.CELL_LINKS.select(self.TABLE_CELLS.select(row)[-1])
+
+    async def _iter_chapters_async(self, hid: str, referer: str) -> AsyncIterator[Dict]:
+        chapters_tag = await self.fetch_chapters_async(hid, referer=referer)
+        if chapters_tag:
+            for chapter in chapters_tag['chapters']:
+                yield {
+                    "id": chapter["hid"] + "-" "chapter-"+ chapter["chap"] + "-" + "en",
+                    "num": chapter["chap"]
+                }
+
+    async def fetch_chapters_async(self, id: str, referer: str) -> List[Dict]:
         try:
             url = "https://api.comick.io/comic/" + id + "/chapters"
-            response = self.scraper.get(url, headers= {"Referer": referer})
+            response = await asyncio.to_thread(self.scraper.get, url, headers={"Referer": referer})
             response.raise_for_status()
-            data = response.json()
+            data = decode(response.content, _Chapters)
             return data
         except requests.HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
             
-    def fetch_chapter_pages(self, chapter_id: str) -> List[Dict]:
-        try:
-            url = f"{self.base_url}/comic/{chapter_id}"
-            response = self.scraper.get(url, headers= {"Host": "api.comick.io"})
-            response.raise_for_status()
-            pages = []
-            soup = BeautifulSoup(response.text, "html.parser")
-            with open("comick_chapters.html", "w", encoding="utf-8") as f:
-                f.write(response.text)
-            exit()
-            return pages
-
-        except requests.HTTPError as e:
-            raise ValueError(f"HTTP Error: {str(e)}")
-        except Exception as e:
-            raise ValueError(f"Error: {str(e)}")
-
-    def search(self, query: str, limit=100) -> Dict:
+    async def search_async(self, query: str, limit=100) -> Dict:
         try:
             search_res = {"results": []}
             
             url = f"https://api.comick.io/v1.0/search?limit={limit}&q={query.replace(' ', '+')}"
-            response = self.scraper.get(url)
+            response = await asyncio.to_thread(self.scraper.get, url)
             response.raise_for_status() 
             
-            data = response.json()
+            data = decode(response.content, List[_SearchItem])
             results = [
                 {
                     "id": item["slug"],
@@ -0,0 +1,184 @@
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from itertools import count
+from typing import List, Optional, Union
+
+DEFAULT_MAX_ENTRIES = 100
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Captures waiting for the spool writer before new ones are dropped
+SPOOL_QUEUE_SIZE = 256
+
+
+class CapturedResponse:
+    __slots__ = ("name", "url", "status_code", "body", "captured_at")
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        status_code: Optional[int],
+        body: bytes,
+        captured_at: float,
+    ):
+        self.name = name
+        self.url = url
+        self.status_code = status_code
+        self.body = body
+        self.captured_at = captured_at
+
+    @property
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+
+class RingBufferSink:
+    """
+    Keeps the most recent captures in memory, bounded by both entry count and
+    total body size.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: deque = deque()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def add(self, entry: CapturedResponse) -> None:
+        with self._lock:
+            self._entries.append(entry)
+            self._size += len(entry.body)
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._size > self.max_bytes
+            ):
+                self._size -= len(self._entries.popleft().body)
+
+    def entries(self) -> List[CapturedResponse]:
+        with self._lock:
+            return list(self._entries)
+
+    def close(self) -> None:
+        pass
+
+
+class SpoolSink:
+    """
+    Writes captures to `directory`, keeping at most `max_entries` files.
+    Writing happens on a worker thread so the event loop never touches the
+    disk; when the worker falls behind, new captures are dropped.
+    """
+
+    def __init__(self, directory: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+        self._files: deque = deque()
+        self._queue: queue.Queue = queue.Queue(maxsize=SPOOL_QUEUE_SIZE)
+        self._worker = threading.Thread(target=self._run, name="debug-capture", daemon=True)
+        self._worker.start()
+
+    def add(self, entry: CapturedResponse) -> None:
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            pass
+
+    def _run(self) -> None:
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                return
+            try:
+                self._write(entry)
+            except OSError:
+                pass
+
+    def _write(self, entry: CapturedResponse) -> None:
+        # Sequence numbers keep names unique when captures share a timestamp
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(entry.captured_at))
+        filename = f"{stamp}-{next(_sequence):06d}-{_safe_name(entry.name)}.html"
+        path = os.path.join(self.directory, filename)
+        with open(path, "wb") as f:
+            f.write(f"<!-- {entry.status_code} {entry.url} -->\n".encode())
+            f.write(entry.body)
+        self._files.append(path)
+        while len(self._files) > self.max_entries:
+            try:
+                os.remove(self._files.popleft())
+            except OSError:
+                pass
+
+    def entries(self) -> List[str]:
+        return list(self._files)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._worker.join()
+
+
+_sequence = count(1)
+_sink: Union[None, RingBufferSink, SpoolSink] = None
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", name)
+
+
+def configure_capture(
+    mode: Optional[str] = None,
+    directory: Optional[str] = None,
+    max_entries: int = DEFAULT_MAX_ENTRIES,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> None:
+    """
+    Turns response capture on with mode "memory" (a ring buffer) or "spool"
+    (files in `directory`), or off with None, the default.
+    """
+    global _sink
+    if _sink is not None:
+        _sink.close()
+    if mode is None:
+        _sink = None
+    elif mode == "memory":
+        _sink = RingBufferSink(max_entries, max_bytes)
+    elif mode == "spool":
+        if not directory:
+            raise ValueError("Spool capture needs a directory")
+        _sink = SpoolSink(directory, max_entries)
+    else:
+        raise ValueError(f"Unknown capture mode {mode!r}")
+
+
+def capture_enabled() -> bool:
+    return _sink is not None
+
+
+def capture(
+    name: str,
+    url: str,
+    body: Union[str, bytes],
+    status_code: Optional[int] = None,
+) -> None:
+    """
+    Records a raw response body under `name` when capture is enabled and
+    does nothing otherwise. Pass the body as received; rendering it
+    (e.g. prettify) is left to whoever reads the capture.
+    """
+    sink = _sink
+    if sink is None:
+        return
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    sink.add(CapturedResponse(name, url, status_code, body, time.time()))
+
+
+def captured() -> list:
+    """
+    Returns the ring buffer's entries, or the spooled file paths, oldest
+    first.
+    """
+    return _sink.entries() if _sink is not None else []
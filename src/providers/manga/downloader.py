@@ -0,0 +1,221 @@
+import asyncio
+import contextlib
+import mimetypes
+import os
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Mapping, Optional
+from urllib.parse import urlsplit
+
+from http_client import AsyncClient, RequestError, StreamingResponse, get_async_client, run_sync
+from image_fetch import ImageLimiter, fetch_with_retries, image_headers
+from image_store import ImageStore, ImageWriter, get_image_store
+from resilience import RetryPolicy, get_default_policy
+
+# Pages of one chapter in flight at once, overall and per image host
+DEFAULT_CONCURRENCY = 16
+DEFAULT_PER_HOST = 4
+CHUNK_SIZE = 256 * 1024
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif")
+
+
+@dataclass(slots=True)
+class PageDownload:
+    """
+    Outcome of one page: `path` and `size` once its file is complete,
+    `error` when it could not be downloaded.
+    """
+
+    index: int
+    url: Optional[str]
+    path: Optional[str] = None
+    size: int = 0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.path is not None and self.error is None
+
+
+# Called after each page with (page, pages finished, total pages)
+ProgressCallback = Callable[[PageDownload, int, int], None]
+
+
+def _page_filename(index: int, url: str, content_type: Optional[str]) -> str:
+    ext = os.path.splitext(urlsplit(url).path)[1].lower()
+    if ext not in IMAGE_EXTENSIONS:
+        mime = (content_type or "").split(";")[0].strip()
+        ext = (mimetypes.guess_extension(mime) if mime else None) or ""
+    return f"{index + 1:03d}{ext}"
+
+
+def _write_chunk(file, writer: Optional[ImageWriter], chunk: bytes) -> Optional[ImageWriter]:
+    """
+    Writes `chunk` to the page file and the store, and returns the writer,
+    or None once the store has given up on the page (too large for it).
+    """
+    file.write(chunk)
+    if writer is not None:
+        try:
+            writer.write(chunk)
+        except OSError:
+            writer.abort()
+            return None
+    return writer
+
+
+async def _copy_from_store(
+    store: ImageStore, result: PageDownload, directory: str
+) -> bool:
+    entry = store.get(result.url)
+    if entry is None:
+        return False
+    path = os.path.join(directory, _page_filename(result.index, result.url, entry.content_type))
+    part = path + ".part"
+    try:
+        await asyncio.to_thread(store.copy_to, entry, part)
+    except FileNotFoundError:
+        # The store dropped the file after get(); download the page instead
+        return False
+    await asyncio.to_thread(os.replace, part, path)
+    result.path = path
+    result.size = entry.size
+    return True
+
+
+async def _fetch_to_file(
+    client: AsyncClient,
+    result: PageDownload,
+    directory: str,
+    headers: Mapping[str, str],
+    timeout: float,
+    store: Optional[ImageStore],
+) -> StreamingResponse:
+    """
+    Streams the page to its file when the response is a success and
+    returns the response either way.
+    """
+    # A read timeout rather than a total one, so large pages on slow links
+    # are only cut off when they stall
+    async with client.stream(
+        "GET", result.url, headers=dict(headers), timeout=(timeout, timeout)
+    ) as response:
+        if not response.ok:
+            return response
+        content_type = response.headers.get("Content-Type")
+        path = os.path.join(directory, _page_filename(result.index, result.url, content_type))
+        # Written under a temporary name so a partial file is never mistaken
+        # for a finished page
+        part = path + ".part"
+        file = await asyncio.to_thread(open, part, "wb")
+        cache_control = response.headers.get("Cache-Control")
+        writer = None
+        if store is not None and store.accepts(content_type, cache_control):
+            with contextlib.suppress(OSError):
+                writer = await asyncio.to_thread(
+                    store.writer, result.url, content_type, cache_control
+                )
+        size = 0
+        try:
+            async for chunk in response.iter_chunks(CHUNK_SIZE):
+                writer = await asyncio.to_thread(_write_chunk, file, writer, chunk)
+                size += len(chunk)
+        except BaseException:
+            await asyncio.to_thread(file.close)
+            with contextlib.suppress(OSError):
+                os.remove(part)
+            if writer is not None:
+                writer.abort()
+            raise
+        await asyncio.to_thread(file.close)
+        await asyncio.to_thread(os.replace, part, path)
+    result.path = path
+    result.size = size
+    if writer is not None:
+        # A store that can't take the page doesn't fail the download
+        with contextlib.suppress(OSError):
+            await asyncio.to_thread(writer.commit)
+    return response
+
+
+async def _download_page(
+    client: AsyncClient,
+    page: Mapping,
+    result: PageDownload,
+    directory: str,
+    headers: Optional[Mapping[str, str]],
+    policy: Optional[RetryPolicy],
+    store: Optional[ImageStore],
+) -> None:
+    if not result.url:
+        # e.g. a MangaHere page whose URL could not be extracted
+        result.error = page.get("error") or "Page has no image URL"
+        return
+    if store is not None and await _copy_from_store(store, result, directory):
+        return
+    request_headers = image_headers(headers, page.get("headerForImage"))
+
+    async def send(timeout: float) -> StreamingResponse:
+        return await _fetch_to_file(client, result, directory, request_headers, timeout, store)
+
+    try:
+        response = await fetch_with_retries(send, policy)
+        response.raise_for_status()
+        result.error = None
+    except (RequestError, OSError) as e:
+        result.error = str(e) or type(e).__name__
+
+
+async def download_chapter_async(
+    pages: Iterable[Mapping],
+    directory: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    per_host: int = DEFAULT_PER_HOST,
+    headers: Optional[Mapping[str, str]] = None,
+    client: Optional[AsyncClient] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    store: Optional[ImageStore] = None,
+) -> List[PageDownload]:
+    """
+    Downloads the pages of a fetch_chapter_pages result into `directory`
+    as 001.jpg, 002.png, ... in list order. Each page is requested with
+    `headers` plus its own headerForImage and streamed to disk, so no page
+    is held in memory. At most `concurrency` pages are in flight, and at
+    most `per_host` of them against any one host.
+
+    A page that fails after the retries of `retry_policy` (the default
+    policy when None) is reported through its PageDownload's `error`
+    instead of failing the chapter.
+
+    Pages found in `store` (the shared image store when None, if one is
+    configured) are copied from it instead of downloaded, and downloaded
+    pages are added to it.
+    """
+    pages = list(pages)
+    await asyncio.to_thread(os.makedirs, directory, exist_ok=True)
+    client = client or get_async_client()
+    policy = retry_policy or get_default_policy()
+    # An empty store is falsy (it has a __len__), so test for None
+    store = store if store is not None else get_image_store()
+    limiter = ImageLimiter(concurrency, per_host)
+    results = [PageDownload(index, page.get("img")) for index, page in enumerate(pages)]
+    finished = 0
+
+    async def run(page: Mapping, result: PageDownload) -> None:
+        nonlocal finished
+        async with limiter.slot(result.url):
+            await _download_page(client, page, result, directory, headers, policy, store)
+        finished += 1
+        if on_progress is not None:
+            on_progress(result, finished, len(results))
+
+    await asyncio.gather(*(run(page, result) for page, result in zip(pages, results)))
+    return results
+
+
+def download_chapter(pages: Iterable[Mapping], directory: str, **kwargs) -> List[PageDownload]:
+    """
+    Blocking download_chapter_async; `on_progress` is called from the
+    shared background loop's thread.
+    """
+    return run_sync(download_chapter_async(pages, directory, **kwargs))
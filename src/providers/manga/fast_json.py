@@ -0,0 +1,46 @@
+import json
+from typing import Any, Dict, Optional, Union
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# One msgspec decoder per schema, built on first use
+_decoders: Dict[Any, Any] = {}
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Decodes a JSON document with the fastest backend installed: orjson, then
+    msgspec, then the standard library.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    if msgspec is not None:
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+
+def decode(data: Union[bytes, str], schema: Optional[Any] = None) -> Any:
+    """
+    Decodes `data` against `schema`, a TypedDict naming only the fields the
+    caller reads. With msgspec installed every other field is skipped while
+    parsing instead of being materialized; without it, or when the payload
+    does not match the schema, the whole document is decoded by `loads`.
+    Either way the result is plain dicts and lists.
+    """
+    if schema is None or msgspec is None:
+        return loads(data)
+    decoder = _decoders.get(schema)
+    if decoder is None:
+        decoder = _decoders[schema] = msgspec.json.Decoder(schema)
+    try:
+        return decoder.decode(data)
+    except msgspec.ValidationError:
+        return loads(data)
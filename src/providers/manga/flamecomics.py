@@ -1,10 +1,24 @@
-import requests
-from bs4 import BeautifulSoup
 from typing import List, Dict, Optional
+import soupsieve as sv
+from http_client import HTTPError
+from models import HEADERS
+from provider import MangaProvider
 
 
-class FlameComics:
+class FlameComics(MangaProvider):
+    TITLE = sv.compile("meta[property='og:title']")
+    DESCRIPTION = sv.compile("meta[property='og:description']")
+    IMAGE = sv.compile("meta[property='og:image']")
+    GENRES = sv.compile(".SeriesPage_badge__2tZ7A")
+    INFO_FIELDS = sv.compile(".SeriesPage_infoField__NWzAH")
+    INFO_VALUES = sv.compile(".SeriesPage_infoValue__Ty4ck")
+    CHAPTERS = sv.compile(".ChapterCard_chapterWrapper__j8pBx")
+    CHAPTER_TITLE = sv.compile("p[data-line-clamp='true']")
+    CHAPTER_DATE = sv.compile("p[data-size='xs']")
+    PAGES = sv.compile("div.m_6d731127.mantine-Stack-root img")
+
     def __init__(self):
+        super().__init__()
         self.name = "FlameComics"
         self.base_url = "https://flamecomics.xyz/"
         self.logo = "https://i.imgur.com/Nt1MW3H.png"
@@ -13,27 +27,27 @@ class FlameComics:
             "User-Agent": "Mozilla/5.0",
         }
 
-    def _get_request(self, url: str) -> str:
-        response = requests.get(f"{self.base_url}{url}", headers=self.headers)
+    async def _get_request(self, url: str) -> str:
+        response = await self.client.get(f"{self.base_url}{url}", headers=self.headers)
         response.raise_for_status()
         return response.text
     
-    def fetch_manga_info(self, manga_id: str) -> Dict:
+    async def fetch_manga_info_async(self, manga_id: str) -> Dict:
         manga_info = {
             "id": manga_id,
             "title": "",
         }
         try:
-            html_data = self._get_request(f"/series/{manga_id}")
-            soup = BeautifulSoup(html_data, "html.parser")
+            html_data = await self._get_request(f"/series/{manga_id}")
+            soup = self.parse_html(html_data)
             
-            title_meta = soup.select_one("meta[property='og:title']")
+            title_meta = self.TITLE.select_one(soup)
             manga_info["title"] = title_meta["content"] if title_meta else ""
             
-            desc_meta = soup.select_one("meta[property='og:description']")
+            desc_meta = self.DESCRIPTION.select_one(soup)
             manga_info["description"] = desc_meta["content"].strip() if desc_meta else ""
             
-            image_meta = soup.select_one("meta[property='og:image']")
+            image_meta = self.IMAGE.select_one(soup)
             manga_info["image"] = image_meta["content"] if image_meta else ""
             manga_info["headerForImage"] = {"Referer": self.base_url}
             
@@ -41,11 +55,11 @@ class FlameComics:
             # status_badge = soup.select_one("div.mantine-Badge-root span.mantine-Badge-label")
             # manga_info["status"] = status_badge.text.strip() if status_badge else "Unknown"
             
-            genre_badges = soup.select(".SeriesPage_badge__2tZ7A")
+            genre_badges = self.GENRES.select(soup)
             manga_info["genres"] = [badge.text.strip() for badge in genre_badges] if genre_badges else []
             
-            info_fields = soup.select(".SeriesPage_infoField__NWzAH")
-            info_values = soup.select(".SeriesPage_infoValue__Ty4ck")
+            info_fields = self.INFO_FIELDS.select(soup)
+            info_values = self.INFO_VALUES.select(soup)
             
             for i, field in enumerate(info_fields):
                 field_text = field.text.strip().lower()
@@ -64,12 +78,12 @@ class FlameComics:
                         manga_info["type"] = value_text
             
             # Extract chapters
-            chapter_links = soup.select(".ChapterCard_chapterWrapper__j8pBx")
+            chapter_links = self.CHAPTERS.select(soup)
             chapters = []
             
             for link in chapter_links:
-                chapter_title = link.select_one("p[data-line-clamp='true']")
-                chapter_date = link.select_one("p[data-size='xs']")
+                chapter_title = self.CHAPTER_TITLE.select_one(link)
+                chapter_date = self.CHAPTER_DATE.select_one(link)
                 
                 if chapter_title and link.get("href"):
                     chapter_id = link["href"].split("/")[-1] if link.get("href") else ""
@@ -95,27 +109,28 @@ class FlameComics:
                 manga_info["releasedDate"] = "N/A"
             
             return manga_info
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
 
-    def fetch_chapter_pages(self, chapter_id: str) -> List[Dict]:
+    async def fetch_chapter_pages_async(self, chapter_id: str) -> List[Dict]:
         try:
-            html_data = self._get_request(f"/{chapter_id}")
-            soup = BeautifulSoup(html_data, "html.parser")
-            page_selector = "div.m_6d731127.mantine-Stack-root img"
+            html_data = await self._get_request(f"/{chapter_id}")
+            soup = self.parse_html(html_data)
+            # One read-only mapping shared by every page, and every chapter
+            header = HEADERS.share({"Referer": self.base_url})
             pages = [
                 {
                     "img": el["src"],
                     "page": i+1,
-                    "headerForImage": {"Referer": self.base_url},
+                    "headerForImage": header,
                 }
-                for i, el in enumerate(soup.select(page_selector))
+                for i, el in enumerate(self.PAGES.select(soup))
             ]
 
             return pages
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
\ No newline at end of file
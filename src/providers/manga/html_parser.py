@@ -0,0 +1,332 @@
+import contextvars
+import html
+import json
+import re
+from functools import lru_cache
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import soupsieve as sv
+from bs4 import BeautifulSoup, Comment, FeatureNotFound, NavigableString, SoupStrainer, Tag
+from bs4.builder import HTMLParserTreeBuilder
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Tree builders check_backends compares, fastest first. "html.parser" is
+# the stdlib one, always available, and the default: the others build
+# different trees from malformed markup, which positional selectors notice,
+# so a provider only switches (with `parser_backend`) once check_backends
+# agrees on its pages.
+BACKENDS = ("lxml", "html.parser", "html5lib")
+REFERENCE_BACKEND = "html.parser"
+
+
+def _available(backend: str) -> bool:
+    try:
+        BeautifulSoup("", backend)
+    except FeatureNotFound:
+        return False
+    return True
+
+
+AVAILABLE_BACKENDS = tuple(b for b in BACKENDS if _available(b))
+_default_backend = REFERENCE_BACKEND
+# Set by check_backends to force a backend for every parse in one call
+_forced_backend: contextvars.ContextVar = contextvars.ContextVar(
+    "forced_backend", default=None
+)
+
+
+def configure_parser(backend: str) -> None:
+    """
+    Sets the backend used by providers that don't pick their own.
+    """
+    global _default_backend
+    if backend not in AVAILABLE_BACKENDS:
+        raise ValueError(
+            f"Parser backend {backend!r} is not available; "
+            f"installed: {', '.join(AVAILABLE_BACKENDS)}"
+        )
+    _default_backend = backend
+
+
+def resolve_backend(backend: Optional[str] = None) -> str:
+    """
+    Returns the backend a parse will use: the one forced by check_backends,
+    else `backend` if it is installed, else the default.
+    """
+    forced = _forced_backend.get()
+    if forced:
+        return forced
+    if backend in AVAILABLE_BACKENDS:
+        return backend
+    return _default_backend
+
+
+def parse_html(markup, backend: Optional[str] = None) -> BeautifulSoup:
+    return BeautifulSoup(markup, resolve_backend(backend))
+
+
+def parse_partial(
+    markup,
+    name=None,
+    attrs: Optional[Dict] = None,
+    backend: Optional[str] = None,
+) -> BeautifulSoup:
+    """
+    Builds a tree of only the tags matching `name` and `attrs` (and their
+    contents), skipping the rest of the document.
+    """
+    backend = resolve_backend(backend)
+    if backend == "html5lib":
+        # html5lib ignores parse_only and would build the whole tree anyway
+        backend = REFERENCE_BACKEND
+    return BeautifulSoup(markup, backend, parse_only=SoupStrainer(name, attrs or {}))
+
+
+# Fast paths below scan the raw markup without building a tree. They only
+# accept well-formed matches; callers fall back to parse_partial otherwise.
+_ATTRIBUTE = re.compile(
+    r"""([^\s"'<>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?"""
+)
+_SCRIPT = re.compile(
+    r"<script\b((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>(.*?)</script\s*>",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+@lru_cache(maxsize=64)
+def _open_tag(name: str) -> re.Pattern:
+    return re.compile(
+        rf"<{re.escape(name)}\b((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>", re.IGNORECASE
+    )
+
+
+def parse_attributes(raw: str) -> Dict[str, str]:
+    """
+    Parses the attribute part of an opening tag. As in bs4, the first
+    occurrence of a repeated attribute wins and entities are decoded.
+    """
+    attributes = {}
+    for match in _ATTRIBUTE.finditer(raw):
+        name, double, single, bare = match.groups()
+        value = next((v for v in (double, single, bare) if v is not None), "")
+        attributes.setdefault(name.lower(), html.unescape(value))
+    return attributes
+
+
+def find_attribute(
+    markup: str,
+    name: str,
+    attribute: str,
+    attrs: Optional[Dict[str, str]] = None,
+    backend: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Returns `attribute` of the first `name` tag whose attributes include
+    `attrs`, e.g. the props of one astro-island. Scans opening tags with a
+    regex and only parses (the matching tags alone) when that finds nothing.
+    """
+    attrs = attrs or {}
+    for match in _open_tag(name).finditer(markup):
+        found = parse_attributes(match.group(1))
+        if attribute in found and all(found.get(k) == v for k, v in attrs.items()):
+            return found[attribute]
+
+    tag = parse_partial(markup, name, attrs, backend).find(name, attrs)
+    return tag.get(attribute) if tag else None
+
+
+def find_scripts(markup: str, backend: Optional[str] = None) -> List[Tuple[Dict[str, str], str]]:
+    """
+    Returns (attributes, text) for every script element. Script bodies are
+    raw text in HTML, so a regex finds them exactly; a partial parse is used
+    only when it finds none.
+    """
+    scripts = [(parse_attributes(raw), text) for raw, text in _SCRIPT.findall(markup)]
+    if scripts:
+        return scripts
+    return [
+        (dict(script.attrs), script.string or "")
+        for script in parse_partial(markup, "script", backend=backend).find_all("script")
+    ]
+
+
+_COMPOUND = re.compile(r"^([a-zA-Z][\w-]*|\*)?((?:\.[\w-]+)*)$")
+
+
+class _RowSelector:
+    """
+    The subset of CSS the streaming parser can evaluate on a partial tree:
+    tag and class compounds joined by descendant or child combinators, e.g.
+    "ul.detail-main-list > li > a". Only ancestors are consulted, and those
+    are complete by the time a row starts.
+    """
+
+    def __init__(self, selector: str):
+        self.selector = selector
+        self.steps: List[Tuple[str, Optional[str], frozenset]] = []
+        combinator = " "
+        for token in selector.replace(">", " > ").split():
+            if token == ">":
+                combinator = ">"
+                continue
+            match = _COMPOUND.match(token)
+            if not match:
+                raise ValueError(f"Unsupported row selector {selector!r}")
+            tag = match.group(1) if match.group(1) not in (None, "*") else None
+            classes = frozenset(c for c in match.group(2).split(".") if c)
+            self.steps.append((combinator, tag and tag.lower(), classes))
+            combinator = " "
+
+    @staticmethod
+    def _matches_compound(element, tag, classes) -> bool:
+        if not isinstance(element.tag, str):
+            return False
+        if tag and element.tag.lower() != tag:
+            return False
+        return classes.issubset((element.get("class") or "").split())
+
+    def _matches(self, element, index: int) -> bool:
+        combinator, tag, classes = self.steps[index]
+        if not self._matches_compound(element, tag, classes):
+            return False
+        if index == 0:
+            return True
+        if combinator == ">":
+            parent = element.getparent()
+            return parent is not None and self._matches(parent, index - 1)
+        return any(self._matches(a, index - 1) for a in element.iterancestors())
+
+    def __call__(self, element) -> bool:
+        return self._matches(element, len(self.steps) - 1)
+
+
+@lru_cache(maxsize=64)
+def _row_selector(selector: str) -> _RowSelector:
+    return _RowSelector(selector)
+
+
+# Gives detached rows the HTML rules (void elements, whitespace) of a parse
+_ROW_BUILDER = HTMLParserTreeBuilder()
+
+
+def _row_tag(element) -> Tag:
+    """
+    Copies an lxml subtree into a detached bs4 Tag without re-parsing it.
+    """
+    attrs = dict(element.attrib)
+    if "class" in attrs:
+        # bs4 exposes class as a list of names
+        attrs["class"] = attrs["class"].split()
+    tag = Tag(builder=_ROW_BUILDER, name=element.tag, attrs=attrs)
+    if element.text:
+        tag.append(NavigableString(element.text))
+    for child in element:
+        if isinstance(child.tag, str):
+            tag.append(_row_tag(child))
+        elif child.tag is etree.Comment:
+            tag.append(Comment(child.text or ""))
+        if child.tail:
+            tag.append(NavigableString(child.tail))
+    return tag
+
+
+async def iter_rows(
+    chunks: AsyncIterator[bytes],
+    selector: Union[str, sv.SoupSieve],
+    encoding: Optional[str] = None,
+    backend: Optional[str] = None,
+) -> AsyncIterator[Tag]:
+    """
+    Parses an HTML body as it downloads and yields each element matching
+    `selector` as soon as its end tag arrives, as a detached bs4 Tag, so row
+    extractors written for full pages work unchanged. Finished rows and
+    everything before them are dropped from the tree, keeping memory flat
+    however long the list is. `selector` may be a string or a pattern
+    compiled with soupsieve, as providers keep theirs.
+
+    Rows are built by lxml, so this only streams when `backend` resolves to
+    "lxml"; otherwise, or without lxml, the body is read whole and parsed
+    once with the backend, giving the same rows as the provider's pages.
+    """
+    if etree is None or resolve_backend(backend) != "lxml":
+        markup = b"".join([chunk async for chunk in chunks])
+        for row in parse_html(markup, backend).select(selector):
+            yield row
+        return
+
+    matches = _row_selector(selector if isinstance(selector, str) else selector.pattern)
+    # Like Response.text, assume UTF-8 when the headers name no charset
+    parser = etree.HTMLPullParser(events=("start", "end"), encoding=encoding or "utf-8")
+    # Whether each open element is a row, and how many rows are open; rows
+    # nested in rows are yielded too but only pruned with the outermost one
+    open_elements: List[bool] = []
+    open_rows = 0
+
+    def drain():
+        nonlocal open_rows
+        for event, element in parser.read_events():
+            if event == "start":
+                is_row = matches(element)
+                open_elements.append(is_row)
+                open_rows += is_row
+                continue
+            is_row = open_elements.pop() if open_elements else False
+            if is_row:
+                open_rows -= 1
+                yield _row_tag(element)
+            if open_rows == 0 and element.getparent() is not None:
+                element.clear(keep_tail=True)
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+
+    async for chunk in chunks:
+        parser.feed(chunk)
+        for row in drain():
+            yield row
+    parser.close()
+    for row in drain():
+        yield row
+
+
+class BackendMismatch(AssertionError):
+    def __init__(self, results: Dict[str, object]):
+        self.results = results
+        backends = ", ".join(results)
+        super().__init__(f"Parser backends disagree: {backends}")
+
+
+def _normalize(result) -> str:
+    return json.dumps(result, sort_keys=True, default=str)
+
+
+async def check_backends(
+    call: Callable[[], Awaitable],
+    backends: Optional[Iterable[str]] = None,
+):
+    """
+    Runs `call()` once per backend and checks that every run extracts the
+    same result, e.g.
+
+        await check_backends(lambda: provider.fetch_manga_info_async(id))
+
+    Returns the common result or raises BackendMismatch holding each
+    backend's result. Runs are sequential, so with a provider `cache_ttl` set
+    every backend parses the same cached page.
+    """
+    results = {}
+    for backend in backends or AVAILABLE_BACKENDS:
+        if backend not in AVAILABLE_BACKENDS:
+            continue
+        token = _forced_backend.set(backend)
+        try:
+            results[backend] = await call()
+        finally:
+            _forced_backend.reset(token)
+
+    if len({_normalize(result) for result in results.values()}) > 1:
+        raise BackendMismatch(results)
+    return next(iter(results.values()), None)
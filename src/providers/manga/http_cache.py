@@ -0,0 +1,290 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+DEFAULT_MEMORY_ENTRIES = 512
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_BYTES = 512 * 1024 * 1024
+
+
+class CacheEntry:
+    def __init__(
+        self,
+        url: str,
+        status_code: int,
+        headers: Iterable[Tuple[str, str]],
+        content: bytes,
+        encoding: Optional[str],
+        expires_at: float,
+    ):
+        self.url = url
+        self.status_code = status_code
+        self.headers = list(headers)
+        self.content = content
+        self.encoding = encoding
+        self.expires_at = expires_at
+
+    @property
+    def size(self) -> int:
+        # The body dominates; headers are counted roughly
+        return len(self.content) + sum(len(n) + len(v) for n, v in self.headers)
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def validators(self) -> Dict[str, str]:
+        """
+        Conditional request headers that let the origin answer 304.
+        """
+        conditions = {}
+        for name, value in self.headers:
+            lowered = name.lower()
+            if lowered == "etag":
+                conditions["If-None-Match"] = value
+            elif lowered == "last-modified":
+                conditions["If-Modified-Since"] = value
+        return conditions
+
+
+def cache_key(url: str, params: Optional[Dict], headers: Optional[Dict]) -> str:
+    # Request headers are part of the key: providers vary cookies and
+    # referers per call and the origin may answer differently.
+    pairs = params.items() if isinstance(params, dict) else params or []
+    raw = json.dumps(
+        [
+            url,
+            sorted((str(k), str(v)) for k, v in pairs),
+            sorted((k.lower(), str(v)) for k, v in (headers or {}).items()),
+        ]
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def freshness_lifetime(headers, ttl_override: Optional[float]) -> Optional[float]:
+    """
+    Seconds a response may be served without revalidation, or None if it must
+    not be stored at all. `ttl_override` applies only when the origin sends no
+    caching headers of its own.
+    """
+    directives = {}
+    for part in headers.get("Cache-Control", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"')
+
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0
+    for name in ("s-maxage", "max-age"):
+        if name in directives:
+            try:
+                return max(0, int(directives[name]))
+            except ValueError:
+                return 0
+    if "Expires" in headers:
+        try:
+            expires = parsedate_to_datetime(headers["Expires"]).timestamp()
+            date = parsedate_to_datetime(headers["Date"]).timestamp() if "Date" in headers else time.time()
+        except (TypeError, ValueError):
+            return 0
+        return max(0, expires - date)
+    return ttl_override or 0
+
+
+class HttpCache:
+    """
+    Two-level response cache: an in-memory LRU in front of an optional disk
+    store. Entries outlive their freshness so they can be revalidated with
+    ETag/Last-Modified instead of refetched.
+
+    The memory level holds at most `memory_entries` entries and
+    `memory_bytes` of bodies, the disk level at most `disk_bytes`; each
+    drops its least recently used entries to stay within them, and skips
+    a response larger than its whole budget. The disk index is rebuilt on
+    start, oldest written first.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+        memory_bytes: int = DEFAULT_MEMORY_BYTES,
+        disk_bytes: int = DEFAULT_DISK_BYTES,
+    ):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._memory_size = 0
+        # Key -> size of its file, least recently used first
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    @property
+    def memory_size(self) -> int:
+        return self._memory_size
+
+    @property
+    def disk_size(self) -> int:
+        return self._disk_size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _load(self) -> None:
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                if name.endswith(".tmp"):
+                    # Cut short by a crash
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name, stat.st_size))
+        for _, key, size in sorted(files):
+            self._disk[key] = size
+            self._disk_size += size
+        with self._disk_lock:
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        while self._disk_size > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _forget(self, key: str) -> None:
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_size -= entry.size
+
+    def _remember(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._forget(key)
+            if entry.size > self.memory_bytes:
+                return
+            self._memory[key] = entry
+            self._memory_size += entry.size
+            while self._memory and (
+                len(self._memory) > self.memory_entries
+                or self._memory_size > self.memory_bytes
+            ):
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= evicted.size
+
+    def get_memory(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            return entry
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        Looks the key up in memory, then on disk. Disk reads block, so async
+        callers run this in a worker thread after a memory miss.
+        """
+        entry = self.get_memory(key)
+        if entry is not None or not self.directory:
+            return entry
+        try:
+            with open(self._path(key), "rb") as f:
+                meta = json.loads(f.readline())
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+        with self._disk_lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+        entry = CacheEntry(
+            meta["url"],
+            meta["status_code"],
+            meta["headers"],
+            content,
+            meta["encoding"],
+            meta["expires_at"],
+        )
+        self._remember(key, entry)
+        return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        self._remember(key, entry)
+        if not self.directory:
+            return
+        path = self._path(key)
+        meta = json.dumps(
+            {
+                "url": entry.url,
+                "status_code": entry.status_code,
+                "headers": entry.headers,
+                "encoding": entry.encoding,
+                "expires_at": entry.expires_at,
+            }
+        ).encode() + b"\n"
+        size = len(meta) + len(entry.content)
+        if size > self.disk_bytes:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write aside and rename so readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(meta)
+            f.write(entry.content)
+        with self._disk_lock:
+            os.replace(tmp_path, path)
+            self._disk_size += size - self._disk.pop(key, 0)
+            self._disk[key] = size
+            self._evict_disk()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+        if self.directory:
+            with self._disk_lock:
+                for root, _, files in os.walk(self.directory):
+                    for name in files:
+                        os.remove(os.path.join(root, name))
+                self._disk.clear()
+                self._disk_size = 0
+
+
+_cache: Optional[HttpCache] = HttpCache()
+
+
+def configure_cache(
+    enabled: bool = True,
+    directory: Optional[str] = None,
+    memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+    memory_bytes: int = DEFAULT_MEMORY_BYTES,
+    disk_bytes: int = DEFAULT_DISK_BYTES,
+) -> None:
+    """
+    Replaces the shared cache. Pass a `directory` to back the memory LRU with
+    a disk store that survives restarts.
+    """
+    global _cache
+    _cache = (
+        HttpCache(directory, memory_entries, memory_bytes, disk_bytes) if enabled else None
+    )
+
+
+def get_cache() -> Optional[HttpCache]:
+    return _cache
@@ -0,0 +1,696 @@
+import asyncio
+import atexit
+import contextlib
+import ipaddress
+import queue
+import socket
+import threading
+import time
+import weakref
+import aiohttp
+import requests
+from multidict import CIMultiDict
+from requests.adapters import HTTPAdapter
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple, Union
+from urllib.parse import urlsplit
+from fast_json import decode
+from http_cache import CacheEntry, cache_key, freshness_lifetime, get_cache
+from rate_limit import HostLimiter, get_limiter
+from resilience import IDEMPOTENT_METHODS, RetryPolicy, get_default_policy, send_with_retries
+
+# Number of per-host pools kept alive at once (one per origin we talk to).
+DEFAULT_POOL_CONNECTIONS = 32
+# Keep-alive connections retained per host.
+DEFAULT_POOL_MAXSIZE = 16
+# Total simultaneous connections held by one async session.
+DEFAULT_CONNECTION_LIMIT = 256
+
+_lock = threading.Lock()
+_config = {
+    "pool_connections": DEFAULT_POOL_CONNECTIONS,
+    "pool_maxsize": DEFAULT_POOL_MAXSIZE,
+    "pool_block": False,
+    "connection_limit": DEFAULT_CONNECTION_LIMIT,
+    "host_limits": {},
+}
+
+
+def configure_pool(
+    pool_connections: Optional[int] = None,
+    pool_maxsize: Optional[int] = None,
+    pool_block: Optional[bool] = None,
+    connection_limit: Optional[int] = None,
+    host_limits: Optional[Dict[str, int]] = None,
+) -> None:
+    """
+    Updates the pool settings of the shared transport. `host_limits` maps a
+    host (e.g. "api.mangadex.org") to a hard cap on open connections to it;
+    requests over the cap wait for a free connection instead of opening more.
+    The async sessions are rebuilt on next use; sessions already passed to
+    `mount_pools` keep the settings they were mounted with.
+    """
+    with _lock:
+        if pool_connections is not None:
+            _config["pool_connections"] = pool_connections
+        if pool_maxsize is not None:
+            _config["pool_maxsize"] = pool_maxsize
+        if pool_block is not None:
+            _config["pool_block"] = pool_block
+        if connection_limit is not None:
+            _config["connection_limit"] = connection_limit
+        if host_limits is not None:
+            _config["host_limits"] = dict(host_limits)
+    _drop_async_sessions()
+
+
+def mount_pools(session: requests.Session) -> requests.Session:
+    """
+    Mounts the configured keep-alive adapters on `session`. Everything else
+    goes through AsyncClient; this remains for Comick, whose Cloudflare
+    challenge solving only exists as cloudscraper's requests.Session.
+    """
+    adapter = HTTPAdapter(
+        pool_connections=_config["pool_connections"],
+        pool_maxsize=_config["pool_maxsize"],
+        pool_block=_config["pool_block"],
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    # requests picks the adapter with the longest matching prefix, so these
+    # take precedence over the defaults above for their hosts.
+    for host, limit in _config["host_limits"].items():
+        host_adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=limit, pool_block=True
+        )
+        session.mount(f"https://{host}", host_adapter)
+        session.mount(f"http://{host}", host_adapter)
+    return session
+
+
+class RequestError(Exception):
+    """
+    Base class for transport failures raised by the async client.
+    """
+
+
+class ConnectError(RequestError):
+    pass
+
+
+class BlockedAddress(RequestError):
+    """
+    Raised for URLs that lead to a loopback, private, link-local or
+    otherwise non-public address, by clients limited to public hosts.
+    """
+
+
+class Timeout(RequestError):
+    pass
+
+
+class HTTPError(RequestError):
+    def __init__(self, message: str, response: "Response"):
+        super().__init__(message)
+        self.response = response
+
+
+class Response:
+    """
+    Fully buffered response, shaped like `requests.Response` so provider code
+    reads the same on both transports.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        status_code: int,
+        headers: CIMultiDict,
+        content: bytes,
+        encoding: Optional[str] = None,
+    ):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding or "utf-8"
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors="replace")
+
+    def json(self, schema: Optional[Any] = None) -> Any:
+        return decode(self.content, schema)
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise HTTPError(f"{self.status_code} Error for url: {self.url}", self)
+
+
+class StreamingResponse:
+    """
+    Response whose body has not been read yet; see AsyncClient.stream.
+    """
+
+    def __init__(self, response: aiohttp.ClientResponse):
+        self._response = response
+        self.url = str(response.url)
+        self.status_code = response.status
+        self.headers = CIMultiDict(response.headers)
+        self.encoding = response.charset
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    async def iter_chunks(self, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        async for chunk in self._response.content.iter_chunked(chunk_size):
+            yield chunk
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            Response(self.url, self.status_code, self.headers, b"", self.encoding).raise_for_status()
+
+
+class _HostSlot:
+    """
+    What a request reports back to the host limiter when it finishes.
+    `outcome` is (status, Retry-After) and stays None for failures that say
+    nothing about the host's load.
+    """
+
+    def __init__(self, limiter: Optional[HostLimiter]):
+        self.started = time.monotonic()
+        self.outcome: Optional[Tuple[Optional[int], Optional[str]]] = None
+        self.latency: Optional[float] = None
+        self._limiter = limiter
+
+    def finish(self, status: Optional[int], retry_after: Optional[str]) -> None:
+        self.outcome = (status, retry_after)
+        self.latency = time.monotonic() - self.started
+
+    async def release(self) -> None:
+        """
+        Reports the outcome and frees the limiter's place; only the first
+        call does anything.
+        """
+        limiter, self._limiter = self._limiter, None
+        if limiter is not None:
+            if self.outcome is not None:
+                limiter.record(self.outcome[0], self.latency, self.outcome[1])
+            await limiter.release()
+
+
+def _wait_timeout(timeout: Union[None, float, Tuple[float, float]]) -> Optional[float]:
+    # Waiting for a place counts against the connect timeout, as waiting for
+    # a pooled connection does in aiohttp
+    return timeout[0] if isinstance(timeout, tuple) else timeout
+
+
+def _client_timeout(
+    timeout: Union[float, Tuple[float, float]]
+) -> aiohttp.ClientTimeout:
+    # Accepts the same shapes as requests: a number or (connect, read).
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+    return aiohttp.ClientTimeout(total=timeout)
+
+
+def is_public_address(address: str) -> bool:
+    # Scoped IPv6 addresses carry their interface after a %
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+class PublicResolver(aiohttp.abc.AbstractResolver):
+    """
+    Resolves names for the connections of public-only clients, refusing
+    with BlockedAddress any name with a non-public address. Since this is
+    the lookup the connection is made with, a name that answers an earlier
+    check with a public address and then rebinds to a private one is still
+    refused. aiohttp connects to literal IPs without asking a resolver.
+    """
+
+    def __init__(self, resolver: Optional[aiohttp.abc.AbstractResolver] = None):
+        self._resolver = resolver or aiohttp.DefaultResolver()
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET):
+        addresses = await self._resolver.resolve(host, port, family)
+        if not all(is_public_address(address["host"]) for address in addresses):
+            raise BlockedAddress(f"{host} is not a public host")
+        return addresses
+
+    async def close(self) -> None:
+        await self._resolver.close()
+
+
+# One aiohttp session and set of host semaphores per event loop; aiohttp
+# sessions cannot be shared across loops. Public-only clients get sessions
+# of their own, whose connectors resolve through PublicResolver.
+_async_sessions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_public_sessions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_host_semaphores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _drop_async_sessions() -> None:
+    for sessions in (_async_sessions, _public_sessions):
+        for loop, session in list(sessions.items()):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(
+                    lambda s=session: asyncio.ensure_future(s.close())
+                )
+        sessions.clear()
+    _host_semaphores.clear()
+
+
+class AsyncClient:
+    """
+    Shared HTTP client of the providers. The underlying aiohttp session is created lazily for whichever event loop is running, keeps
+    connections alive per host and honours the `host_limits` caps.
+
+    GET responses go through the shared HTTP cache. `cache_ttl` is how long a
+    response may be reused when the origin sends no caching headers.
+    Idempotent requests are retried under `retry_policy`, or the default
+    policy from `resilience.configure_resilience` when none is given.
+
+    With `public_only`, names are only connected to when every address they
+    resolve to is public (see PublicResolver); literal IPs are the caller's
+    to check, e.g. with image_fetch.check_public_url.
+    """
+
+    def __init__(
+        self,
+        cache_ttl: Optional[float] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        public_only: bool = False,
+    ):
+        self.cache_ttl = cache_ttl
+        self.retry_policy = retry_policy
+        self.public_only = public_only
+
+    def public(self) -> "AsyncClient":
+        """
+        This client, or one like it limited to public hosts.
+        """
+        if self.public_only:
+            return self
+        return AsyncClient(self.cache_ttl, self.retry_policy, public_only=True)
+
+    def _session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        sessions = _public_sessions if self.public_only else _async_sessions
+        session = sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=_config["connection_limit"],
+                limit_per_host=_config["pool_maxsize"],
+                resolver=PublicResolver() if self.public_only else None,
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            sessions[loop] = session
+        return session
+
+    def _host_semaphore(self, url: str) -> Optional[asyncio.Semaphore]:
+        host = urlsplit(url).hostname
+        limit = _config["host_limits"].get(host)
+        if not limit:
+            return None
+        semaphores = _host_semaphores.setdefault(asyncio.get_running_loop(), {})
+        if host not in semaphores:
+            semaphores[host] = asyncio.Semaphore(limit)
+        return semaphores[host]
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict] = None,
+        headers: Optional[Dict[str, str]] = None,
+        data: Any = None,
+        timeout: Union[None, float, Tuple[float, float]] = None,
+        verify: bool = True,
+    ) -> Response:
+        cache = get_cache()
+        if method != "GET" or cache is None:
+            return await self._send(method, url, params, headers, data, timeout, verify)
+
+        key = cache_key(url, params, headers)
+        entry = cache.get_memory(key)
+        if entry is None and cache.directory:
+            entry = await asyncio.to_thread(cache.get, key)
+        if entry is not None and entry.is_fresh:
+            return _cached_response(entry)
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            request_headers.update(entry.validators())
+        response = await self._send(
+            method, url, params, request_headers, data, timeout, verify
+        )
+
+        if response.status_code == 304 and entry is not None:
+            # Still valid: keep the stored body, take the new expiry
+            lifetime = freshness_lifetime(response.headers, self.cache_ttl) or 0
+            entry.expires_at = time.time() + lifetime
+            await self._store(cache, key, entry)
+            return _cached_response(entry)
+
+        if response.status_code == 200:
+            lifetime = freshness_lifetime(response.headers, self.cache_ttl)
+            if lifetime is not None:
+                entry = CacheEntry(
+                    response.url,
+                    response.status_code,
+                    response.headers.items(),
+                    response.content,
+                    response.encoding,
+                    time.time() + lifetime,
+                )
+                # Nothing to gain from storing what can be neither reused
+                # nor revalidated
+                if lifetime > 0 or entry.validators():
+                    await self._store(cache, key, entry)
+        return response
+
+    async def _store(self, cache, key: str, entry: CacheEntry) -> None:
+        if cache.directory:
+            await asyncio.to_thread(cache.set, key, entry)
+        else:
+            cache.set(key, entry)
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict],
+        headers: Optional[Dict[str, str]],
+        data: Any,
+        timeout: Union[None, float, Tuple[float, float]],
+        verify: bool,
+    ) -> Response:
+        policy = self.retry_policy or get_default_policy()
+        if policy is None or method not in IDEMPOTENT_METHODS:
+            return await self._send_once(method, url, params, headers, data, timeout, verify)
+
+        async def send(attempt_timeout: float) -> Response:
+            # A timeout chosen by the caller wins over the policy's
+            return await self._send_once(
+                method, url, params, headers, data, timeout or attempt_timeout, verify
+            )
+
+        return await send_with_retries(
+            send, urlsplit(url).hostname, policy, (ConnectError, Timeout), Timeout
+        )
+
+    async def _send_once(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict],
+        headers: Optional[Dict[str, str]],
+        data: Any,
+        timeout: Union[None, float, Tuple[float, float]],
+        verify: bool,
+    ) -> Response:
+        options = _request_options(params, headers, data, timeout, verify)
+        async with self._host_slot(url, timeout) as slot:
+            async with self._session().request(method, url, **options) as response:
+                # Latency to the headers; a large body isn't host congestion
+                slot.finish(response.status, response.headers.get("Retry-After"))
+                content = await response.read()
+                return Response(
+                    str(response.url),
+                    response.status,
+                    CIMultiDict(response.headers),
+                    content,
+                    response.charset,
+                )
+
+    @contextlib.asynccontextmanager
+    async def _host_slot(
+        self, url: str, timeout: Union[None, float, Tuple[float, float]] = None
+    ) -> AsyncIterator[_HostSlot]:
+        """
+        Holds the host's semaphore and limiter for one request, translates
+        aiohttp errors and feeds the outcome back to the limiter. Waiting
+        for them gives up with Timeout after the connect timeout.
+        """
+        semaphore = self._host_semaphore(url)
+        limiter = get_limiter(urlsplit(url).hostname)
+        try:
+            async with asyncio.timeout(_wait_timeout(timeout)):
+                if semaphore is not None:
+                    await semaphore.acquire()
+                try:
+                    if limiter is not None:
+                        await limiter.acquire()
+                except BaseException:
+                    if semaphore is not None:
+                        semaphore.release()
+                    raise
+        except TimeoutError as e:
+            raise Timeout(f"Timed out waiting to access {url}") from e
+        slot = _HostSlot(limiter)
+        try:
+            yield slot
+        except asyncio.TimeoutError as e:
+            if slot.outcome is None:
+                slot.finish(None, None)
+            raise Timeout(f"Timed out while accessing {url}") from e
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError) as e:
+            # Payload errors are connections dropped mid-body
+            raise ConnectError(f"Connection to {url} failed: {e}") from e
+        except aiohttp.ClientError as e:
+            raise RequestError(f"Request to {url} failed: {e}") from e
+        finally:
+            await slot.release()
+            if semaphore is not None:
+                semaphore.release()
+
+    @contextlib.asynccontextmanager
+    async def stream(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict] = None,
+        headers: Optional[Dict[str, str]] = None,
+        data: Any = None,
+        timeout: Union[None, float, Tuple[float, float]] = None,
+        verify: bool = True,
+        allow_redirects: bool = True,
+    ) -> AsyncIterator[StreamingResponse]:
+        """
+        Sends a request and hands back the response as soon as its headers
+        arrive; the body is read incrementally with `iter_chunks()`. Streams
+        skip the cache and retries, since a half-read body can't be replayed.
+
+        The host's pacing place is given back once the headers arrive, so
+        slow readers of the body don't hold up other requests to the host;
+        a `host_limits` cap stays held while the connection is open. With
+        `allow_redirects` False a redirect is handed back as is.
+        """
+        options = _request_options(params, headers, data, timeout, verify)
+        options["allow_redirects"] = allow_redirects
+        async with self._host_slot(url, timeout) as slot:
+            async with self._session().request(method, url, **options) as response:
+                # Latency to the headers; a long body isn't host congestion
+                slot.finish(response.status, response.headers.get("Retry-After"))
+                await slot.release()
+                yield StreamingResponse(response)
+
+    async def get(self, url: str, **kwargs) -> Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def close(self) -> None:
+        """
+        Closes the session bound to the running loop. Call it before a loop
+        you own (e.g. one started with asyncio.run) shuts down.
+        """
+        sessions = _public_sessions if self.public_only else _async_sessions
+        session = sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+
+def _request_options(
+    params: Optional[Dict],
+    headers: Optional[Dict[str, str]],
+    data: Any,
+    timeout: Union[None, float, Tuple[float, float]],
+    verify: bool,
+) -> Dict[str, Any]:
+    options = {"params": params, "headers": headers, "data": data}
+    if timeout is not None:
+        options["timeout"] = _client_timeout(timeout)
+    if not verify:
+        options["ssl"] = False
+    return options
+
+
+def _cached_response(entry: CacheEntry) -> Response:
+    return Response(
+        entry.url,
+        entry.status_code,
+        CIMultiDict(entry.headers),
+        entry.content,
+        entry.encoding,
+    )
+
+
+_async_client = AsyncClient()
+
+
+def get_async_client(
+    cache_ttl: Optional[float] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+) -> AsyncClient:
+    """
+    Returns an async client on the shared connection pool. Providers pass
+    their own `cache_ttl` and `retry_policy`; every client shares the same
+    sessions and cache.
+    """
+    if cache_ttl is None and retry_policy is None:
+        return _async_client
+    return AsyncClient(cache_ttl=cache_ttl, retry_policy=retry_policy)
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="http-client-loop", daemon=True
+                ).start()
+                atexit.register(_close_background_session, loop)
+                _loop = loop
+    return _loop
+
+
+def _close_background_session(loop: asyncio.AbstractEventLoop) -> None:
+    for sessions in (_async_sessions, _public_sessions):
+        session = sessions.get(loop)
+        if session is not None and not session.closed:
+            asyncio.run_coroutine_threadsafe(session.close(), loop).result(timeout=5)
+
+
+def _ordinary(error: BaseException) -> Exception:
+    if isinstance(error, Exception):
+        return error
+    wrapped = RuntimeError(f"Provider code raised {type(error).__name__}: {error}")
+    wrapped.__cause__ = error
+    return wrapped
+
+
+async def contain_exit(awaitable):
+    """
+    Awaits `awaitable`, re-raising SystemExit, KeyboardInterrupt and any
+    other BaseException except cancellation as RuntimeError. Raised inside a
+    task they would stop the event loop running it, and with it every
+    blocking call waiting on the shared background loop.
+    """
+    try:
+        return await awaitable
+    except (Exception, asyncio.CancelledError):
+        raise
+    except BaseException as e:
+        raise _ordinary(e)
+
+
+def run_sync(coro, timeout: Optional[float] = None):
+    """
+    Runs `coro` to completion on the shared background loop and returns its
+    result. This is what the blocking provider methods go through, so every
+    sync caller in the process shares one async connection pool.
+
+    With `timeout` the call gives up after that many seconds, cancels the
+    coroutine and raises Timeout.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        coro.close()
+        raise RuntimeError(
+            "Blocking provider methods cannot run inside an event loop; "
+            "await the *_async variant instead"
+        )
+    future = asyncio.run_coroutine_threadsafe(contain_exit(coro), _background_loop())
+    try:
+        return future.result(timeout)
+    except TimeoutError as e:
+        if not future.done():
+            future.cancel()
+            raise Timeout(f"Gave up waiting after {timeout}s") from e
+        raise
+
+
+_END = object()
+
+
+def iter_sync(iterator: AsyncIterator, buffer: int = 256) -> Iterator:
+    """
+    Blocking counterpart of run_sync for async generators. The generator
+    runs on the shared background loop and hands items over through a
+    bounded queue, so a slow consumer pauses it instead of buffering the
+    whole stream.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError(
+            "Blocking provider methods cannot run inside an event loop; "
+            "iterate the *_async variant instead"
+        )
+
+    items: queue.Queue = queue.Queue(maxsize=buffer)
+
+    async def pump():
+        try:
+            async for item in iterator:
+                try:
+                    items.put_nowait((item, None))
+                except queue.Full:
+                    await asyncio.to_thread(items.put, (item, None))
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            await asyncio.to_thread(items.put, (_END, _ordinary(e)))
+        else:
+            await asyncio.to_thread(items.put, (_END, None))
+
+    future = asyncio.run_coroutine_threadsafe(pump(), _background_loop())
+    try:
+        while True:
+            item, error = items.get()
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # Consumer stopped early: cancel the generator (running its cleanup)
+        # and unblock a pending put so the worker thread can finish
+        future.cancel()
+        while not future.done():
+            try:
+                items.get(timeout=0.05)
+            except queue.Empty:
+                pass
@@ -0,0 +1,129 @@
+import asyncio
+import contextlib
+import socket
+from typing import AsyncIterator, Awaitable, Callable, Dict, Mapping, Optional
+from urllib.parse import urljoin, urlsplit
+
+from http_client import (
+    AsyncClient,
+    BlockedAddress,
+    ConnectError,
+    RequestError,
+    StreamingResponse,
+    Timeout,
+    is_public_address,
+)
+from rate_limit import mark_image_host
+from resilience import RetryPolicy, send_with_retries
+
+# Image hosts tend to refuse requests without a browser-like agent
+IMAGE_HEADERS = {"User-Agent": "Mozilla/5.0"}
+# Failures where the same request may well succeed next time
+RETRYABLE = (ConnectError, Timeout)
+# Seconds per attempt when there is no retry policy
+DEFAULT_ATTEMPT_TIMEOUT = 20.0
+# Redirects followed by open_image when it checks every hop itself
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+def image_headers(*layers: Optional[Mapping[str, str]]) -> Dict[str, str]:
+    """
+    IMAGE_HEADERS overridden by each of `layers` in turn, e.g. a caller's
+    headers and then a page's headerForImage. Empty layers are skipped.
+    """
+    headers = dict(IMAGE_HEADERS)
+    for layer in layers:
+        if layer:
+            headers.update(layer)
+    return headers
+
+
+class ImageLimiter:
+    """
+    Limits one batch of image requests to `concurrency` in flight overall
+    and `per_host` against any one host. The hosts it sees are marked as
+    image hosts, so the shared per-host pacing gives them image defaults.
+    """
+
+    def __init__(self, concurrency: int, per_host: int):
+        self.per_host = per_host
+        self._limit = asyncio.Semaphore(concurrency)
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+
+    @contextlib.asynccontextmanager
+    async def slot(self, url: Optional[str]) -> AsyncIterator[None]:
+        parts = urlsplit(url or "")
+        host_limit = self._hosts.get(parts.netloc)
+        if host_limit is None:
+            host_limit = self._hosts[parts.netloc] = asyncio.Semaphore(self.per_host)
+            mark_image_host(parts.hostname)
+        async with host_limit, self._limit:
+            yield
+
+
+async def fetch_with_retries(send: Callable[[float], Awaitable], policy: Optional[RetryPolicy]):
+    """
+    Runs `send(attempt_timeout)`, one whole image request, under `policy`
+    (once with DEFAULT_ATTEMPT_TIMEOUT when None): connection errors,
+    timeouts and responses with a retryable status are tried again. `send`
+    returns the response, having read the body only when the status is one
+    to keep.
+    """
+    if policy is None:
+        return await send(DEFAULT_ATTEMPT_TIMEOUT)
+    # Durations include the body, so they are no latency samples
+    return await send_with_retries(send, None, policy, RETRYABLE, Timeout)
+
+
+async def check_public_url(url: str) -> None:
+    """
+    Raises BlockedAddress unless `url` is http(s) and its host resolves only
+    to public addresses. For requests made on behalf of someone else's URL,
+    e.g. the image proxy's.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise BlockedAddress(f"Not an http(s) URL: {url}")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            parts.hostname, port, type=socket.SOCK_STREAM
+        )
+    except (socket.gaierror, UnicodeError) as e:
+        raise ConnectError(f"Could not resolve {parts.hostname}: {e}") from e
+    if not infos or not all(is_public_address(info[4][0]) for info in infos):
+        raise BlockedAddress(f"{parts.hostname} is not a public host")
+
+
+@contextlib.asynccontextmanager
+async def open_image(
+    client: AsyncClient,
+    url: str,
+    headers: Mapping[str, str],
+    timeout,
+    public_only: bool = False,
+) -> AsyncIterator[StreamingResponse]:
+    """
+    Streams a GET of `url`. With `public_only` every hop, redirects
+    included, must pass check_public_url first, and is fetched by a public
+    client, whose connection lookups refuse private addresses too: the
+    check alone could be passed by a host that rebinds its name before the
+    connection is made.
+    """
+    if not public_only:
+        async with client.stream("GET", url, headers=dict(headers), timeout=timeout) as response:
+            yield response
+        return
+    client = client.public()
+    for _ in range(MAX_REDIRECTS + 1):
+        await check_public_url(url)
+        async with client.stream(
+            "GET", url, headers=dict(headers), timeout=timeout, allow_redirects=False
+        ) as response:
+            location = response.headers.get("Location")
+            if response.status_code not in REDIRECT_STATUSES or not location:
+                yield response
+                return
+        url = urljoin(url, location)
+    raise RequestError(f"Too many redirects for {url}")
@@ -0,0 +1,232 @@
+"""
+Checks that the page images of chapters are still served, without
+downloading them: each page gets a HEAD request, or a one-byte Range GET
+where the host refuses HEAD, sent with the page's headerForImage.
+
+    python image_health.py pages.json [more.json ...] [--failures-only]
+
+Each file (or - for stdin) holds a fetch_chapter_pages result, or an object
+mapping chapter ids to such results. The exit status is 1 when any page
+failed.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from http_client import AsyncClient, RequestError, StreamingResponse, get_async_client, run_sync
+from image_fetch import ImageLimiter, fetch_with_retries, image_headers
+from image_store import is_image_type
+from resilience import RetryPolicy, get_default_policy
+
+# Checks in flight at once, overall and per image host
+DEFAULT_CONCURRENCY = 32
+DEFAULT_PER_HOST = 8
+# (connect, read) seconds per request, within the policy's attempt timeout
+DEFAULT_TIMEOUT = (10.0, 15.0)
+# Answers to HEAD that mean "ask again with GET" rather than "page is gone"
+HEAD_REFUSED = (403, 405, 501)
+
+
+@dataclass(slots=True)
+class PageHealth:
+    index: int
+    url: Optional[str]
+    status: Optional[int] = None
+    content_type: Optional[str] = None
+    size: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _total_size(headers: Mapping[str, str]) -> Optional[int]:
+    # "bytes 0-0/12345" for a Range answer, else the plain length
+    content_range = headers.get("Content-Range", "")
+    total = content_range.rpartition("/")[2]
+    if total.isdigit():
+        return int(total)
+    length = headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+def _capped(timeout, limit: float):
+    if timeout is None:
+        return limit
+    if isinstance(timeout, tuple):
+        return tuple(min(part, limit) for part in timeout)
+    return min(timeout, limit)
+
+
+def _judge(result: PageHealth) -> None:
+    if result.status is None or result.status >= 400:
+        result.error = f"HTTP {result.status}"
+        return
+    mime = (result.content_type or "").split(";")[0].strip().lower()
+    if mime and not is_image_type(mime):
+        # Dead links often answer 200 with an HTML error page
+        result.error = f"Not an image ({mime})"
+    elif result.size == 0:
+        result.error = "Empty body"
+
+
+class _Checker:
+    """
+    Shared limits for every page checked in one batch, across chapters.
+    """
+
+    def __init__(
+        self,
+        client: AsyncClient,
+        limiter: ImageLimiter,
+        headers: Optional[Mapping[str, str]],
+        policy: Optional[RetryPolicy],
+        timeout,
+    ):
+        self.client = client
+        self.limiter = limiter
+        self.headers = headers
+        self.policy = policy
+        self.timeout = timeout
+
+    async def _probe(
+        self, url: str, headers: Mapping[str, str], attempt_timeout: float
+    ) -> StreamingResponse:
+        timeout = _capped(self.timeout, attempt_timeout)
+        async with self.client.stream("HEAD", url, headers=dict(headers), timeout=timeout) as response:
+            pass
+        if response.status_code in HEAD_REFUSED:
+            # Only the first byte; the body is never read past it
+            async with self.client.stream(
+                "GET", url, headers={**headers, "Range": "bytes=0-0"}, timeout=timeout
+            ) as response:
+                pass
+        return response
+
+    async def _check(self, page: Mapping, result: PageHealth) -> None:
+        if not result.url:
+            result.error = page.get("error") or "Page has no image URL"
+            return
+        headers = image_headers(self.headers, page.get("headerForImage"))
+        try:
+            response = await fetch_with_retries(
+                lambda timeout: self._probe(result.url, headers, timeout), self.policy
+            )
+        except RequestError as e:
+            result.error = str(e) or type(e).__name__
+            return
+        result.status = response.status_code
+        result.content_type = response.headers.get("Content-Type")
+        result.size = _total_size(response.headers)
+        _judge(result)
+
+    async def check(self, pages: Iterable[Mapping]) -> List[PageHealth]:
+        pages = list(pages)
+        results = [PageHealth(index, page.get("img")) for index, page in enumerate(pages)]
+
+        async def run(page: Mapping, result: PageHealth) -> None:
+            async with self.limiter.slot(result.url):
+                await self._check(page, result)
+
+        await asyncio.gather(*(run(page, result) for page, result in zip(pages, results)))
+        return results
+
+
+async def check_chapters_async(
+    chapters: Mapping[str, Iterable[Mapping]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    per_host: int = DEFAULT_PER_HOST,
+    headers: Optional[Mapping[str, str]] = None,
+    client: Optional[AsyncClient] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+    timeout=DEFAULT_TIMEOUT,
+) -> Dict[str, List[PageHealth]]:
+    """
+    Checks every page of `chapters` (chapter id -> fetch_chapter_pages
+    result) concurrently, at most `concurrency` requests in flight overall
+    and `per_host` against any one host. Connection errors, timeouts and
+    429/5xx answers are retried under `retry_policy` (the default policy
+    when None); each page's outcome is in its PageHealth.
+    """
+    checker = _Checker(
+        client or get_async_client(),
+        ImageLimiter(concurrency, per_host),
+        headers,
+        retry_policy or get_default_policy(),
+        timeout,
+    )
+    ids = list(chapters)
+    reports = await asyncio.gather(*(checker.check(chapters[i]) for i in ids))
+    return dict(zip(ids, reports))
+
+
+async def check_pages_async(pages: Iterable[Mapping], **kwargs) -> List[PageHealth]:
+    return (await check_chapters_async({"": pages}, **kwargs))[""]
+
+
+def check_chapters(chapters: Mapping[str, Iterable[Mapping]], **kwargs) -> Dict[str, List[PageHealth]]:
+    return run_sync(check_chapters_async(chapters, **kwargs))
+
+
+def check_pages(pages: Iterable[Mapping], **kwargs) -> List[PageHealth]:
+    return run_sync(check_pages_async(pages, **kwargs))
+
+
+def _load_chapters(paths: List[str]) -> Dict[str, List[Mapping]]:
+    chapters = {}
+    for path in paths:
+        if path == "-":
+            data = json.load(sys.stdin)
+        else:
+            with open(path) as f:
+                data = json.load(f)
+        if isinstance(data, list):
+            chapters[path] = data
+        else:
+            chapters.update(data)
+    return chapters
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Check chapter page images without downloading them."
+    )
+    parser.add_argument("files", nargs="+", help="JSON page lists, or - for stdin")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST)
+    parser.add_argument("--failures-only", action="store_true", help="only report failed pages")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per page")
+    args = parser.parse_args(argv)
+
+    report = check_chapters(
+        _load_chapters(args.files), concurrency=args.concurrency, per_host=args.per_host
+    )
+    total = failed = 0
+    for chapter, results in report.items():
+        for result in results:
+            total += 1
+            failed += not result.ok
+            if args.failures_only and result.ok:
+                continue
+            if args.json:
+                print(json.dumps({"chapter": chapter, "ok": result.ok, **asdict(result)}))
+            else:
+                print(
+                    "\t".join(
+                        str(value) if value is not None else "-"
+                        for value in (
+                            chapter, result.index + 1, result.status, result.content_type,
+                            result.size, result.url, result.error,
+                        )
+                    )
+                )
+    print(f"{total - failed}/{total} pages ok", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+import asyncio
+import struct
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import singleflight
+from http_client import AsyncClient, RequestError, get_async_client, run_sync
+from image_fetch import ImageLimiter, image_headers
+from image_store import get_image_store
+
+# Bytes asked for first; enough for every format but JPEGs with big
+# metadata segments, which get follow-up ranges up to MAX_PROBE_BYTES
+FIRST_PROBE_BYTES = 4 * 1024
+MAX_PROBE_BYTES = 256 * 1024
+DEFAULT_CONCURRENCY = 16
+DEFAULT_PER_HOST = 6
+# (connect, read) seconds per probe request
+PROBE_TIMEOUT = (10.0, 15.0)
+DEFAULT_CACHE_ENTRIES = 100_000
+
+# JPEG start-of-frame markers, which carry the dimensions
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_APP1 = 0xE1
+_EXIF_ORIENTATION = 0x0112
+
+Size = Tuple[int, int]
+
+
+def _exif_orientation(segment: bytes) -> int:
+    """
+    The Orientation tag from the IFD0 of an APP1 "Exif" segment body, or 1
+    (as stored) when it has none.
+    """
+    tiff = segment[6:]
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if order is None or len(tiff) < 8:
+        return 1
+    ifd = struct.unpack(order + "I", tiff[4:8])[0]
+    if ifd + 2 > len(tiff):
+        return 1
+    count = struct.unpack(order + "H", tiff[ifd:ifd + 2])[0]
+    # 12-byte entries: tag, type, count and the value (or its offset)
+    for entry in range(ifd + 2, min(ifd + 2 + 12 * count, len(tiff) - 11), 12):
+        tag, kind = struct.unpack(order + "HH", tiff[entry:entry + 4])
+        if tag == _EXIF_ORIENTATION and kind == 3:
+            return struct.unpack(order + "H", tiff[entry + 8:entry + 10])[0]
+    return 1
+
+
+def _jpeg_size(data: bytes) -> Tuple[Optional[Size], int]:
+    orientation = 1
+    i = 2
+    while True:
+        # Markers are 0xFF (possibly repeated as fill) and a code byte
+        while i < len(data) and data[i] != 0xFF:
+            i += 1
+        while i < len(data) and data[i] == 0xFF:
+            i += 1
+        if i + 9 > len(data):
+            return None, i + 9
+        marker = data[i]
+        i += 1
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Markers without a segment
+            continue
+        if marker in (0xD9, 0xDA):
+            # End of image, or scan data before any frame header
+            return None, 0
+        if marker in _SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[i + 3:i + 7])
+            # Orientations 5-8 are displayed a quarter turn from how they're stored
+            return ((height, width) if 5 <= orientation <= 8 else (width, height)), 0
+        length = struct.unpack(">H", data[i:i + 2])[0]
+        if marker == _APP1 and data[i + 2:i + 8] == b"Exif\x00\x00":
+            if i + length > len(data):
+                return None, i + length
+            orientation = _exif_orientation(data[i + 2:i + length])
+        i += length
+
+
+def _webp_size(data: bytes) -> Optional[Size]:
+    chunk = data[12:16]
+    if chunk == b"VP8 " and data[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and data[20] == 0x2F:
+        bits = int.from_bytes(data[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+    return None
+
+
+def parse_size(data: bytes) -> Tuple[Optional[Size], int]:
+    """
+    Reads (width, height) from the start of a JPEG, PNG, WebP or GIF file,
+    as displayed: JPEGs whose EXIF orientation turns them are swapped.
+    Returns the size and 0, or None and how many leading bytes are needed
+    to get further (0 when the data is not a supported image).
+    """
+    if len(data) < 30:
+        return None, 30
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and data[12:16] == b"IHDR":
+        return struct.unpack(">II", data[16:24]), 0
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return struct.unpack("<HH", data[6:10]), 0
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return _webp_size(data), 0
+    if data[:2] == b"\xff\xd8":
+        return _jpeg_size(data)
+    return None, 0
+
+
+class SizeCache:
+    """
+    Bounded LRU of probed sizes by image URL. Failed probes are not kept.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._sizes: "OrderedDict[str, Size]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[Size]:
+        with self._lock:
+            size = self._sizes.get(url)
+            if size is not None:
+                self._sizes.move_to_end(url)
+            return size
+
+    def set(self, url: str, size: Size) -> None:
+        with self._lock:
+            self._sizes[url] = size
+            self._sizes.move_to_end(url)
+            while len(self._sizes) > self.max_entries:
+                self._sizes.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sizes.clear()
+
+
+_cache = SizeCache()
+
+
+def get_size_cache() -> SizeCache:
+    return _cache
+
+
+def _read_head(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(MAX_PROBE_BYTES)
+
+
+async def _read_range(
+    client: AsyncClient, url: str, headers: Mapping[str, str], start: int, end: int
+) -> Tuple[int, bytes, bool]:
+    """
+    Returns (offset, bytes, whether the body ended early) for bytes
+    start..end of `url`. A host that ignores Range answers from offset 0;
+    reading stops once enough has arrived either way.
+    """
+    async with client.stream(
+        "GET", url, headers={**headers, "Range": f"bytes={start}-{end}"}, timeout=PROBE_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        offset = start if response.status_code == 206 else 0
+        wanted = end + 1 - offset
+        buffer = bytearray()
+        async for chunk in response.iter_chunks(FIRST_PROBE_BYTES):
+            buffer += chunk
+            if len(buffer) >= wanted:
+                break
+    return offset, bytes(buffer[:wanted]), len(buffer) < wanted
+
+
+async def _probe(client: AsyncClient, url: str, headers: Mapping[str, str]) -> Optional[Size]:
+    store = get_image_store()
+    entry = store.get(url) if store is not None else None
+    if entry is not None:
+        try:
+            size, _ = parse_size(await asyncio.to_thread(_read_head, entry.path))
+            return size
+        except OSError:
+            # Evicted between store.get() and the read; probe the URL instead
+            pass
+
+    data = b""
+    needed = FIRST_PROBE_BYTES
+    while True:
+        offset, chunk, ended = await _read_range(client, url, headers, len(data), needed - 1)
+        data = data[:offset] + chunk
+        size, more = parse_size(data)
+        if size is not None or ended or not more or more > MAX_PROBE_BYTES:
+            return size
+        needed = max(more, len(data) + FIRST_PROBE_BYTES)
+
+
+async def probe_sizes_async(
+    pages: Iterable[Mapping],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    per_host: int = DEFAULT_PER_HOST,
+    headers: Optional[Mapping[str, str]] = None,
+    client: Optional[AsyncClient] = None,
+) -> List[Optional[Size]]:
+    """
+    Returns the (width, height) of every page of a fetch_chapter_pages
+    result, in order, or None where it could not be read. Only the first
+    few KB of each image are requested, with the page's headerForImage,
+    at most `concurrency` at once and `per_host` against any one host.
+    Sizes come from the shared cache, or the image store's copy, when
+    available and are cached once probed; concurrent probes of one URL
+    share a request.
+    """
+    pages = list(pages)
+    client = client or get_async_client()
+    limiter = ImageLimiter(concurrency, per_host)
+
+    async def probe(page: Mapping) -> Optional[Size]:
+        url = page.get("img")
+        if not url:
+            return None
+        size = _cache.get(url)
+        if size is not None:
+            return size
+        async with limiter.slot(url):
+            try:
+                size = await singleflight.do(
+                    ("probe", url),
+                    lambda: _probe(client, url, image_headers(headers, page.get("headerForImage"))),
+                )
+            except RequestError:
+                return None
+        if size is not None:
+            _cache.set(url, size)
+        return size
+
+    return list(await asyncio.gather(*(probe(page) for page in pages)))
+
+
+async def attach_sizes_async(pages: Iterable[Mapping], **kwargs) -> List[Dict]:
+    """
+    Copies of the page records with "width" and "height" added where the
+    size could be probed; see probe_sizes_async. The records themselves
+    are left alone, since provider results may be shared between callers.
+    """
+    pages = list(pages)
+    sizes = await probe_sizes_async(pages, **kwargs)
+    return [
+        {**page, "width": size[0], "height": size[1]} if size is not None else dict(page)
+        for page, size in zip(pages, sizes)
+    ]
+
+
+def probe_sizes(pages: Iterable[Mapping], **kwargs) -> List[Optional[Size]]:
+    return run_sync(probe_sizes_async(pages, **kwargs))
+
+
+def attach_sizes(pages: Iterable[Mapping], **kwargs) -> List[Dict]:
+    return run_sync(attach_sizes_async(pages, **kwargs))
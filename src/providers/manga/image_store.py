@@ -0,0 +1,387 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+EVICTION_POLICIES = ("lru", "lfu")
+# Served for images by some CDNs that don't bother with a type
+GENERIC_CONTENT_TYPES = ("application/octet-stream", "binary/octet-stream")
+
+
+class ImageTooLarge(OSError):
+    """
+    Raised for a body that would not fit in the store even when empty.
+    """
+
+
+def _url_key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def is_image_type(content_type: Optional[str]) -> bool:
+    mime = (content_type or "").split(";")[0].strip().lower()
+    return mime.startswith("image/") or mime in GENERIC_CONTENT_TYPES
+
+
+@dataclass(slots=True)
+class StoredImage:
+    url: str
+    name: str
+    path: str
+    size: int
+    content_type: Optional[str]
+    cache_control: Optional[str]
+    stored_at: float
+    hits: int = 0
+    last_access: float = 0.0
+
+
+class ImageWriter:
+    """
+    Receives one image body as it downloads. Nothing is visible in the store
+    until `commit`; `abort` throws the body away. Both, like `write`, touch
+    the disk, so async callers run them in worker threads.
+    """
+
+    def __init__(
+        self,
+        store: "ImageStore",
+        url: str,
+        content_type: Optional[str],
+        cache_control: Optional[str],
+    ):
+        self.url = url
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.size = 0
+        self._store = store
+        self._hash = hashlib.sha256() if store.dedup else None
+        self._tmp_path = store.temp_path()
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        if self.size + len(chunk) > self._store.max_bytes:
+            raise ImageTooLarge(f"{self.url} is larger than the image store")
+        self._file.write(chunk)
+        if self._hash is not None:
+            self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> StoredImage:
+        self._file.close()
+        name = self._hash.hexdigest() if self._hash is not None else _url_key(self.url)
+        return self._store._commit(
+            self.url, name, self._tmp_path, self.size, self.content_type, self.cache_control
+        )
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+
+class ImageStore:
+    """
+    Disk store of image bodies, looked up by URL. Bodies are files named by
+    the SHA-256 of their URL, or of their content with `dedup` enabled, so
+    the same scan served under several URLs is kept once.
+
+    The files together stay within `max_bytes`; when a new image would go
+    over, the least recently ("lru") or least often ("lfu") read entries
+    are evicted, never the new one. Bodies larger than the whole store are
+    refused with ImageTooLarge before they are written. The index lives in
+    memory and is rebuilt from the per-URL metadata files on start, ordered
+    by when each was stored.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        policy: str = "lru",
+        dedup: bool = False,
+    ):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy {policy!r}")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.dedup = dedup
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, StoredImage]" = OrderedDict()
+        # Object name -> [size, number of URLs using it]
+        self._objects: Dict[str, List[int]] = {}
+        # For "lfu": keys by read count, least recently read first in each
+        self._by_hits: Dict[int, "OrderedDict[str, None]"] = {}
+        self._min_hits = 0
+        self._bytes = 0
+        for sub in ("objects", "urls", "tmp"):
+            os.makedirs(os.path.join(directory, sub), exist_ok=True)
+        self._load()
+
+    @property
+    def size(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _object_path(self, name: str) -> str:
+        return os.path.join(self.directory, "objects", name[:2], name)
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.directory, "urls", key[:2], key)
+
+    def _load(self) -> None:
+        entries = []
+        for root, _, files in os.walk(os.path.join(self.directory, "urls")):
+            for filename in files:
+                meta_path = os.path.join(root, filename)
+                try:
+                    with open(meta_path, "rb") as f:
+                        meta = json.loads(f.read())
+                    path = self._object_path(meta["name"])
+                    size = os.path.getsize(path)
+                except (OSError, ValueError, KeyError):
+                    # Half-written metadata, or its body is gone
+                    os.remove(meta_path)
+                    continue
+                entries.append(
+                    StoredImage(
+                        meta["url"], meta["name"], path, size,
+                        meta.get("content_type"), meta.get("cache_control"),
+                        meta.get("stored_at", 0.0),
+                        last_access=meta.get("stored_at", 0.0),
+                    )
+                )
+        for entry in sorted(entries, key=lambda e: e.stored_at):
+            self._insert(_url_key(entry.url), entry)
+            self._retain(entry.name, entry.size)
+
+        # Bodies nothing points at, and writes cut short by a crash
+        for root, _, files in os.walk(os.path.join(self.directory, "objects")):
+            for filename in files:
+                if filename not in self._objects:
+                    os.remove(os.path.join(root, filename))
+        for filename in os.listdir(os.path.join(self.directory, "tmp")):
+            os.remove(os.path.join(self.directory, "tmp", filename))
+        with self._lock:
+            self._evict()
+
+    def _retain(self, name: str, size: int) -> bool:
+        obj = self._objects.get(name)
+        if obj is not None:
+            obj[1] += 1
+            return False
+        self._objects[name] = [size, 1]
+        self._bytes += size
+        return True
+
+    def _release(self, entry: StoredImage) -> None:
+        obj = self._objects[entry.name]
+        obj[1] -= 1
+        if obj[1] == 0:
+            del self._objects[entry.name]
+            self._bytes -= obj[0]
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _insert(self, key: str, entry: StoredImage) -> None:
+        self._entries[key] = entry
+        if self.policy == "lfu":
+            self._by_hits.setdefault(entry.hits, OrderedDict())[key] = None
+            if len(self._by_hits) == 1 or entry.hits < self._min_hits:
+                self._min_hits = entry.hits
+
+    def _touch(self, key: str, entry: StoredImage) -> None:
+        self._entries.move_to_end(key)
+        if self.policy == "lfu":
+            bucket = self._by_hits[entry.hits]
+            del bucket[key]
+            if not bucket:
+                del self._by_hits[entry.hits]
+                if entry.hits == self._min_hits:
+                    self._min_hits += 1
+            self._by_hits.setdefault(entry.hits + 1, OrderedDict())[key] = None
+        entry.hits += 1
+        entry.last_access = time.time()
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        if self.policy == "lfu":
+            bucket = self._by_hits[entry.hits]
+            del bucket[key]
+            if not bucket:
+                del self._by_hits[entry.hits]
+                if entry.hits == self._min_hits and self._by_hits:
+                    # Only when the rarest bucket empties; there are few counts
+                    self._min_hits = min(self._by_hits)
+        try:
+            os.remove(self._meta_path(key))
+        except OSError:
+            pass
+        self._release(entry)
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            if self.policy == "lru":
+                key = next(iter(self._entries))
+            else:
+                key = next(iter(self._by_hits[self._min_hits]))
+            self._remove(key)
+
+    def get(self, url: str) -> Optional[StoredImage]:
+        """
+        Returns the stored image for `url` and counts the read, or None.
+        Only the in-memory index is consulted; the file may still be evicted
+        before it is opened, so readers treat a missing file as a miss.
+        """
+        key = _url_key(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._touch(key, entry)
+            return entry
+
+    def temp_path(self) -> str:
+        """
+        A fresh path on the store's filesystem, for files that will be
+        moved in with `add_file`. Leftovers are removed on the next start.
+        """
+        return os.path.join(self.directory, "tmp", uuid.uuid4().hex)
+
+    def add_file(
+        self,
+        url: str,
+        path: str,
+        content_type: Optional[str] = None,
+        cache_control: Optional[str] = None,
+    ) -> StoredImage:
+        """
+        Moves the finished file at `path` (see `temp_path`) into the store
+        as the body of `url`. A file larger than the store is left where it
+        is and ImageTooLarge raised.
+        """
+        size = os.path.getsize(path)
+        if size > self.max_bytes:
+            raise ImageTooLarge(f"{url} is larger than the image store")
+        if self.dedup:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+            name = digest.hexdigest()
+        else:
+            name = _url_key(url)
+        return self._commit(url, name, path, size, content_type, cache_control)
+
+    def writer(
+        self,
+        url: str,
+        content_type: Optional[str] = None,
+        cache_control: Optional[str] = None,
+    ) -> ImageWriter:
+        """
+        Starts storing the body of `url`. Writes raise ImageTooLarge once it
+        outgrows the store, after which the writer is to be aborted.
+        """
+        return ImageWriter(self, url, content_type, cache_control)
+
+    @staticmethod
+    def accepts(content_type: Optional[str], cache_control: Optional[str]) -> bool:
+        """
+        Whether a response with these headers may be stored: an image (or
+        untyped binary) body its origin hasn't marked no-store or private.
+        """
+        directives = {
+            part.split("=")[0].strip().lower() for part in (cache_control or "").split(",")
+        }
+        return is_image_type(content_type) and not directives & {"no-store", "private"}
+
+    def _commit(
+        self,
+        url: str,
+        name: str,
+        tmp_path: str,
+        size: int,
+        content_type: Optional[str],
+        cache_control: Optional[str],
+    ) -> StoredImage:
+        key = _url_key(url)
+        path = self._object_path(name)
+        now = time.time()
+        entry = StoredImage(
+            url, name, path, size, content_type, cache_control, now, last_access=now,
+        )
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if self._retain(name, size):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            else:
+                # Same content already stored under another URL
+                os.remove(tmp_path)
+            meta_path = self._meta_path(key)
+            os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+            with open(meta_path, "w") as f:
+                json.dump(
+                    {
+                        "url": entry.url,
+                        "name": name,
+                        "content_type": entry.content_type,
+                        "cache_control": entry.cache_control,
+                        "stored_at": entry.stored_at,
+                    },
+                    f,
+                )
+            # Make room before the entry is indexed, so it can't be the one
+            # evicted; the body was retained above and stays counted
+            self._evict()
+            self._insert(key, entry)
+        return entry
+
+    def copy_to(self, entry: StoredImage, destination: str) -> None:
+        """
+        Copies a stored body to `destination`. shutil.copyfile uses
+        sendfile where the platform has it, so the bytes never pass through
+        Python. Raises FileNotFoundError if the entry was evicted meanwhile.
+        """
+        shutil.copyfile(entry.path, destination)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+
+_store: Optional[ImageStore] = None
+
+
+def configure_image_store(
+    directory: Optional[str] = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    policy: str = "lru",
+    dedup: bool = False,
+) -> None:
+    """
+    Turns the shared image store on in `directory`, or off with None, the
+    default. The image proxy and the chapter downloader read through it.
+    """
+    global _store
+    _store = ImageStore(directory, max_bytes, policy, dedup) if directory else None
+
+
+def get_image_store() -> Optional[ImageStore]:
+    return _store
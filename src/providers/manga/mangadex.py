@@ -1,9 +1,10 @@
-import requests
-from typing import List, Dict, Optional
+from typing import AsyncIterator, Iterator, List, Dict, Optional, TypedDict
 from urllib.parse import quote
 
-import json
-import aiohttp
+import asyncio
+from http_client import HTTPError, iter_sync, run_sync
+from models import MangaInfo
+from provider import MangaProvider
 
 def capitalize_first_letter(string: str) -> str:
     if not string:
@@ -15,80 +16,173 @@ def substring_before(string: str, delimiter: str) -> str:
         return string.split(delimiter)[0]
     return string
 
-class MangaDex:
+# Largest page the chapter feed endpoint serves, and how many feed pages of a
+# single manga may be in flight at once.
+FEED_PAGE_SIZE = 96
+FEED_CONCURRENCY = 6
+
+# Schemas for the API payloads, naming only the fields read below so the rest
+# of each document is skipped while decoding (see fast_json.decode)
+class _TagAttributes(TypedDict, total=False):
+    name: Dict[str, str]
+    group: str
+
+class _Tag(TypedDict, total=False):
+    attributes: _TagAttributes
+
+class _RelationshipAttributes(TypedDict, total=False):
+    fileName: str
+
+class _Relationship(TypedDict, total=False):
+    id: str
+    type: str
+    attributes: Optional[_RelationshipAttributes]
+
+class _MangaAttributes(TypedDict, total=False):
+    title: Dict[str, str]
+    altTitles: List[Dict[str, str]]
+    description: Dict[str, str]
+    tags: List[_Tag]
+    status: Optional[str]
+    year: Optional[int]
+    contentRating: Optional[str]
+    lastVolume: Optional[str]
+    lastChapter: Optional[str]
+
+class _Manga(TypedDict, total=False):
+    id: str
+    attributes: _MangaAttributes
+    relationships: List[_Relationship]
+
+class _MangaEntity(TypedDict, total=False):
+    result: str
+    message: str
+    data: _Manga
+
+class _MangaCollection(TypedDict, total=False):
+    result: str
+    message: str
+    data: List[_Manga]
+
+class _AtHomeChapter(TypedDict, total=False):
+    hash: str
+    data: List[str]
+
+class _AtHome(TypedDict, total=False):
+    baseUrl: str
+    chapter: _AtHomeChapter
+
+class _Cover(TypedDict, total=False):
+    id: str
+    attributes: _RelationshipAttributes
+
+class _CoverEntity(TypedDict, total=False):
+    data: _Cover
+
+class _CoverCollection(TypedDict, total=False):
+    data: List[_Cover]
+
+class _ChapterAttributes(TypedDict, total=False):
+    chapter: Optional[str]
+    title: Optional[str]
+    pages: int
+
+class _Chapter(TypedDict, total=False):
+    id: str
+    attributes: _ChapterAttributes
+
+class _Feed(TypedDict, total=False):
+    data: List[_Chapter]
+    total: int
+
+def _feed_chapter(chapter: dict) -> dict:
+    # Extract only the required fields from each chapter
+    attributes = chapter['attributes']
+    return {
+        'id': chapter['id'],
+        'chapter': attributes['chapter'],
+        'title': attributes['title'],
+        'pages': attributes['pages']
+    }
+
+class MangaDex(MangaProvider):
     def __init__(self):
+        super().__init__()
         self.name = 'MangaDex'
         self.base_url = 'https://mangadex.org'
         self.logo = 'https://pbs.twimg.com/profile_images/1391016345714757632/xbt_jW78_400x400.jpg'
         self.class_path = 'MANGA.MangaDex'
         self.api_url = 'https://api.mangadex.org'
-        self.client = requests.Session()
 
-    async def fetch_manga_info(self, manga_id: str) -> Dict:
+    async def fetch_manga_info_async(self, manga_id: str) -> Dict:
+        info = await self.fetch_manga_async(manga_id)
+        return await info.to_dict_async()
+
+    async def fetch_manga_async(self, manga_id: str) -> MangaInfo:
+        """
+        Returns after the single manga request; the chapter feed is only
+        requested, page by page, once the chapters are read.
+        """
         try:
-            response = self.client.get(f'{self.api_url}/manga/{manga_id}')
-            data = response.json()
+            response = await self.client.get(f'{self.api_url}/manga/{manga_id}?includes[]=cover_art')
+            response.raise_for_status()
+            manga = response.json(_MangaEntity)['data']
+            attributes = manga['attributes']
 
             # Get the primary title, falling back to first available title
-            titles = data['data']['attributes']['title']
+            titles = attributes['title']
             title = titles.get('en') or next(iter(titles.values()))
 
-            # Find cover art relationship and fetch image first
-            find_cover_art = next(
-                (rel for rel in data['data']['relationships'] if rel['type'] == 'cover_art'), 
-                None
-            )
-            cover_art = await self.fetch_cover_image(
-                find_cover_art['id'] if find_cover_art else None
-            )
+            # The cover filename comes expanded with the manga itself
+            cover_files = await self._resolve_cover_files([manga])
+            cover_art = cover_files[manga['id']]
             
             # Create manga_info with reordered fields
             manga_info = {
-                'id': data['data']['id'],
+                'id': manga['id'],
                 'title': title,
-                'image': f'{self.base_url}/covers/{data["data"]["id"]}/{cover_art}' if cover_art else None,
-                'altTitles': data['data']['attributes']['altTitles'],
-                'descriptions': data['data']['attributes']['description'],
+                'image': f'{self.base_url}/covers/{manga["id"]}/{cover_art}' if cover_art else None,
+                'altTitles': attributes['altTitles'],
+                'descriptions': attributes['description'],
                 'genres': [
                     tag['attributes']['name']['en']
-                    for tag in data['data']['attributes']['tags']
+                    for tag in attributes['tags']
                     if tag['attributes']['group'] == 'genre'
                 ],
                 'themes': [
                     tag['attributes']['name']['en']
-                    for tag in data['data']['attributes']['tags']
+                    for tag in attributes['tags']
                     if tag['attributes']['group'] == 'theme'
                 ],
-                'status': capitalize_first_letter(data['data']['attributes']['status']),
-                'releaseDate': data['data']['attributes']['year'],
-                'chapters': []
+                'status': capitalize_first_letter(attributes['status']),
+                'releaseDate': attributes['year'],
             }
 
-            manga_info['chapters'] = await self.fetch_all_chapters(manga_id, 0, None)
-            return manga_info
+            return MangaInfo(manga_info, lambda: self.iter_chapters_async(manga_id))
 
-        except requests.RequestException as err:
-            if hasattr(err, 'response') and err.response.status_code == 400:
+        except HTTPError as err:
+            if err.response.status_code == 400:
                 raise ValueError(f'[{self.name}] Bad request. Make sure you have entered a valid query.')
             raise
 
-    async def fetch_chapter_pages(self, chapter_id: str) -> List[Dict]:
+    async def fetch_chapter_pages_async(self, chapter_id: str) -> List[Dict]:
         try:
-            response = self.client.get(f'{self.api_url}/at-home/server/{chapter_id}')
-            data = response.json()
+            response = await self.client.get(f'{self.api_url}/at-home/server/{chapter_id}')
+            data = response.json(_AtHome)
+            base = f'{data["baseUrl"]}/data/{data["chapter"]["hash"]}/'
             
             pages = [
                 {
-                    'img': f'{data["baseUrl"]}/data/{data["chapter"]["hash"]}/{image_name}',
+                    'img': base + image_name,
                     'page': idx + 1
                 }
                 for idx, image_name in enumerate(data['chapter']['data'])
             ]
             return pages
-        except requests.RequestException as err:
+        except HTTPError as err:
             raise
 
-    async def search(
+    async def search_async(
         self, query: str, page: int = 1, limit: int = 20
     ) -> List[Dict]:
         if page <= 0:
@@ -99,10 +193,11 @@ class MangaDex:
             raise ValueError('not enough results')
 
         try:
-            response = self.client.get(
-                f'{self.api_url}/manga?limit={limit}&title={quote(query)}&offset={limit * (page - 1)}&order[relevance]=desc'
+            response = await self.client.get(
+                f'{self.api_url}/manga?limit={limit}&title={quote(query)}&offset={limit * (page - 1)}&order[relevance]=desc&includes[]=cover_art'
             )
-            data = response.json()
+            response.raise_for_status()
+            data = response.json(_MangaCollection)
             
             if data['result'] == 'ok':
                 results = {
@@ -110,38 +205,33 @@ class MangaDex:
                     'results': []
                 }
 
+                cover_files = await self._resolve_cover_files(data['data'])
                 for manga in data['data']:
-                    find_cover_art = next(
-                        (item for item in manga['relationships'] if item['type'] == 'cover_art'), None
+                    results['results'].append(
+                        self._listing_entry(manga, cover_files[manga['id']])
                     )
-                    cover_art_id = find_cover_art.get('id') if find_cover_art else None
-                    cover_art = await self.fetch_cover_image(cover_art_id)
-
-                    results['results'].append({
-                        'id': manga['id'],
-                        'title': list(manga['attributes']['title'].values())[0],
-                        'altTitles': manga['attributes']['altTitles'],
-                        'description': list(manga['attributes']['description'].values())[0],
-                        'status': manga['attributes']['status'],
-                        'releaseDate': manga['attributes']['year'],
-                        'contentRating': manga['attributes']['contentRating'],
-                        'lastVolume': manga['attributes']['lastVolume'],
-                        'lastChapter': manga['attributes']['lastChapter'],
-                        'image': f'{self.base_url}/covers/{manga["id"]}/{cover_art}',
-                    })
 
                 return results
             else:
                 raise ValueError(data['message'])
-        except requests.RequestException as err:
+        except HTTPError as err:
             if err.response.status_code == 400:
                 raise ValueError('Bad request. Make sure you have entered a valid query.')
             raise
 
-    async def fetch_random(self) -> List[Dict]:
+    def fetch_random(self) -> List[Dict]:
+        return run_sync(self.fetch_random_async())
+
+    def fetch_recently_added(self, page: int = 1, limit: int = 20) -> List[Dict]:
+        return run_sync(self.fetch_recently_added_async(page, limit))
+
+    def fetch_latest_updates(self, page: int = 1, limit: int = 20) -> List[Dict]:
+        return run_sync(self.fetch_latest_updates_async(page, limit))
+
+    async def fetch_random_async(self) -> List[Dict]:
         try:
-            response = self.client.get(f'{self.api_url}/manga/random')
-            data = response.json()
+            response = await self.client.get(f'{self.api_url}/manga/random?includes[]=cover_art')
+            data = response.json(_MangaEntity)
 
             if data['result'] == 'ok':
                 results = {
@@ -149,32 +239,19 @@ class MangaDex:
                     'results': []
                 }
 
-                find_cover_art = next(
-                    (item for item in data['data']['relationships'] if item['type'] == 'cover_art'), None
+                manga = data['data']
+                cover_files = await self._resolve_cover_files([manga])
+                results['results'].append(
+                    self._listing_entry(manga, cover_files[manga['id']])
                 )
-                cover_art_id = find_cover_art.get('id') if find_cover_art else None
-                cover_art = await self.fetch_cover_image(cover_art_id)
-
-                results['results'].append({
-                    'id': data['data']['id'],
-                    'title': list(data['data']['attributes']['title'].values())[0],
-                    'altTitles': data['data']['attributes']['altTitles'],
-                    'description': list(data['data']['attributes']['description'].values())[0],
-                    'status': data['data']['attributes']['status'],
-                    'releaseDate': data['data']['attributes']['year'],
-                    'contentRating': data['data']['attributes']['contentRating'],
-                    'lastVolume': data['data']['attributes']['lastVolume'],
-                    'lastChapter': data['data']['attributes']['lastChapter'],
-                    'image': f'{self.base_url}/covers/{data["data"]["id"]}/{cover_art}',
-                })
 
                 return results
             else:
                 raise ValueError(data['message'])
-        except requests.RequestException as err:
+        except HTTPError as err:
             raise
 
-    async def fetch_recently_added(self, page: int = 1, limit: int = 20) -> List[Dict]:
+    async def fetch_recently_added_async(self, page: int = 1, limit: int = 20) -> List[Dict]:
         if page <= 0:
             raise ValueError('Page number must be greater than 0')
         if limit > 100:
@@ -183,10 +260,10 @@ class MangaDex:
             raise ValueError('not enough results')
 
         try:
-            response = self.client.get(
+            response = await self.client.get(
                 f'{self.api_url}/manga?includes[]=cover_art&contentRating[]=safe&contentRating[]=suggestive&contentRating[]=erotica&order[createdAt]=desc&hasAvailableChapters=true&limit={limit}&offset={limit * (page - 1)}'
             )
-            data = response.json()
+            data = response.json(_MangaCollection)
 
             if data['result'] == 'ok':
                 results = {
@@ -194,33 +271,19 @@ class MangaDex:
                     'results': []
                 }
 
+                cover_files = await self._resolve_cover_files(data['data'])
                 for manga in data['data']:
-                    find_cover_art = next(
-                        (item for item in manga['relationships'] if item['type'] == 'cover_art'), None
+                    results['results'].append(
+                        self._listing_entry(manga, cover_files[manga['id']])
                     )
-                    cover_art_id = find_cover_art.get('id') if find_cover_art else None
-                    cover_art = await self.fetch_cover_image(cover_art_id)
-
-                    results['results'].append({
-                        'id': manga['id'],
-                        'title': list(manga['attributes']['title'].values())[0],
-                        'altTitles': manga['attributes']['altTitles'],
-                        'description': list(manga['attributes']['description'].values())[0],
-                        'status': manga['attributes']['status'],
-                        'releaseDate': manga['attributes']['year'],
-                        'contentRating': manga['attributes']['contentRating'],
-                        'lastVolume': manga['attributes']['lastVolume'],
-                        'lastChapter': manga['attributes']['lastChapter'],
-                        'image': f'{self.base_url}/covers/{manga["id"]}/{cover_art}',
-                    })
 
                 return results
             else:
                 raise ValueError(data['message'])
-        except requests.RequestException as err:
+        except HTTPError as err:
             raise
 
-    async def fetch_latest_updates(self, page: int = 1, limit: int = 20) -> List[Dict]:
+    async def fetch_latest_updates_async(self, page: int = 1, limit: int = 20) -> List[Dict]:
         if page <= 0:
             raise ValueError('Page number must be greater than 0')
         if limit > 100:
@@ -229,11 +292,10 @@ class MangaDex:
             raise ValueError('not enough results')
 
         try:
-            response = self.client.get(
+            response = await self.client.get(
                 f'{self.api_url}/manga?includes[]=cover_art&order[updatedAt]=desc&hasAvailableChapters=true&limit={limit}&offset={limit * (page - 1)}'
             )
-            data = response.json()
-            print(data)
+            data = response.json(_MangaCollection)
 
             if data['result'] == 'ok':
                 results = {
@@ -241,82 +303,132 @@ class MangaDex:
                     'results': []
                 }
 
+                cover_files = await self._resolve_cover_files(data['data'])
                 for manga in data['data']:
-                    find_cover_art = next(
-                        (item for item in manga['relationships'] if item['type'] == 'cover_art'), None
+                    results['results'].append(
+                        self._listing_entry(manga, cover_files[manga['id']])
                     )
-                    cover_art_id = find_cover_art.get('id') if find_cover_art else None
-                    cover_art = await self.fetch_cover_image(cover_art_id)
-
-                    results['results'].append({
-                        'id': manga['id'],
-                        'title': list(manga['attributes']['title'].values())[0],
-                        'altTitles': manga['attributes']['altTitles'],
-                        'description': list(manga['attributes']['description'].values())[0],
-                        'status': manga['attributes']['status'],
-                        'releaseDate': manga['attributes']['year'],
-                        'contentRating': manga['attributes']['contentRating'],
-                        'lastVolume': manga['attributes']['lastVolume'],
-                        'lastChapter': manga['attributes']['lastChapter'],
-                        'image': f'{self.base_url}/covers/{manga["id"]}/{cover_art}',
-                    })
 
                 return results
             else:
                 raise ValueError(data['message'])
-        except requests.RequestException as err:
+        except HTTPError as err:
             raise
 
-    async def fetch_cover_image(self, cover_id: Optional[str]) -> Optional[str]:
+    def _listing_entry(self, manga: dict, cover_art: Optional[str]) -> Dict:
+        attributes = manga['attributes']
+        return {
+            'id': manga['id'],
+            'title': list(attributes['title'].values())[0],
+            'altTitles': attributes['altTitles'],
+            'description': list(attributes['description'].values())[0],
+            'status': attributes['status'],
+            'releaseDate': attributes['year'],
+            'contentRating': attributes['contentRating'],
+            'lastVolume': attributes['lastVolume'],
+            'lastChapter': attributes['lastChapter'],
+            'image': f'{self.base_url}/covers/{manga["id"]}/{cover_art}',
+        }
+
+    async def _resolve_cover_files(self, mangas: List[dict]) -> Dict[str, Optional[str]]:
+        """
+        Maps each manga id to its cover filename. Listings requested with
+        includes[]=cover_art already carry the filename; any cover that came
+        back unexpanded is resolved with a single bulk /cover lookup.
+        """
+        cover_files = {}
+        unresolved = {}
+        for manga in mangas:
+            cover_art = next(
+                (rel for rel in manga['relationships'] if rel['type'] == 'cover_art'), None
+            )
+            if cover_art is None:
+                cover_files[manga['id']] = None
+            elif cover_art.get('attributes'):
+                cover_files[manga['id']] = cover_art['attributes']['fileName']
+            else:
+                unresolved[cover_art['id']] = manga['id']
+                cover_files[manga['id']] = None
+
+        if unresolved:
+            response = await self.client.get(
+                f'{self.api_url}/cover',
+                params=[('ids[]', cover_id) for cover_id in unresolved] + [('limit', 100)]
+            )
+            response.raise_for_status()
+            for cover in response.json(_CoverCollection)['data']:
+                cover_files[unresolved[cover['id']]] = cover['attributes']['fileName']
+        return cover_files
+
+    async def fetch_cover_image_async(self, cover_id: Optional[str]) -> Optional[str]:
         if cover_id:
             try:
-                response = self.client.get(f'{self.api_url}/cover/{cover_id}')
-                data = response.json()
+                response = await self.client.get(f'{self.api_url}/cover/{cover_id}')
+                data = response.json(_CoverEntity)
                 return data['data']['attributes']['fileName']
-            except requests.RequestException as err:
+            except HTTPError as err:
                 raise
         return None
 
-    async def fetch_all_chapters(self, manga_id: str, offset: int = 0, prev_response: dict = None) -> list:
-        try:
-            # Base case: stop when we've fetched all chapters
-            if prev_response and prev_response['offset'] + 96 >= prev_response['total']:
-                return []
-
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.api_url}/manga/{manga_id}/feed",
-                    params={
-                        'offset': offset,
-                        'limit': 96,
-                        'order[volume]': 'desc',
-                        'order[chapter]': 'desc',
-                        'translatedLanguage[]': 'en'
-                    }
-                ) as response:
-                    data = await response.json()
-
-                    # Ensure response data exists and contains required properties
-                    if not data or 'data' not in data:
-                        raise ValueError('Invalid API response format')
-
-                    # Extract only the required fields from each chapter
-                    chapters = [
-                        {
-                            'id': chapter['id'],
-                            'chapter': chapter['attributes']['chapter'],
-                            'title': chapter['attributes']['title'],
-                            'pages': chapter['attributes']['pages']
-                        }
-                        for chapter in data['data']
-                    ]
-
-                    return chapters + await self.fetch_all_chapters(
-                        manga_id, 
-                        offset + 96, 
-                        data
-                    )
+    async def _fetch_feed_page(self, manga_id: str, offset: int) -> dict:
+        response = await self.client.get(
+            f"{self.api_url}/manga/{manga_id}/feed",
+            params={
+                'offset': offset,
+                'limit': FEED_PAGE_SIZE,
+                'order[volume]': 'desc',
+                'order[chapter]': 'desc',
+                'translatedLanguage[]': 'en'
+            }
+        )
+        data = response.json(_Feed)
 
-        except Exception as e:
-            print(f"Error fetching chapters for manga {manga_id} at offset {offset}: {str(e)}")
-            raise
+        # Ensure response data exists and contains required properties
+        if not data or 'data' not in data:
+            raise ValueError(
+                f'Invalid API response format for manga {manga_id} at offset {offset}'
+            )
+        return data
+
+    async def iter_chapters_async(self, manga_id: str) -> AsyncIterator[Dict]:
+        """
+        Yields the English chapter feed in feed order while it is still loading.
+        The first page reveals `total`; the remaining pages are then requested
+        concurrently, at most FEED_CONCURRENCY at a time, on the shared client.
+        """
+        first_page = await self._fetch_feed_page(manga_id, 0)
+        semaphore = asyncio.Semaphore(FEED_CONCURRENCY)
+
+        async def fetch_page(offset: int) -> dict:
+            async with semaphore:
+                return await self._fetch_feed_page(manga_id, offset)
+
+        # Scheduled before the first page is handed out, so they load while
+        # the consumer works through it
+        pages = [
+            asyncio.ensure_future(fetch_page(offset))
+            for offset in range(FEED_PAGE_SIZE, first_page['total'], FEED_PAGE_SIZE)
+        ]
+        try:
+            for chapter in first_page['data']:
+                yield _feed_chapter(chapter)
+            for page in pages:
+                for chapter in (await page)['data']:
+                    yield _feed_chapter(chapter)
+        finally:
+            # Stop pending requests if the consumer bails out early or a page fails
+            for page in pages:
+                page.cancel()
+            await asyncio.gather(*pages, return_exceptions=True)
+
+    async def fetch_all_chapters_async(self, manga_id: str) -> list:
+        return [chapter async for chapter in self.iter_chapters_async(manga_id)]
+
+    def fetch_cover_image(self, cover_id: Optional[str]) -> Optional[str]:
+        return run_sync(self.fetch_cover_image_async(cover_id))
+
+    def iter_chapters(self, manga_id: str) -> Iterator[Dict]:
+        return iter_sync(self.iter_chapters_async(manga_id))
+
+    def fetch_all_chapters(self, manga_id: str) -> list:
+        return run_sync(self.fetch_all_chapters_async(manga_id))
@@ -1,14 +1,48 @@
-import requests
-from bs4 import BeautifulSoup
-import execjs
+import asyncio
 import re
 import logging
+import soupsieve as sv
+from debug_capture import capture
+from html_parser import iter_rows
+from http_client import iter_sync
+from packer import UnpackingError, eval_string_concat, unpack
+from provider import MangaProvider
+from resilience import RetryPolicy
+
+try:
+    import execjs
+except ImportError:
+    # Only needed for scripts the native unpacker can't read
+    execjs = None
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-class MangaHere:
+class MangaHere(MangaProvider):
+    # chapterfun.ashx has a long tail; race a duplicate past the p95 latency
+    retry_policy = RetryPolicy(attempt_timeout=10.0, deadline=30.0, hedge=True)
+    TITLE = sv.compile("span.detail-info-right-title-font")
+    DESCRIPTION = sv.compile("div.detail-info-right > p.fullcontent")
+    COVER = sv.compile("div.detail-info-cover > img")
+    GENRES = sv.compile("p.detail-info-right-tag-list > a")
+    STATUS = sv.compile("span.detail-info-right-title-tip")
+    RATING = sv.compile("span.detail-info-right-title-star > span:last-child")
+    AUTHORS = sv.compile("p.detail-info-right-say > a")
+    CHAPTER_ROWS = sv.compile("ul.detail-main-list > li > a")
+    CHAPTER_TITLE = sv.compile("div > p.title3")
+    CHAPTER_DATE = sv.compile("div > p.title2")
+    PAGE_OPTIONS = sv.compile("select.mangaread-page option")
+    PAGER_ITEMS = sv.compile("div.pager-list-left a:not([class]), div.pager-list-left span")
+    SEARCH_NEXT = sv.compile("div.pager-list-left > a.active + a")
+    SEARCH_RESULTS = sv.compile("div.container > div > div > ul > li")
+    SEARCH_LINK = sv.compile("a")
+    SEARCH_TITLE = sv.compile("p.manga-list-4-item-title > a")
+    SEARCH_IMAGE = sv.compile("a > img")
+    SEARCH_PARAGRAPHS = sv.compile("p")
+    SEARCH_STATUS = sv.compile("p.manga-list-4-show-tag-list-2 > a")
+
     def __init__(self):
+        super().__init__()
         self.name = "MangaHere"
         self.base_url = "http://www.mangahere.cc"
         self.logo = (
@@ -16,7 +50,7 @@ class MangaHere:
         )
         self.class_path = "MANGA.MangaHere"
 
-    def fetch_manga_info(self, manga_id):
+    async def fetch_manga_info_async(self, manga_id):
         manga_info = {
             "id": manga_id,
             "title": "",
@@ -30,67 +64,78 @@ class MangaHere:
             "chapters": [],
         }
         try:
-            response = requests.get(
+            response = await self.client.get(
                 f"{self.base_url}/manga/{manga_id}", headers={"cookie": "isAdult=1"}
             )
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            manga_info["title"] = soup.select_one(
-                "span.detail-info-right-title-font"
-            ).text.strip()
-            manga_info["description"] = soup.select_one(
-                "div.detail-info-right > p.fullcontent"
-            ).text.strip()
-            manga_info["image"] = soup.select_one("div.detail-info-cover > img")["src"]
-            manga_info["genres"] = [
-                a["title"].strip()
-                for a in soup.select("p.detail-info-right-tag-list > a")
-            ]
-            status_text = soup.select_one(
-                "span.detail-info-right-title-tip"
-            ).text.strip()
-            manga_info["status"] = (
-                "ONGOING"
-                if status_text == "Ongoing"
-                else "COMPLETED" if status_text == "Completed" else "UNKNOWN"
-            )
-            manga_info["rating"] = float(
-                soup.select_one(
-                    "span.detail-info-right-title-star > span:last-child"
-                ).text.strip()
-            )
-            manga_info["authors"] = [
-                a["title"] for a in soup.select("p.detail-info-right-say > a")
-            ]
-            print(soup.select("ul.detail-main-list > li"))
+            soup = self.parse_html(response.text)
+
+            manga_info["title"] = self.TITLE.select_one(soup).text.strip()
+            manga_info["description"] = self.DESCRIPTION.select_one(soup).text.strip()
+            manga_info["image"] = self.COVER.select_one(soup)["src"]
+            manga_info["genres"] = [a["title"].strip() for a in self.GENRES.select(soup)]
+            manga_info["status"] = self._status(self.STATUS.select_one(soup))
+            manga_info["rating"] = float(self.RATING.select_one(soup).text.strip())
+            manga_info["authors"] = [a["title"] for a in self.AUTHORS.select(soup)]
             manga_info["chapters"] = [
-                {
-                    "id": a["href"].split("/manga/")[1].replace(".html", ""),
-                    "title": a.select_one("div > p.title3").text.strip(),
-                    "releasedDate": a.select_one("div > p.title2").text.strip(),
-                }
-                for a in soup.select("ul.detail-main-list > li > a")
+                self._parse_chapter(a) for a in self.CHAPTER_ROWS.select(soup)
             ]
 
             return manga_info
         except Exception as e:
             raise Exception(f"Error fetching manga info:v {str(e)}")
+
+    @staticmethod
+    def _status(tag) -> str:
+        status_text = tag.text.strip() if tag is not None else ""
+        return (
+            "ONGOING"
+            if status_text == "Ongoing"
+            else "COMPLETED" if status_text == "Completed" else "UNKNOWN"
+        )
+
+    def _parse_chapter(self, a) -> dict:
+        return {
+            "id": a["href"].split("/manga/")[1].replace(".html", ""),
+            "title": self.CHAPTER_TITLE.select_one(a).text.strip(),
+            "releasedDate": self.CHAPTER_DATE.select_one(a).text.strip(),
+        }
+
+    async def iter_chapters_async(self, manga_id: str):
+        """
+        Yields the chapters of a manga, newest first as listed. With
+        parser_backend "lxml" they arrive while the page is still downloading,
+        without the whole document in memory (see html_parser.iter_rows).
+        """
+        try:
+            async with self.client.stream(
+                "GET", f"{self.base_url}/manga/{manga_id}", headers={"cookie": "isAdult=1"}
+            ) as response:
+                response.raise_for_status()
+                async for a in iter_rows(
+                    response.iter_chunks(), self.CHAPTER_ROWS, response.encoding, self.parser_backend
+                ):
+                    yield self._parse_chapter(a)
+        except Exception as e:
+            raise Exception(f"Error fetching chapters: {str(e)}")
+
+    def iter_chapters(self, manga_id: str):
+        return iter_sync(self.iter_chapters_async(manga_id))
         
-    def fetch_chapter_pages(self, chapter_id):
+    async def fetch_chapter_pages_async(self, chapter_id):
         chapter_pages = []
         url = f"{self.base_url}/manga/{chapter_id}/1.html"
         
         try:
-            response = requests.get(url, headers={"cookie": "isAdult=1"})
+            response = await self.client.get(url, headers={"cookie": "isAdult=1"})
             response.raise_for_status()
             html = response.text
-            soup = BeautifulSoup(html, 'html.parser')
+            soup = self.parse_html(html)
 
             # Get total pages first
-            page_elements = soup.select('select.mangaread-page option')
+            page_elements = self.PAGE_OPTIONS.select(soup)
             if not page_elements:
-                page_elements = soup.select('div.pager-list-left a:not([class]), div.pager-list-left span')
+                page_elements = self.PAGER_ITEMS.select(soup)
             
             if not page_elements:
                 raise Exception("Could not determine number of pages")
@@ -108,125 +153,150 @@ class MangaHere:
             if not chapter_id_match:
                 raise Exception("Could not find chapter ID")
             chapter_num = chapter_id_match.group(1)
-            s_key = self.extract_key(html)
-
-            # Fetch all pages
-            for page_num in range(1, total_pages + 1):
-                page_url = f"{self.base_url}/chapterfun.ashx"
-                params = {
-                    'cid': chapter_num,
-                    'page': page_num,
-                    'key': s_key
-                }
-                headers = {
-                    "Referer": url,
-                    "X-Requested-With": "XMLHttpRequest",
-                    "cookie": "isAdult=1"
-                }
-                
-                response = requests.get(page_url, params=params, headers=headers)
-                if not response.text:
-                    continue
-                    
-                # Decode the response
-                script = response.text.replace('eval', '')
-                try:
-                    ctx = execjs.compile(f"function getResult() {{ return {script} }}")
-                    decoded_script = ctx.call("getResult")
-                    
-                    # Extract image URLs
-                    base_url_match = re.search(r'pix\s*=\s*["\']([^"\']+)["\']', decoded_script)
-                    image_paths_match = re.search(r'pvalue\s*=\s*\[(.*?)\]', decoded_script)
-                    
-                    if base_url_match and image_paths_match:
-                        base_url = base_url_match.group(1)
-                        image_paths = [p.strip('"\'') for p in image_paths_match.group(1).split(',')]
-                        
-                        # Only take the first image from each response
-                        if image_paths and image_paths[0]:
-                            img_path = image_paths[0]
-                            img_url = f"https:{base_url}{img_path}" if not base_url.startswith('http') else f"{base_url}{img_path}"
-                            chapter_pages.append({
-                                "page": page_num,  # Using actual page number instead of index
-                                "img": img_url,
-                                "headerForImage": {
-                                    "Referer": self.base_url
-                                }
-                            })
-                except Exception as e:
-                    logger.error(f"Error processing page {page_num}: {str(e)}")
-                    continue
-
-            if not chapter_pages:
+            # extract_key may fall back to execjs; keep that off the event loop
+            s_key = await asyncio.to_thread(self.extract_key, html)
+
+            # Resolve every page concurrently; gather keeps them in page order.
+            # The host's limiter (rate_limit.HOST_SETTINGS) caps how many are in
+            # flight across every chapter being fetched.
+            results = await asyncio.gather(
+                *(
+                    self._fetch_page(url, chapter_num, s_key, page_num)
+                    for page_num in range(1, total_pages + 1)
+                ),
+                return_exceptions=True,
+            )
+            for page_num, result in enumerate(results, start=1):
+                if isinstance(result, asyncio.CancelledError):
+                    raise result
+                if isinstance(result, BaseException):
+                    # Keep the slot so callers can see which page is missing
+                    logger.error(f"Error processing page {page_num}: {str(result)}")
+                    chapter_pages.append({
+                        "page": page_num,
+                        "img": None,
+                        "error": str(result),
+                        "headerForImage": {
+                            "Referer": self.base_url
+                        }
+                    })
+                else:
+                    chapter_pages.append(result)
+
+            if not any(page["img"] for page in chapter_pages):
                 raise Exception("No pages found")
-                
-            # Ensure pages are in correct order
-            chapter_pages.sort(key=lambda x: x["page"])
-            logger.info(f"Successfully extracted {len(chapter_pages)} pages")
+
+            logger.info(f"Successfully extracted {sum(1 for page in chapter_pages if page['img'])} of {total_pages} pages")
             return chapter_pages
             
         except Exception as e:
             logger.exception(f"Error fetching chapter pages: {str(e)}")
             raise Exception(f"Error fetching chapter pages: {str(e)}")
     
-    def search(self, query, page=1):
+    async def _fetch_page(self, chapter_url, chapter_num, s_key, page_num):
+        params = {
+            'cid': chapter_num,
+            'page': page_num,
+            'key': s_key
+        }
+        headers = {
+            "Referer": chapter_url,
+            "X-Requested-With": "XMLHttpRequest",
+            "cookie": "isAdult=1"
+        }
+
+        response = await self.client.get(f"{self.base_url}/chapterfun.ashx", params=params, headers=headers)
+        response.raise_for_status()
+        if not response.text:
+            raise Exception("Empty response")
+
+        # Decode the response
+        try:
+            decoded_script = unpack(response.text)
+        except UnpackingError as e:
+            logger.debug(f"Falling back to execjs for page {page_num}: {str(e)}")
+            script = response.text.replace('eval', '')
+            decoded_script = await asyncio.to_thread(self._run_packed, script)
+
+        # Extract image URLs
+        base_url_match = re.search(r'pix\s*=\s*["\']([^"\']+)["\']', decoded_script)
+        image_paths_match = re.search(r'pvalue\s*=\s*\[(.*?)\]', decoded_script)
+        if not (base_url_match and image_paths_match):
+            raise Exception("Could not find image URL in response")
+
+        base_url = base_url_match.group(1)
+        image_paths = [p.strip('"\'') for p in image_paths_match.group(1).split(',')]
+
+        # Only take the first image from each response
+        if not image_paths or not image_paths[0]:
+            raise Exception("Response contained no image path")
+        img_path = image_paths[0]
+        img_url = f"https:{base_url}{img_path}" if not base_url.startswith('http') else f"{base_url}{img_path}"
+        return {
+            "page": page_num,
+            "img": img_url,
+            "headerForImage": {
+                "Referer": self.base_url
+            }
+        }
+
+    async def search_async(self, query, page=1):
         search_res = {"currentPage": page, "results": [], "hasNextPage": False}
         try:
-            response = requests.get(f"{self.base_url}/search?title={query}&page={page}")
+            response = await self.client.get(f"{self.base_url}/search?title={query}&page={page}")
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-            with open("search.html", "w",encoding='utf-8') as f:
-                f.write(response.text)
+            soup = self.parse_html(response.text)
+            capture("mangahere.search", response.url, response.text, response.status_code)
             search_res["hasNextPage"] = (
-                soup.select_one("div.pager-list-left > a.active + a").text.strip()
-                != ">"
+                self.SEARCH_NEXT.select_one(soup).text.strip() != ">"
             )
-            print(soup.select("div.container > div > div > ul > li"))
             search_res["results"] = [
                 {
-                    "id": a.select_one("a")["href"].split("/")[2],
-                    "title": a.select_one("p.manga-list-4-item-title > a").text.strip(),
+                    "id": self.SEARCH_LINK.select_one(a)["href"].split("/")[2],
+                    "title": self.SEARCH_TITLE.select_one(a).text.strip(),
                     "headerForImage": {"Referer": self.base_url},
-                    "image": a.select_one("a > img")["src"],
-                    "description": a.select("p")[-1].text.strip(),
-                    "status": (
-                        "ONGOING"
-                        if a.select_one(
-                            "p.manga-list-4-show-tag-list-2 > a"
-                        ).text.strip()
-                        == "Ongoing"
-                        else (
-                            "COMPLETED"
-                            if a.select_one(
-                                "p.manga-list-4-show-tag-list-2 > a"
-                            ).text.strip()
-                            == "Completed"
-                            else "UNKNOWN"
-                        )
-                    ),
+                    "image": self.SEARCH_IMAGE.select_one(a)["src"],
+                    "description": self.SEARCH_PARAGRAPHS.select(a)[-1].text.strip(),
+                    "status": self._status(self.SEARCH_STATUS.select_one(a)),
                 }
-                for a in soup.select("div.container > div > div > ul > li")
+                for a in self.SEARCH_RESULTS.select(soup)
             ]
 
             return search_res
         except Exception as e:
             raise Exception(f"Error searching manga: {str(e)}")
 
+    def _run_packed(self, script: str) -> str:
+        # Slow path: round-trips an external JS runtime
+        if execjs is None:
+            raise UnpackingError("Script needs a JavaScript runtime; install PyExecJS")
+        ctx = execjs.compile(f"function getResult() {{ return {script} }}")
+        return ctx.call("getResult")
+
+    def _decode_packed(self, packed: str) -> str:
+        try:
+            return unpack(packed)
+        except UnpackingError as e:
+            logger.debug(f"Falling back to execjs: {str(e)}")
+            return self._run_packed(packed.replace('eval', ''))
+
     def extract_key(self, html: str) -> str:
         try:
             start_idx = html.find('eval(function(p,a,c,k,e,d)')
             end_idx = html.find('</script>', start_idx)
-            script = html[start_idx:end_idx].replace('eval', '')
-            
-            ctx = execjs.compile(f"function getResult() {{ return {script} }}")
-            decoded_script = ctx.call("getResult")
+            decoded_script = self._decode_packed(html[start_idx:end_idx])
             
             start_key = decoded_script.find("'")
             end_key = decoded_script.find(';')
             key_str = decoded_script[start_key:end_key]
             
-            ctx = execjs.compile(f"function getKey() {{ return {key_str} }}")
-            return ctx.call("getKey")
+            try:
+                return eval_string_concat(key_str)
+            except UnpackingError:
+                if execjs is None:
+                    raise
+                ctx = execjs.compile(f"function getKey() {{ return {key_str} }}")
+                return ctx.call("getKey")
         except Exception as e:
             logger.error(f"Error extracting key: {str(e)}")
             return ''
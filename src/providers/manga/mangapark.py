@@ -1,18 +1,84 @@
-import requests
 from bs4 import BeautifulSoup
 import json
 import re
+from urllib.parse import quote
+import soupsieve as sv
+from debug_capture import capture
+from html_parser import find_scripts, iter_rows
+from http_client import iter_sync, run_sync
+from provider import MangaProvider
 
-class Mangapark:
+_IMAGE_URL = re.compile(
+    r'https://[^"\'\s]+?(?:/media/|/i0\.wp\.com/).+?\.(?:jpg|jpeg|png|gif|webp)'
+)
+
+
+def _is_page_url(value: str) -> bool:
+    return value.startswith('https://') and ('/media/' in value or '/i0.wp.com/' in value)
+
+
+def _iter_strings(data):
+    """
+    Yields every string in decoded JSON in document order, without
+    recursion so deeply nested qwik state can't hit the recursion limit.
+    """
+    stack = [data]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, str):
+            yield obj
+        elif isinstance(obj, dict):
+            stack.extend(reversed(list(obj.values())))
+        elif isinstance(obj, list):
+            stack.extend(reversed(obj))
+
+
+class Mangapark(MangaProvider):
     name = "Mangapark"
     base_url = "https://mangapark.net"
     logo = "https://raw.githubusercontent.com/tachiyomiorg/tachiyomi-extensions/repo/icon/tachiyomi-en.mangapark-v1.3.23.png"
     class_path = "MANGA.Mangapark"
+    cache_ttl = 300
 
-    def __init__(self):
-        self.client = requests.Session()
+    TITLE = sv.compile("h3.text-lg.font-bold > a")
+    COVER = sv.compile("img.w-full.not-prose.shadow-md")
+    DESCRIPTION = sv.compile("div.limit-html-p")
+    AUTHORS = sv.compile(r"div.mt-2.text-sm.md\:text-base.opacity-80 a")
+    GENRES = sv.compile("div.flex.items-center.flex-wrap span span:nth-child(1)")
+    STATUS = sv.compile("span.font-bold.uppercase.text-success")
+    STATUS_FALLBACK = sv.compile("div.space-y-2 span.font-bold.uppercase.text-warning")
+    RATING = sv.compile("span.font-bold.opacity-80.whitespace-nowrap")
+    VOTES = sv.compile("div.text-sm.opacity-80.whitespace-nowrap")
+    RATING_BARS = sv.compile(r"div.flex.items-center.text-xs.md\:text-sm.space-x-2")
+    RATING_STARS = sv.compile("div.flex.items-center.font-mono.font-bold.opacity-80 span")
+    RATING_PERCENTAGE = sv.compile("span.font-mono.opacity-80")
+    SCORE_WIDTH = sv.compile("div.absolute.top-0.bottom-0.left-0.overflow-hidden")
+    VIEWS = sv.compile(
+        "div.mt-5.space-y-3:has(b.text-lg.font-bold:-soup-contains('Views'))"
+    )
+    READERS = sv.compile(
+        "div.mt-5.space-y-3:has(b.text-lg.font-bold:-soup-contains('Readers'))"
+    )
+    STAT_SPANS = sv.compile("span.whitespace-nowrap")
+    LANGUAGE = sv.compile("div.whitespace-nowrap.overflow-hidden")
+    PUBLICATION = sv.compile("div:has(span.font-bold.uppercase.text-success)")
+    CHAPTER_ROWS = sv.compile(".px-2.py-2")
+    CHAPTER_LINK = sv.compile("div.space-x-1 a")
+    CHAPTER_SUFFIX = sv.compile("div.space-x-1 span")
+    DIVS = sv.compile("div")
+    TIME = sv.compile("time")
+    SPAN = sv.compile("span")
+    IMG = sv.compile("img")
+    LIST_ITEMS = sv.compile("div.flex.border-b.border-b-base-200")
+    ITEM_TITLE = sv.compile("h3.font-bold a")
+    ITEM_GENRES = sv.compile("div.flex.flex-wrap.text-xs span.whitespace-nowrap")
+    ITEM_CHAPTER = sv.compile("div.flex.flex-nowrap.justify-between a")
+    ITEM_RATING = sv.compile("span.flex.flex-nowrap.items-center.text-yellow-500 span.font-bold")
+    PAGE_IMAGES = sv.compile('img[src*="/media/"], img[src*="/i0.wp.com/"]')
+    PAGE_LINKS = sv.compile("a[href*='page=']")
+    GENRE_LINKS = sv.compile("a.link-hover")
 
-    def fetch_manga_info(self, manga_id: str, *args) -> dict:
+    async def fetch_manga_info_async(self, manga_id: str, *args) -> dict:
         if not manga_id:
             raise ValueError("Manga ID cannot be empty")
         
@@ -20,15 +86,16 @@ class Mangapark:
         url = f"{self.base_url}/title/{manga_id}"
 
         try:
-            response = self.client.get(url)
+            response = await self.client.get(url)
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-            with open("manga_info.html", "w", encoding="utf-8") as f:
-                f.write(soup.prettify())
-            manga_info["title"] = soup.select_one("h3.text-lg.font-bold > a").text if soup.select_one("h3.text-lg.font-bold > a") else "Unknown Title"
-            manga_info["image"] = soup.select_one("img.w-full.not-prose.shadow-md")["src"] if soup.select_one("img.w-full.not-prose.shadow-md") else None
+            soup = self.parse_html(response.text)
+            capture("mangapark.manga_info", url, response.text, response.status_code)
+            title_elem = self.TITLE.select_one(soup)
+            manga_info["title"] = title_elem.text if title_elem else "Unknown Title"
+            cover_elem = self.COVER.select_one(soup)
+            manga_info["image"] = cover_elem["src"] if cover_elem else None
             # Extract description - simplest direct approach
-            description_elem = soup.select_one("div.limit-html-p")
+            description_elem = self.DESCRIPTION.select_one(soup)
             if description_elem:
                 manga_info["description"] = description_elem.text.strip()
             else:
@@ -36,22 +103,19 @@ class Mangapark:
             
             # Extract authors
             authors = []
-            author_elements = soup.select("div.mt-2.text-sm.md\\:text-base.opacity-80 a")
+            author_elements = self.AUTHORS.select(soup)
             for author_elem in author_elements:
                 authors.append(author_elem.text.strip())
             manga_info["authors"] = authors
             
             manga_info["genres"] = [
                 genre.text
-                for genre in soup.select(
-                    "div.flex.items-center.flex-wrap span span:nth-child(1)"
-                )
+                for genre in self.GENRES.select(soup)
             ]
-            manga_info["status"] = soup.select("span.font-bold.uppercase.text-success")[
-                0
-            ].text if soup.select("span.font-bold.uppercase.text-success") else soup.select_one(
-                "div.space-y-2 span.font-bold.uppercase.text-warning"
-            ).text.strip() 
+            status_elem = self.STATUS.select_one(soup)
+            manga_info["status"] = status_elem.text if status_elem else self.STATUS_FALLBACK.select_one(
+                soup
+            ).text.strip()
             
             # Extract rating information
             manga_info["rating"] = {
@@ -61,7 +125,7 @@ class Mangapark:
             }
             
             # Try to find the rating score directly
-            rating_elem = soup.select_one("span.font-bold.opacity-80.whitespace-nowrap")
+            rating_elem = self.RATING.select_one(soup)
             if rating_elem:
                 rating_text = rating_elem.text.strip()
                 if rating_text and rating_text[0].isdigit():
@@ -71,7 +135,7 @@ class Mangapark:
                         pass
             
             # Extract vote count
-            votes_elem = soup.select_one("div.text-sm.opacity-80.whitespace-nowrap")
+            votes_elem = self.VOTES.select_one(soup)
             if votes_elem:
                 votes_text = votes_elem.text.strip()
                 if votes_text:
@@ -79,19 +143,19 @@ class Mangapark:
                     manga_info["rating"]["votes"] = votes_count
             
             # Extract rating distribution
-            rating_bars = soup.select("div.flex.items-center.text-xs.md\\:text-sm.space-x-2")
+            rating_bars = self.RATING_BARS.select(soup)
             for bar in rating_bars:
-                stars_elem = bar.select_one("div.flex.items-center.font-mono.font-bold.opacity-80 span")
+                stars_elem = self.RATING_STARS.select_one(bar)
                 if stars_elem:
                     stars = stars_elem.text.strip()
-                    percentage_elem = bar.select_one("span.font-mono.opacity-80")
+                    percentage_elem = self.RATING_PERCENTAGE.select_one(bar)
                     if percentage_elem:
                         percentage = percentage_elem.text.strip()
                         manga_info["rating"]["distribution"][stars] = percentage
             
             # If we couldn't find the score directly, try to calculate it from the width
             if manga_info["rating"]["score"] is None:
-                score_width_elem = soup.select_one("div.absolute.top-0.bottom-0.left-0.overflow-hidden")
+                score_width_elem = self.SCORE_WIDTH.select_one(soup)
                 if score_width_elem and "style" in score_width_elem.attrs:
                     style = score_width_elem["style"]
                     width_match = re.search(r'width:(\d+\.?\d*)%', style)
@@ -101,10 +165,10 @@ class Mangapark:
                         manga_info["rating"]["score"] = round((width_percentage / 100) * 5, 2)
             
             # Extract view statistics
-            views_section = soup.select_one("div.mt-5.space-y-3:has(b.text-lg.font-bold:contains('Views'))")
+            views_section = self.VIEWS.select_one(soup)
             if views_section:
                 views_data = {}
-                view_spans = views_section.select("span.whitespace-nowrap")
+                view_spans = self.STAT_SPANS.select(views_section)
                 for span in view_spans:
                     text = span.text.strip()
                     if ":" in text:
@@ -122,10 +186,10 @@ class Mangapark:
                 manga_info["views"] = views_data
             
             # Extract reader statistics
-            readers_section = soup.select_one("div.mt-5.space-y-3:has(b.text-lg.font-bold:contains('Readers'))")
+            readers_section = self.READERS.select_one(soup)
             if readers_section:
                 readers_data = {}
-                reader_spans = readers_section.select("span.whitespace-nowrap")
+                reader_spans = self.STAT_SPANS.select(readers_section)
                 for span in reader_spans:
                     text = span.text.strip()
                     if len(text.split()) > 1:
@@ -135,7 +199,7 @@ class Mangapark:
                 manga_info["readers"] = readers_data
             
             # Extract language information
-            lang_elem = soup.select_one("div.whitespace-nowrap.overflow-hidden")
+            lang_elem = self.LANGUAGE.select_one(soup)
             if lang_elem:
                 lang_text = lang_elem.text.strip()
                 # Clean up language info by removing emoji codes
@@ -144,7 +208,7 @@ class Mangapark:
                 manga_info["language"] = lang_text.strip()
             
             # Extract publication info
-            pub_elem = soup.select_one("div:has(span.font-bold.uppercase.text-success)")
+            pub_elem = self.PUBLICATION.select_one(soup)
             if pub_elem:
                 pub_text = pub_elem.text.strip()
                 # Clean up the publication status text
@@ -159,129 +223,130 @@ class Mangapark:
                             break
                 manga_info["publication_status"] = pub_text
             
-            chapters = []
-            for chapter in soup.select(".px-2.py-2"):
-                chapter_id = chapter.select_one("div.space-x-1 a")["href"].replace(
-                    "/title/", ""
-                )
-                title = (
-                    chapter.select_one("div.space-x-1 a").text
-                    + ""
-                    + chapter.select_one("div.space-x-1 span").text
-                    if chapter.select_one("div.space-x-1 span").text.startswith(": ")
-                    else chapter.select_one("div.space-x-1 a").text
-                )
-                release_data_element = (
-                    chapter.select("div")[1].select("div")[-1].select_one("time")
-                )
-                release_date = release_data_element.select_one("span").text
-                release_date_in_unix = release_data_element["data-time"]
-
-                chapters.append(
-                    {
-                        "id": chapter_id,
-                        "title": title,
-                        "releaseDate": release_date,
-                        "releaseDateUnix": release_date_in_unix,
-                    }
-                )
-
-            manga_info["chapters"] = chapters
+            manga_info["chapters"] = [
+                self._parse_chapter(chapter) for chapter in self.CHAPTER_ROWS.select(soup)
+            ]
 
             return manga_info
 
         except Exception as e:
             raise Exception(f"Error fetching manga info: {str(e)}")
 
-    def fetch_chapter_pages(self, chapter_id: str) -> list:
+    def _parse_chapter(self, chapter) -> dict:
+        link = self.CHAPTER_LINK.select_one(chapter)
+        suffix = self.CHAPTER_SUFFIX.select_one(chapter).text
+        chapter_id = link["href"].replace("/title/", "")
+        title = link.text + suffix if suffix.startswith(": ") else link.text
+        release_data_element = self.TIME.select_one(
+            self.DIVS.select(self.DIVS.select(chapter, limit=2)[1])[-1]
+        )
+        release_date = self.SPAN.select_one(release_data_element).text
+        release_date_in_unix = release_data_element["data-time"]
+
+        return {
+            "id": chapter_id,
+            "title": title,
+            "releaseDate": release_date,
+            "releaseDateUnix": release_date_in_unix,
+        }
+
+    async def iter_chapters_async(self, manga_id: str):
+        """
+        Yields the chapters of a title in page order. With parser_backend
+        "lxml" they arrive while the page is still downloading, without the
+        whole document in memory (see html_parser.iter_rows).
+        """
+        if not manga_id:
+            raise ValueError("Manga ID cannot be empty")
+
+        url = f"{self.base_url}/title/{manga_id}"
+        try:
+            async with self.client.stream("GET", url) as response:
+                response.raise_for_status()
+                async for chapter in iter_rows(
+                    response.iter_chunks(), self.CHAPTER_ROWS, response.encoding, self.parser_backend
+                ):
+                    yield self._parse_chapter(chapter)
+        except Exception as e:
+            raise Exception(f"Error fetching chapters: {str(e)}")
+
+    def iter_chapters(self, manga_id: str):
+        return iter_sync(self.iter_chapters_async(manga_id))
+
+    async def fetch_chapter_pages_async(self, chapter_id: str) -> list:
         if not chapter_id:
             raise ValueError("Chapter ID cannot be empty")
         
         url = f"{self.base_url}/title/{chapter_id}"
         try:
-            response = self.client.get(url)
+            response = await self.client.get(url)
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-            
-            # Find all script tags
-            scripts = soup.find_all('script')
-            pages = []
-            page_number = 1
-            
+
+            # Script bodies are all we read, so don't build the whole DOM
+            scripts = find_scripts(response.text, self.parser_backend)
+            # A dict keeps first-seen order and makes the duplicate check O(1)
+            image_urls = {}
+
             # Look for image URLs in all script contents
-            for script in scripts:
-                if not script.string:
+            for attrs, script_text in scripts:
+                if not script_text:
                     continue
-                    
-                # Try to parse as JSON if it looks like JSON data
-                if script.get('type') == 'qwik/json' or script.string.strip().startswith('{'):
+
+                if attrs.get('type') == 'qwik/json' or script_text.strip().startswith('{'):
                     try:
-                        data = json.loads(script.string)
-                        # Recursively search for image URLs in the JSON data
-                        def extract_images(obj):
-                            if isinstance(obj, str) and obj.startswith('https://') and ('/media/' in obj or '/i0.wp.com/' in obj):
-                                pages.append({
-                                    "page": len(pages) + 1,
-                                    "img": obj
-                                })
-                            elif isinstance(obj, dict):
-                                for value in obj.values():
-                                    extract_images(value)
-                            elif isinstance(obj, list):
-                                for item in obj:
-                                    extract_images(item)
-                                    
-                        extract_images(data)
+                        data = json.loads(script_text)
                     except json.JSONDecodeError:
                         continue
-                
-                # Also look for direct image URLs in script content
-                if isinstance(script.string, str):
-                    urls = re.findall(r'https://[^"\'\s]+?(?:/media/|/i0\.wp\.com/).+?\.(?:jpg|jpeg|png|gif|webp)', script.string)
-                    for url in urls:
-                        if url not in [p["img"] for p in pages]:
-                            pages.append({
-                                "page": len(pages) + 1,
-                                "img": url
-                            })
-            
-            if not pages:
+                    # One pass over the decoded strings replaces a second
+                    # regex scan of the raw JSON text
+                    for value in _iter_strings(data):
+                        if _is_page_url(value):
+                            image_urls.setdefault(value)
+                        elif "https://" in value:
+                            for url in _IMAGE_URL.findall(value):
+                                image_urls.setdefault(url)
+                else:
+                    for url in _IMAGE_URL.findall(script_text):
+                        image_urls.setdefault(url)
+
+            if not image_urls:
                 # Fallback: Look for image tags directly
-                images = soup.select('img[src*="/media/"], img[src*="/i0.wp.com/"]')
+                soup = self.parse_html(response.text)
+                images = self.PAGE_IMAGES.select(soup)
                 for img in images:
                     src = img.get('src')
-                    if src and src not in [p["img"] for p in pages]:
-                        pages.append({
-                            "page": len(pages) + 1,
-                            "img": src
-                        })
-            
-            if not pages:
+                    if src:
+                        image_urls.setdefault(src)
+
+            if not image_urls:
                 raise Exception("No pages found")
-                
-            return sorted(pages, key=lambda x: x["page"])
+
+            return [
+                {"page": page, "img": img}
+                for page, img in enumerate(image_urls, start=1)
+            ]
 
         except Exception as e:
             raise Exception(f"Error fetching chapter pages: {str(e)}")
 
-    def search(self, query: str, page: int = 1, *args) -> dict:
+    async def search_async(self, query: str, page: int = 1, *args) -> dict:
         if not query:
             raise ValueError("Search query cannot be empty")
         if page < 1:
             raise ValueError("Page number must be greater than 0")
         
         # URL encode the query parameter
-        query = requests.utils.quote(query)
+        query = quote(query)
         url = f"{self.base_url}/search?word={query}&page={page}"
 
         try:
-            response = self.client.get(url)
+            response = await self.client.get(url)
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
+            soup = self.parse_html(response.text)
 
             results = []
-            for item in soup.select("div.flex.border-b.border-b-base-200"):
-                title_link = item.select_one("h3.font-bold a")
+            for item in self.LIST_ITEMS.select(soup):
+                title_link = self.ITEM_TITLE.select_one(item)
                 if not title_link:
                     continue
                     
@@ -289,13 +354,13 @@ class Mangapark:
                 title = title_link.text.strip()
                 
                 # Get image URL
-                image = item.select_one("img")
+                image = self.IMG.select_one(item)
                 image_url = image["src"] if image else None
                 
                 # Get additional info
                 genres = [
                     span.text.strip() 
-                    for span in item.select("div.flex.flex-wrap.text-xs span.whitespace-nowrap")
+                    for span in self.ITEM_GENRES.select(item)
                     if span.text.strip()
                 ]
                 
@@ -308,32 +373,37 @@ class Mangapark:
 
             return {
                 "results": results,
-                "hasNextPage": bool(soup.select_one("a[href*='page=" + str(page + 1) + "']"))
+                "hasNextPage": any(
+                    f"page={page + 1}" in link["href"] for link in self.PAGE_LINKS.select(soup)
+                )
             }
 
         except Exception as e:
             raise Exception(f"Error searching manga: {str(e)}")
             
-    def fetch_home_page(self, *args) -> BeautifulSoup:
+    async def fetch_home_page_async(self, *args) -> BeautifulSoup:
         """
         Fetches the home page HTML and returns the BeautifulSoup object
         """
         url = f"{self.base_url}/"
         try:
-            response = self.client.get(url)
+            response = await self.client.get(url)
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
+            soup = self.parse_html(response.text)
             return soup
         except Exception as e:
             raise Exception(f"Error fetching home page: {str(e)}")
             
 
     
-    def get_latest_releases(self) -> list:
+    def fetch_home_page(self, *args) -> BeautifulSoup:
+        return run_sync(self.fetch_home_page_async(*args))
+
+    async def get_latest_releases_async(self) -> list:
         """
         Extracts latest manga releases from the home page
         """
-        soup = self.fetch_home_page()
+        soup = await self.fetch_home_page_async()
             
         latest_releases = []
         
@@ -349,12 +419,12 @@ class Mangapark:
             return latest_releases
             
         # Extract manga items
-        manga_items = latest_section.select("div.flex.border-b.border-b-base-200")
+        manga_items = self.LIST_ITEMS.select(latest_section)
         
         for item in manga_items:
             try:
                 # Extract manga ID and title
-                title_link = item.select_one("h3.font-bold a")
+                title_link = self.ITEM_TITLE.select_one(item)
                 if not title_link:
                     continue
                     
@@ -362,30 +432,31 @@ class Mangapark:
                 title = title_link.text.strip()
                 
                 # Extract image
-                image = item.select_one("img")
+                image = self.IMG.select_one(item)
                 image_url = image["src"] if image else None
                 
                 # Extract latest chapter
-                chapter_link = item.select_one("div.flex.flex-nowrap.justify-between a")
+                chapter_link = self.ITEM_CHAPTER.select_one(item)
                 latest_chapter = {
                     "id": chapter_link["href"].replace("/title/", "") if chapter_link else None,
                     "title": chapter_link.text.strip() if chapter_link else None
                 }
                 
                 # Extract release date
-                time_elem = item.select_one("time")
-                release_date = time_elem.select_one("span").text.strip() if time_elem and time_elem.select_one("span") else None
+                time_elem = self.TIME.select_one(item)
+                date_elem = self.SPAN.select_one(time_elem) if time_elem else None
+                release_date = date_elem.text.strip() if date_elem else None
                 release_date_unix = time_elem["data-time"] if time_elem and "data-time" in time_elem.attrs else None
                 
                 # Extract genres
                 genres = [
                     span.text.strip() 
-                    for span in item.select("div.flex.flex-wrap.text-xs span.whitespace-nowrap")
+                    for span in self.ITEM_GENRES.select(item)
                     if span.text.strip()
                 ]
                 
                 # Extract rating if available
-                rating_elem = item.select_one("span.flex.flex-nowrap.items-center.text-yellow-500 span.font-bold")
+                rating_elem = self.ITEM_RATING.select_one(item)
                 rating = rating_elem.text.strip() if rating_elem else None
                 
                 manga_data = {
@@ -407,11 +478,14 @@ class Mangapark:
                 
         return latest_releases
     
-    def get_genres(self) -> list:
+    def get_latest_releases(self) -> list:
+        return run_sync(self.get_latest_releases_async())
+
+    async def get_genres_async(self) -> list:
         """
         Extracts available genres from the home page
         """
-        soup = self.fetch_home_page()
+        soup = await self.fetch_home_page_async()
             
         genres = []
         
@@ -425,13 +499,16 @@ class Mangapark:
         
         if not genres_section:
             # Try to find genres from manga items
-            genre_elements = soup.select("div.flex.flex-wrap.text-xs span.whitespace-nowrap")
+            genre_elements = self.ITEM_GENRES.select(soup)
             genres = list(set([elem.text.strip() for elem in genre_elements if elem.text.strip()]))
             return genres
             
         # If we found a dedicated genres section, extract from there
-        genre_links = genres_section.select("a.link-hover")
+        genre_links = self.GENRE_LINKS.select(genres_section)
         genres = [link.text.strip() for link in genre_links if link.text.strip()]
         
         return genres
-    
\ No newline at end of file
+    
+
+    def get_genres(self) -> list:
+        return run_sync(self.get_genres_async())
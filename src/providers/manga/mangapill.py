@@ -1,10 +1,29 @@
-import requests
-from bs4 import BeautifulSoup
 from typing import List, Dict, Optional
+from urllib.parse import quote
+import soupsieve as sv
+from http_client import HTTPError
+from models import HEADERS
+from provider import MangaProvider
 
 
-class MangaPill:
+class MangaPill(MangaProvider):
+    SEARCH_RESULTS = sv.compile("div.container div.my-3.justify-end > div")
+    SEARCH_LINK = sv.compile("a")
+    SEARCH_IMAGE = sv.compile("a img")
+    SEARCH_TITLE = sv.compile("div > a > div")
+    TITLE = sv.compile("div.container div.my-3 div.flex-col div.mb-3 h1")
+    DESCRIPTION = sv.compile("p.text-sm.text--secondary")
+    RELEASE_DATE = sv.compile("div.grid.grid-cols-1.gap-3.mb-3 div:nth-child(3) div")
+    GENRES = sv.compile(
+        'div.container div.my-3 div.flex-col div.mb-3:-soup-contains("Genres")'
+    )
+    CHAPTERS = sv.compile("div.container div.border-border div#chapters div.grid-cols-1 a")
+    PAGES = sv.compile("chapter-page")
+    PAGE_IMAGE = sv.compile("div picture img")
+    PAGE_SUMMARY = sv.compile("div[data-summary] > div")
+
     def __init__(self):
+        super().__init__()
         self.name = "MangaPill"
         self.base_url = "https://mangapill.com"
         self.logo = "https://scontent-man2-1.xx.fbcdn.net/v/t39.30808-6/300819578_399903675586699_2357525969702348451_n.png?_nc_cat=100&ccb=1-7&_nc_sid=09cbfe&_nc_ohc=Md2cQ4wRNWwAX-_U0fz&_nc_ht=scontent-man2-1.xx&oh=00_AfCJjAYDk9bsndz8uyNG-GdFIYcPvdIzbHnetHGzf1pVSw&oe=63BDD131"
@@ -13,29 +32,26 @@ class MangaPill:
             "User-Agent": "Mozilla/5.0",
         }
 
-    def _get_request(self, url: str) -> str:
-        response = requests.get(f"{self.base_url}{url}", headers=self.headers)
+    async def _get_request(self, url: str) -> str:
+        response = await self.client.get(f"{self.base_url}{url}", headers=self.headers)
         response.raise_for_status()
         return response.text
 
-    def search(self, query: str) -> Dict:
+    async def search_async(self, query: str) -> Dict:
         try:
-            query = requests.utils.quote(query)
-            html_data = self._get_request(f"/search?q={query}")
-            soup = BeautifulSoup(html_data, "html.parser")
+            query = quote(query)
+            html_data = await self._get_request(f"/search?q={query}")
+            soup = self.parse_html(html_data)
 
             results = []
-            for el in soup.select("div.container div.my-3.justify-end > div"):
-                link = el.select_one("a")
-                img = el.select_one("a img")
+            for el in self.SEARCH_RESULTS.select(soup):
+                link = self.SEARCH_LINK.select_one(el)
+                img = self.SEARCH_IMAGE.select_one(el)
+                title = self.SEARCH_TITLE.select_one(el)
                 results.append(
                     {
                         "id": link["href"].split("/manga/")[1] if link else "",
-                        "title": (
-                            el.select_one("div > a > div").text.strip()
-                            if el.select_one("div > a > div")
-                            else ""
-                        ),
+                        "title": title.text.strip() if title else "",
                         "image": img["data-src"] if img else "",
                         "headerForImage": {
                             "Referer": self.base_url
@@ -44,38 +60,28 @@ class MangaPill:
                 )
 
             return {"results": results}
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
 
-    def fetch_manga_info(self, manga_id: str) -> Dict:
+    async def fetch_manga_info_async(self, manga_id: str) -> Dict:
         manga_info = {
             "id": manga_id,
             "title": "",
         }
         try:
-            html_data = self._get_request(f"/manga/{manga_id}")
-            soup = BeautifulSoup(html_data, "html.parser")
+            html_data = await self._get_request(f"/manga/{manga_id}")
+            soup = self.parse_html(html_data)
 
-            manga_info["title"] = soup.select_one(
-                "div.container div.my-3 div.flex-col div.mb-3 h1"
-            ).text.strip()
+            manga_info["title"] = self.TITLE.select_one(soup).text.strip()
             manga_info["description"] = " ".join(
-                soup.select_one(
-                    "p.text-sm.text--secondary"
-                ).text.split("\n")
+                self.DESCRIPTION.select_one(soup).text.split("\n")
             ).strip()
-            manga_info["releaseDate"] = (
-                soup.select_one(
-                    'div.grid.grid-cols-1.gap-3.mb-3 div:nth-child(3) div'
-                ).text.strip()
-            )
+            manga_info["releaseDate"] = self.RELEASE_DATE.select_one(soup).text.strip()
             manga_info["genres"] = [
                 genre.strip()
-                for genre in soup.select_one(
-                    'div.container div.my-3 div.flex-col div.mb-3:contains("Genres")'
-                ).text.split("\n")
+                for genre in self.GENRES.select_one(soup).text.split("\n")
                 if genre.strip() and genre != "Genres"
             ]
 
@@ -87,41 +93,37 @@ class MangaPill:
                         el.text.split("Chapter ")[1] if "Chapter " in el.text else ""
                     ),
                 }
-                for el in soup.select(
-                    "div.container div.border-border div#chapters div.grid-cols-1 a"
-                )
+                for el in self.CHAPTERS.select(soup)
             ]
 
             return manga_info
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
 
-    def fetch_chapter_pages(self, chapter_id: str) -> List[Dict]:
+    async def fetch_chapter_pages_async(self, chapter_id: str) -> List[Dict]:
         try:
-            html_data = self._get_request(f"/chapters/{chapter_id}")
-            soup = BeautifulSoup(html_data, "html.parser")
+            html_data = await self._get_request(f"/chapters/{chapter_id}")
+            soup = self.parse_html(html_data)
 
-            pages = [
-                {
-                    "img": el.select_one("div picture img")["data-src"],
-                    "page": (
-                            el.select_one("div[data-summary] > div").text.split(
-                                "page "
-                            )[1].split("/")[0]
-                        if el.select_one("div[data-summary] > div")
-                        else 0
-                    ),
-                    "headerForImage": {
-                        "Referer": self.base_url
-                    },
-                }
-                for el in soup.select("chapter-page")
-            ]
+            # One read-only mapping shared by every page, and every chapter
+            header = HEADERS.share({"Referer": self.base_url})
+            pages = []
+            for el in self.PAGES.select(soup):
+                summary = self.PAGE_SUMMARY.select_one(el)
+                pages.append(
+                    {
+                        "img": self.PAGE_IMAGE.select_one(el)["data-src"],
+                        "page": (
+                            summary.text.split("page ")[1].split("/")[0] if summary else 0
+                        ),
+                        "headerForImage": header,
+                    }
+                )
 
             return pages
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
@@ -1,10 +1,34 @@
-import requests
-from bs4 import BeautifulSoup
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, TypedDict
+import soupsieve as sv
+from debug_capture import capture
+from http_client import HTTPError
+from provider import MangaProvider
+
+
+class _ImageList(TypedDict):
+    # The ajax image list wraps the reader markup; nothing else is read
+    html: str
+
+
+class MangaReader(MangaProvider):
+    SEARCH_RESULTS = sv.compile("div.manga_list-sbs div.mls-wrap div.item")
+    SEARCH_LINK = sv.compile("a.manga-poster")
+    SEARCH_IMAGE = sv.compile("a.manga-poster img")
+    SEARCH_GENRES = sv.compile("div.manga-detail div.fd-infor span > a")
+    SEARCH_TITLE = sv.compile("div.manga-detail h3.manga-name a")
+    CONTAINER = sv.compile("div.ani_detail-stage div.container")
+    TITLE = sv.compile("div.anisc-detail h2.manga-name")
+    IMAGE = sv.compile("img.manga-poster-img")
+    DESCRIPTION = sv.compile("div.description")
+    GENRES = sv.compile("div.sort-desc div.genres a")
+    CHAPTERS = sv.compile("div.page-layout.page-detail div.container div.chapters-list-ul ul li")
+    CHAPTER_LINK = sv.compile("a")
+    CHAPTER_NAME = sv.compile("a span.name")
+    READER = sv.compile("div#wrapper")
+    PAGES = sv.compile("div#main-wrapper div.container-reader-chapter div.iv-card")
 
-
-class MangaReader:
     def __init__(self):
+        super().__init__()
         self.name = "MangaReader"
         self.base_url = "https://mangareader.to"
         self.logo = "https://pbs.twimg.com/profile_images/1437311892905545728/TO0hFfUr_400x400.jpg"
@@ -13,111 +37,94 @@ class MangaReader:
             "User-Agent": "Mozilla/5.0",
         }
 
-    def _get_request(self, url: str) -> str:
-        response = requests.get(f"{self.base_url}{url}", headers=self.headers)
+    async def _get_request(self, url: str) -> str:
+        response = await self.client.get(f"{self.base_url}{url}", headers=self.headers)
         response.raise_for_status()
         return response.text
 
-    def search(self, query: str) -> Dict:
+    async def search_async(self, query: str) -> Dict:
         try:
-            html_data = self._get_request(f"/search?keyword={query}")
-            soup = BeautifulSoup(html_data, "html.parser")
+            html_data = await self._get_request(f"/search?keyword={query}")
+            soup = self.parse_html(html_data)
 
             results = []
-            for el in soup.select("div.manga_list-sbs div.mls-wrap div.item"):
-                link = el.select_one("a.manga-poster")
-                image = el.select_one("a.manga-poster img")
-                genres = [
-                    genre.text
-                    for genre in el.select("div.manga-detail div.fd-infor span > a")
-                ]
+            for el in self.SEARCH_RESULTS.select(soup):
+                link = self.SEARCH_LINK.select_one(el)
+                image = self.SEARCH_IMAGE.select_one(el)
+                title = self.SEARCH_TITLE.select_one(el)
+                genres = [genre.text for genre in self.SEARCH_GENRES.select(el)]
 
                 results.append(
                     {
                         "id": link["href"].split("/")[1] if link else "",
-                        "title": (
-                            el.select_one(
-                                "div.manga-detail h3.manga-name a"
-                            ).text.strip()
-                            if el.select_one("div.manga-detail h3.manga-name a")
-                            else ""
-                        ),
+                        "title": title.text.strip() if title else "",
                         "image": image["src"] if image else "",
                         "genres": genres,
                     }
                 )
 
             return {"results": results}
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
 
-    def fetch_manga_info(self, manga_id: str) -> Dict:
+    async def fetch_manga_info_async(self, manga_id: str) -> Dict:
         manga_info = {
             "id": manga_id,
             "title": "",
         }
         try:
-            html_data = self._get_request(f"/{manga_id}")
-            soup = BeautifulSoup(html_data, "html.parser")
-            with open("data.html", "w", encoding="utf-8") as file:
-                file.write(html_data)
-
-            container = soup.select_one("div.ani_detail-stage div.container")
-            manga_info["title"] = container.select_one(
-                "div.anisc-detail h2.manga-name"
-            ).text.strip()
-            manga_info["image"] = container.select_one("img.manga-poster-img")["src"]
-            manga_info["description"] = ' '.join(soup.select_one("div.description").text.split())
+            html_data = await self._get_request(f"/{manga_id}")
+            soup = self.parse_html(html_data)
+            capture("mangareader.manga_info", f"{self.base_url}/{manga_id}", html_data)
+
+            container = self.CONTAINER.select_one(soup)
+            manga_info["title"] = self.TITLE.select_one(container).text.strip()
+            manga_info["image"] = self.IMAGE.select_one(container)["src"]
+            manga_info["description"] = ' '.join(self.DESCRIPTION.select_one(soup).text.split())
             manga_info["genres"] = [
-                genre.text.strip()
-                for genre in container.select("div.sort-desc div.genres a")
+                genre.text.strip() for genre in self.GENRES.select(container)
             ]
-
             manga_info["chapters"] = [
-                {
-                    "id": (
-                        el.select_one("a")["href"].split("/read/")[1]
-                        if el.select_one("a") and el.select_one("a").get("href")
-                        else ""
-                    ),
-                    "title": (
-                        el.select_one("a")["title"].strip()
-                        if el.select_one("a") and el.select_one("a").get("title")
-                        else ""
-                    ),
-                    "chapter": (
-                        el.select_one("a span.name").text.split("Chapter ")[1].split(":")[0]
-                        if el.select_one("a span.name") and "Chapter " in el.select_one("a span.name").text
-                        else ""
-                    ),
-                }
-                for el in soup.select("div.page-layout.page-detail div.container div.chapters-list-ul ul li")
+                self._parse_chapter(el) for el in self.CHAPTERS.select(soup)
             ]
             return manga_info
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
 
-    def fetch_chapter_pages(self, chapter_id: str) -> List[Dict]:
+    def _parse_chapter(self, el) -> Dict:
+        link = self.CHAPTER_LINK.select_one(el)
+        name = self.CHAPTER_NAME.select_one(el)
+        return {
+            "id": (
+                link["href"].split("/read/")[1] if link and link.get("href") else ""
+            ),
+            "title": link["title"].strip() if link and link.get("title") else "",
+            "chapter": (
+                name.text.split("Chapter ")[1].split(":")[0]
+                if name and "Chapter " in name.text
+                else ""
+            ),
+        }
+
+    async def fetch_chapter_pages_async(self, chapter_id: str) -> List[Dict]:
         try:
-            html_data = self._get_request(f"/read/{chapter_id}")
-            soup = BeautifulSoup(html_data, "html.parser")
+            html_data = await self._get_request(f"/read/{chapter_id}")
+            soup = self.parse_html(html_data)
 
-            reading_id = soup.select_one("div#wrapper")["data-reading-id"]
+            reading_id = self.READER.select_one(soup)["data-reading-id"]
             if not reading_id:
                 raise ValueError("Unable to find pages")
 
             ajax_url = f"https://mangareader.to/ajax/image/list/chap/{reading_id}?mode=vertical&quality=high"
-            pages_data = requests.get(ajax_url, headers=self.headers).json()
+            pages_data = (await self.client.get(ajax_url, headers=self.headers)).json(_ImageList)
             pages_html = pages_data["html"]
-            soup_pages = BeautifulSoup(pages_html, "html.parser")
+            soup_pages = self.parse_html(pages_html)
 
-            pages_selector = soup_pages.select(
-                "div#main-wrapper div.container-reader-chapter div.iv-card"
-            )
+            pages_selector = self.PAGES.select(soup_pages)
 
             pages = [
                 {
@@ -128,7 +135,7 @@ class MangaReader:
             ]
 
             return pages
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
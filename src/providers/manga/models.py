@@ -0,0 +1,370 @@
+import asyncio
+import sys
+import threading
+from array import array
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import (
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+    overload,
+)
+from http_client import run_sync
+
+# Chapter dict keys used by the providers, mapped to Chapter fields
+CHAPTER_KEYS = {
+    "id": "id",
+    "title": "title",
+    "chapter": "number",
+    "num": "number",
+    "number": "number",
+    "date": "date",
+    "releaseDate": "date",
+    "releasedDate": "date",
+    "release_date": "date",
+    "pages": "pages",
+}
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class HeaderTable:
+    """
+    Stores each distinct set of image headers once. Records keep the small
+    index returned by `add` (0 means no headers) and share the read-only
+    mapping returned by `get`.
+    """
+
+    def __init__(self):
+        self._headers: List[Optional[Mapping[str, str]]] = [None]
+        self._index: Dict[Tuple[Tuple[str, str], ...], int] = {}
+
+    def add(self, headers: Optional[Mapping[str, str]]) -> int:
+        if not headers:
+            return 0
+        key = tuple(sorted(headers.items()))
+        index = self._index.get(key)
+        if index is None:
+            index = self._index[key] = len(self._headers)
+            self._headers.append(
+                MappingProxyType({_intern(k): _intern(v) for k, v in headers.items()})
+            )
+        return index
+
+    def get(self, index: int) -> Optional[Mapping[str, str]]:
+        return self._headers[index]
+
+    def share(self, headers: Optional[Mapping[str, str]]) -> Optional[Mapping[str, str]]:
+        return self._headers[self.add(headers)]
+
+    def __len__(self) -> int:
+        return len(self._headers) - 1
+
+
+# Default table, shared by every record built without an explicit one
+HEADERS = HeaderTable()
+
+
+@dataclass(slots=True)
+class Page:
+    img: str
+    page: Optional[int] = None
+    headers: Optional[Mapping[str, str]] = None
+
+    @classmethod
+    def from_dict(cls, data: Mapping, headers: HeaderTable = HEADERS) -> "Page":
+        return cls(data["img"], data.get("page"), headers.share(data.get("headerForImage")))
+
+    def to_dict(self) -> Dict:
+        data = {"img": self.img, "page": self.page}
+        if self.headers is not None:
+            data["headerForImage"] = dict(self.headers)
+        return data
+
+
+@dataclass(slots=True)
+class Chapter:
+    id: str
+    title: Optional[str] = None
+    number: Optional[str] = None
+    date: Optional[str] = None
+    pages: Optional[int] = None
+    headers: Optional[Mapping[str, str]] = None
+
+    @classmethod
+    def from_dict(cls, data: Mapping, headers: HeaderTable = HEADERS) -> "Chapter":
+        fields = {CHAPTER_KEYS[k]: v for k, v in data.items() if k in CHAPTER_KEYS}
+        return cls(headers=headers.share(data.get("headerForImage")), **fields)
+
+    def to_dict(self) -> Dict:
+        data = {"id": self.id}
+        for name in ("title", "number", "date", "pages"):
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        if self.headers is not None:
+            data["headerForImage"] = dict(self.headers)
+        return data
+
+
+class ChapterList:
+    """
+    A sequence of Chapter records stored column by column: strings in
+    lists (repeated titles, numbers and dates interned), page counts and
+    header indexes in arrays. Indexing builds the Chapter on demand, so a
+    long series costs a few pointers per chapter instead of a dict each.
+    """
+
+    __slots__ = ("_headers", "_ids", "_titles", "_numbers", "_dates", "_pages", "_header_ids")
+
+    def __init__(self, chapters: Iterable[Chapter] = (), headers: HeaderTable = HEADERS):
+        self._headers = headers
+        self._ids: List[str] = []
+        self._titles: List[Optional[str]] = []
+        self._numbers: List[Optional[str]] = []
+        self._dates: List[Optional[str]] = []
+        # -1 marks an unknown page count
+        self._pages = array("i")
+        self._header_ids = array("I")
+        self.extend(chapters)
+
+    @classmethod
+    def from_dicts(cls, chapters: Iterable[Mapping], headers: HeaderTable = HEADERS) -> "ChapterList":
+        return cls((Chapter.from_dict(chapter, headers) for chapter in chapters), headers)
+
+    def append(self, chapter: Chapter) -> None:
+        self._ids.append(chapter.id)
+        self._titles.append(_intern(chapter.title))
+        self._numbers.append(_intern(chapter.number))
+        self._dates.append(_intern(chapter.date))
+        self._pages.append(-1 if chapter.pages is None else chapter.pages)
+        self._header_ids.append(self._headers.add(chapter.headers))
+
+    def extend(self, chapters: Iterable[Chapter]) -> None:
+        for chapter in chapters:
+            self.append(chapter)
+
+    def _chapter(self, i: int) -> Chapter:
+        pages = self._pages[i]
+        return Chapter(
+            self._ids[i],
+            self._titles[i],
+            self._numbers[i],
+            self._dates[i],
+            None if pages < 0 else pages,
+            self._headers.get(self._header_ids[i]),
+        )
+
+    @overload
+    def __getitem__(self, index: int) -> Chapter: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "ChapterList": ...
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return ChapterList(
+                (self._chapter(i) for i in range(*index.indices(len(self)))), self._headers
+            )
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chapter index out of range")
+        return self._chapter(index)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[Chapter]:
+        for i in range(len(self)):
+            yield self._chapter(i)
+
+    def __reversed__(self) -> Iterator[Chapter]:
+        for i in range(len(self) - 1, -1, -1):
+            yield self._chapter(i)
+
+    def __repr__(self) -> str:
+        return f"ChapterList({len(self)} chapters)"
+
+    def to_dicts(self) -> List[Dict]:
+        return [chapter.to_dict() for chapter in self]
+
+
+@dataclass(slots=True)
+class Manga:
+    id: str
+    title: Optional[str] = None
+    image: Optional[str] = None
+    description: Optional[str] = None
+    status: Optional[str] = None
+    authors: Tuple[str, ...] = ()
+    genres: Tuple[str, ...] = ()
+    alt_titles: Tuple[str, ...] = ()
+    chapters: ChapterList = field(default_factory=ChapterList)
+
+    @classmethod
+    def from_dict(cls, data: Mapping, headers: HeaderTable = HEADERS) -> "Manga":
+        """
+        Builds a Manga from a provider's fetch_manga_info result. Providers
+        name a few fields differently (img, cover_url, descriptions); keys
+        without a Manga field are not kept.
+        """
+        description = data.get("description", data.get("descriptions"))
+        if isinstance(description, Mapping):
+            description = description.get("en") or next(iter(description.values()), None)
+        return cls(
+            id=data["id"],
+            title=data.get("title"),
+            image=data.get("image") or data.get("img") or data.get("cover_url"),
+            description=description,
+            status=_intern(data.get("status")),
+            authors=tuple(_intern(author) for author in data.get("authors") or ()),
+            genres=tuple(_intern(genre) for genre in data.get("genres") or ()),
+            alt_titles=tuple(
+                title if isinstance(title, str) else next(iter(title.values()), "")
+                for title in data.get("alt_titles") or data.get("altTitles") or ()
+            ),
+            chapters=ChapterList.from_dicts(data.get("chapters") or (), headers),
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "image": self.image,
+            "description": self.description,
+            "status": self.status,
+            "authors": list(self.authors),
+            "genres": list(self.genres),
+            "alt_titles": list(self.alt_titles),
+            "chapters": self.chapters.to_dicts(),
+        }
+
+
+# Guards which loop a MangaInfo's chapter iterator belongs to
+_binding = threading.Lock()
+
+
+class MangaInfo(Mapping):
+    """
+    A manga whose metadata is available at once and whose chapters are
+    loaded the first time they are asked for, then kept. `chapters` is
+    either the list itself or a callable returning an async iterator of
+    chapter dicts (usually a provider's iter_chapters_async), which is only
+    advanced as far as callers need.
+
+    It reads like the dict fetch_manga_info returns, but only holds what is
+    already loaded: "chapters" is missing until the chapters are, so load
+    them with `await chapters_async()` or the blocking load_chapters first.
+    The iterator runs on the loop that first loads from it; other loops
+    hand their loads to it, or start over if it has stopped.
+    """
+
+    __slots__ = ("_metadata", "_chapters", "_factory", "_source", "_lock", "_loop")
+
+    def __init__(
+        self,
+        metadata: Mapping,
+        chapters: Union[Iterable[Dict], Callable[[], AsyncIterator[Dict]]] = (),
+    ):
+        self._metadata = metadata
+        self._chapters: List[Dict] = []
+        self._factory = chapters if callable(chapters) else None
+        self._source: Optional[AsyncIterator[Dict]] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        if self._factory is None:
+            self._chapters = list(chapters)
+
+    @property
+    def chapters_loaded(self) -> bool:
+        return self._factory is None
+
+    async def chapters_async(self) -> List[Dict]:
+        return await self.load_chapters_async()
+
+    async def load_chapters_async(self, count: Optional[int] = None) -> List[Dict]:
+        """
+        Returns the first `count` chapters, or all of them, loading only
+        what has not been loaded yet. Concurrent callers share the loading.
+        """
+        if self._needs(count):
+            loop = asyncio.get_running_loop()
+            with _binding:
+                owner = self._loop
+                if owner is not loop and not (owner is not None and owner.is_running()):
+                    # The iterator and its connections belong to a loop that
+                    # has stopped, so they can't be resumed
+                    self._chapters = []
+                    self._source = None
+                    self._lock = asyncio.Lock()
+                    self._loop = owner = loop
+            if owner is not loop:
+                return await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(self.load_chapters_async(count), owner)
+                )
+            async with self._lock:
+                await self._load(count)
+        return self._chapters if count is None else self._chapters[:count]
+
+    def load_chapters(self, count: Optional[int] = None) -> List[Dict]:
+        if self._needs(count):
+            return run_sync(self.load_chapters_async(count))
+        return self._chapters if count is None else self._chapters[:count]
+
+    def _needs(self, count: Optional[int]) -> bool:
+        return self._factory is not None and (count is None or len(self._chapters) < count)
+
+    async def _load(self, count: Optional[int]) -> None:
+        if not self._needs(count):
+            return
+        if self._source is None:
+            self._source = self._factory()
+        try:
+            while count is None or len(self._chapters) < count:
+                self._chapters.append(await self._source.__anext__())
+        except StopAsyncIteration:
+            self._factory = self._source = None
+        except BaseException:
+            # The iterator is finished once it raises; start over next time
+            self._chapters = []
+            self._source = None
+            raise
+
+    def __getitem__(self, key: str):
+        if key == "chapters":
+            if not self.chapters_loaded:
+                raise KeyError(key)
+            return self._chapters
+        return self._metadata[key]
+
+    def _lists_chapters(self) -> bool:
+        return self.chapters_loaded and "chapters" not in self._metadata
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._metadata
+        if self._lists_chapters():
+            yield "chapters"
+
+    def __len__(self) -> int:
+        return len(self._metadata) + self._lists_chapters()
+
+    def __repr__(self) -> str:
+        state = f"{len(self._chapters)} chapters" + ("" if self.chapters_loaded else " loaded so far")
+        return f"MangaInfo({dict(self._metadata)!r}, {state})"
+
+    def to_dict(self) -> Dict:
+        return {**self._metadata, "chapters": self.load_chapters()}
+
+    async def to_dict_async(self) -> Dict:
+        return {**self._metadata, "chapters": await self.load_chapters_async()}
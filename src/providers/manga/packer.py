@@ -0,0 +1,92 @@
+import re
+from functools import lru_cache
+from typing import Callable
+
+# Arguments of the `eval(function(p,a,c,k,e,d){...}('payload',a,c,'k|e|y|s'.split('|'),0,{}))`
+# call emitted by Dean Edwards' packer.
+_ARGS = re.compile(
+    r"}\s*\(\s*'(?P<payload>(?:[^'\\]|\\.)*)'\s*,\s*(?P<radix>\d+|\[\])\s*,"
+    r"\s*(?P<count>\d+)\s*,\s*'(?P<symtab>(?:[^'\\]|\\.)*)'\.split\('\|'\)",
+    re.DOTALL,
+)
+_WORD = re.compile(r"\b\w+\b", re.ASCII)
+_STRING_CONCAT = re.compile(
+    r"""\s*(?:'[^'\\]*'|"[^"\\]*")(?:\s*\+\s*(?:'[^'\\]*'|"[^"\\]*"))*\s*"""
+)
+_STRING_LITERAL = re.compile(r"""'([^'\\]*)'|"([^"\\]*)\"""")
+
+_ALPHABET_62 = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_ALPHABET_95 = (
+    " !\"#$%&'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`"
+    "abcdefghijklmnopqrstuvwxyz{|}~"
+)
+
+
+class UnpackingError(ValueError):
+    pass
+
+
+def _unbaser(radix: int) -> Callable[[str], int]:
+    if 2 <= radix <= 36:
+        return lambda word: int(word, radix)
+    if radix <= 62:
+        alphabet = _ALPHABET_62[:radix]
+    elif radix <= 95:
+        alphabet = _ALPHABET_95[:radix]
+    else:
+        raise UnpackingError(f"Unsupported radix {radix}")
+    digits = {char: value for value, char in enumerate(alphabet)}
+
+    def unbase(word: str) -> int:
+        value = 0
+        for char in word:
+            value = value * radix + digits[char]
+        return value
+
+    return unbase
+
+
+@lru_cache(maxsize=1024)
+def unpack(source: str) -> str:
+    """
+    Decodes a p.a.c.k.e.r. packed script without a JavaScript runtime.
+    `source` may include or omit the leading `eval`. Raises UnpackingError
+    when the script is not in the packed format.
+    """
+    match = _ARGS.search(source)
+    if not match:
+        raise UnpackingError("Not a p.a.c.k.e.r. packed script")
+
+    payload = match.group("payload").replace("\\\\", "\\").replace("\\'", "'")
+    radix = 62 if match.group("radix") == "[]" else int(match.group("radix"))
+    symtab = match.group("symtab").split("|")
+    if len(symtab) != int(match.group("count")):
+        raise UnpackingError("Symbol table does not match its declared size")
+
+    unbase = _unbaser(radix)
+
+    def lookup(word_match: re.Match) -> str:
+        word = word_match.group(0)
+        try:
+            index = unbase(word)
+        except (KeyError, ValueError):
+            return word
+        # Empty entries mean the word stands for itself
+        if index < len(symtab) and symtab[index]:
+            return symtab[index]
+        return word
+
+    return _WORD.sub(lookup, payload)
+
+
+def eval_string_concat(expression: str) -> str:
+    """
+    Evaluates a JavaScript expression made only of string literals joined
+    with `+`, such as the `''+'a'+'b'` keys found in unpacked scripts.
+    """
+    if not _STRING_CONCAT.fullmatch(expression):
+        raise UnpackingError("Not a plain string concatenation")
+    # findall yields ("text", "") or ("", "text") depending on the quotes used
+    return "".join(
+        single + double for single, double in _STRING_LITERAL.findall(expression)
+    )
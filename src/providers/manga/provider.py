@@ -0,0 +1,101 @@
+from typing import Dict, List
+from bs4 import BeautifulSoup
+from html_parser import parse_html
+from http_client import get_async_client, run_sync
+from image_probe import attach_sizes_async
+from models import MangaInfo
+from singleflight import coalesce
+
+# Coroutines whose identical concurrent calls share one fetch
+COALESCED_METHODS = (
+    "search_async",
+    "fetch_manga_info_async",
+    "fetch_manga_async",
+    "fetch_chapter_pages_async",
+)
+
+
+class MangaProvider:
+    """
+    Common interface of every manga provider. Subclasses implement the
+    `*_async` coroutines on the shared async client; the plain methods are a
+    blocking facade over them for scripts such as test.py.
+
+    The COALESCED_METHODS of every subclass are wrapped with
+    `singleflight.coalesce`. Blocking calls all run on the shared background
+    loop, so they are coalesced with each other as well.
+    """
+
+    # Seconds to reuse a page whose origin sends no caching headers
+    cache_ttl = None
+    # resilience.RetryPolicy for this provider; None uses the default policy
+    retry_policy = None
+    # html_parser backend for this provider; None uses the default backend
+    parser_backend = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name in COALESCED_METHODS:
+            if name in cls.__dict__:
+                setattr(cls, name, coalesce(cls.__dict__[name]))
+
+    def __init__(self):
+        self.client = get_async_client(
+            cache_ttl=self.cache_ttl, retry_policy=self.retry_policy
+        )
+
+    def parse_html(self, markup) -> BeautifulSoup:
+        return parse_html(markup, self.parser_backend)
+
+    async def search_async(self, query: str, *args, **kwargs) -> Dict:
+        raise NotImplementedError(f"{type(self).__name__} does not support search")
+
+    async def fetch_manga_info_async(self, manga_id: str, *args, **kwargs) -> Dict:
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support fetch_manga_info"
+        )
+
+    async def fetch_manga_async(self, manga_id: str) -> MangaInfo:
+        """
+        Like fetch_manga_info_async, but providers that load chapters with
+        extra requests override this to return before making them; see
+        models.MangaInfo. By default the full info is fetched up front.
+        """
+        info = await self.fetch_manga_info_async(manga_id)
+        return MangaInfo(
+            {key: value for key, value in info.items() if key != "chapters"},
+            info.get("chapters", []),
+        )
+
+    async def fetch_chapter_pages_async(
+        self, chapter_id: str, *args, **kwargs
+    ) -> List[Dict]:
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support fetch_chapter_pages"
+        )
+
+    async def fetch_chapter_pages_sized_async(
+        self, chapter_id: str, *args, **kwargs
+    ) -> List[Dict]:
+        """
+        fetch_chapter_pages_async with "width" and "height" on every page
+        whose image header could be read, for laying out a chapter before
+        its images load; see image_probe.
+        """
+        pages = await self.fetch_chapter_pages_async(chapter_id, *args, **kwargs)
+        return await attach_sizes_async(pages, client=self.client)
+
+    def search(self, query: str, *args, **kwargs) -> Dict:
+        return run_sync(self.search_async(query, *args, **kwargs))
+
+    def fetch_manga_info(self, manga_id: str, *args, **kwargs) -> Dict:
+        return run_sync(self.fetch_manga_info_async(manga_id, *args, **kwargs))
+
+    def fetch_manga(self, manga_id: str) -> MangaInfo:
+        return run_sync(self.fetch_manga_async(manga_id))
+
+    def fetch_chapter_pages(self, chapter_id: str, *args, **kwargs) -> List[Dict]:
+        return run_sync(self.fetch_chapter_pages_async(chapter_id, *args, **kwargs))
+
+    def fetch_chapter_pages_sized(self, chapter_id: str, *args, **kwargs) -> List[Dict]:
+        return run_sync(self.fetch_chapter_pages_sized_async(chapter_id, *args, **kwargs))
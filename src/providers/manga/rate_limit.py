@@ -0,0 +1,210 @@
+import asyncio
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+# Statuses that mean the origin wants us to slow down.
+THROTTLE_STATUSES = (429, 503)
+
+DEFAULT_SETTINGS = {
+    # Sustained requests per second and how many may be sent back to back;
+    # None leaves the host unpaced and only the concurrency limit applies.
+    "rate": None,
+    "burst": 1,
+    # AIMD concurrency window.
+    "initial_concurrency": 4,
+    "min_concurrency": 1,
+    "max_concurrency": 32,
+    "increase": 1.0,
+    "backoff": 0.5,
+    # A response slower than this multiple of the healthy baseline counts
+    # as congestion.
+    "latency_tolerance": 2.5,
+}
+
+# Origins that throttle us without hand-tuned pacing.
+HOST_SETTINGS = {
+    "api.mangadex.org": {"rate": 5, "burst": 5},
+    "mangareader.to": {"rate": 3, "burst": 6},
+    "weebcentral.com": {"rate": 3, "burst": 6},
+    # One chapterfun.ashx request per page; keep whole chapters from piling on
+    "www.mangahere.cc": {"max_concurrency": 8},
+}
+
+# Image CDNs serve many large files in parallel and don't throttle like page
+# origins do; used for hosts passed to mark_image_host without settings of
+# their own.
+IMAGE_HOST_SETTINGS = {
+    "initial_concurrency": 16,
+    "max_concurrency": 64,
+    "latency_tolerance": 4.0,
+}
+# Image hosts known up front; the image tools mark the rest as they meet them
+IMAGE_HOSTS = ("uploads.mangadex.org", "meo.comick.pictures")
+
+_enabled = True
+_image_hosts = set(IMAGE_HOSTS)
+_host_settings: Dict[str, Dict] = {host: dict(s) for host, s in HOST_SETTINGS.items()}
+# Limiters hold asyncio primitives, which are bound to one loop
+_limiters: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Returns the delay in seconds requested by a Retry-After header, which is
+    either a number of seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostLimiter:
+    """
+    Paces one host with a token bucket and bounds its in-flight requests with
+    an AIMD window: the window grows by `increase` per window's worth of
+    healthy responses and is multiplied by `backoff` on 429/503, timeouts or
+    a latency spike. Retry-After pauses the whole host.
+    """
+
+    def __init__(self, **settings):
+        settings = {**DEFAULT_SETTINGS, **settings}
+        self.rate = settings["rate"]
+        self.burst = settings["burst"]
+        self.min_concurrency = settings["min_concurrency"]
+        self.max_concurrency = settings["max_concurrency"]
+        self.increase = settings["increase"]
+        self.backoff = settings["backoff"]
+        self.latency_tolerance = settings["latency_tolerance"]
+
+        self.limit = float(settings["initial_concurrency"])
+        self.in_flight = 0
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.baseline_latency: Optional[float] = None
+        self.last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def _take_token(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            if self.rate is None:
+                return
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            await self._take_token()
+        except BaseException:
+            await self.release()
+            raise
+
+    async def release(self) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        # Responses already in flight when the origin pushed back report the
+        # same congestion; only react once per round trip.
+        cooldown = self.baseline_latency or 1.0
+        if now - self.last_decrease < cooldown:
+            return
+        self.last_decrease = now
+        self.limit = max(self.min_concurrency, self.limit * self.backoff)
+
+    def record(
+        self,
+        status_code: Optional[int],
+        latency: float,
+        retry_after: Optional[str] = None,
+    ) -> None:
+        """
+        Feeds one finished request back into the limits. `status_code` is
+        None when the request timed out.
+        """
+        if status_code is None or status_code in THROTTLE_STATUSES:
+            delay = parse_retry_after(retry_after)
+            if delay:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self._decrease()
+            return
+
+        if self.baseline_latency is None:
+            self.baseline_latency = latency
+        congested = latency > self.baseline_latency * self.latency_tolerance
+        # Slow drift lets the baseline follow a host whose normal changes
+        self.baseline_latency += 0.05 * (latency - self.baseline_latency)
+        if congested:
+            self._decrease()
+        else:
+            self.limit = min(self.max_concurrency, self.limit + self.increase / self.limit)
+
+
+def configure_rate_limits(
+    enabled: Optional[bool] = None,
+    host_settings: Optional[Dict[str, Dict]] = None,
+) -> None:
+    """
+    Turns pacing on or off and overrides settings per host, e.g.
+    `configure_rate_limits(host_settings={"bato.to": {"rate": 2}})`. Keys not
+    given fall back to DEFAULT_SETTINGS. Existing limiters are reset.
+    """
+    global _enabled
+    if enabled is not None:
+        _enabled = enabled
+    if host_settings:
+        for host, settings in host_settings.items():
+            _host_settings[host] = {**_host_settings.get(host, {}), **settings}
+    _limiters.clear()
+
+
+def mark_image_host(host: Optional[str]) -> None:
+    """
+    Paces `host` with IMAGE_HOST_SETTINGS (under any settings configured for
+    it) from the next limiter created for it; for hosts that serve page
+    images rather than pages.
+    """
+    if host:
+        _image_hosts.add(host)
+
+
+def _settings(host: str) -> Dict:
+    if host in _image_hosts:
+        return {**IMAGE_HOST_SETTINGS, **_host_settings.get(host, {})}
+    return _host_settings.get(host, {})
+
+
+def get_limiter(host: Optional[str]) -> Optional[HostLimiter]:
+    """
+    Returns the limiter for `host` on the running loop, or None when pacing
+    is disabled.
+    """
+    if not _enabled or not host:
+        return None
+    limiters = _limiters.setdefault(asyncio.get_running_loop(), {})
+    limiter = limiters.get(host)
+    if limiter is None:
+        limiter = limiters[host] = HostLimiter(**_settings(host))
+    return limiter
@@ -0,0 +1,185 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, Tuple, Type
+
+from rate_limit import parse_retry_after
+
+# Methods that are safe to send more than once.
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Latency samples kept per host for the hedging delay.
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+
+class RetryPolicy:
+    """
+    How an idempotent request is retried. Each attempt gets at most
+    `attempt_timeout` seconds and all attempts together at most `deadline`.
+    Between attempts we sleep a random time up to `base_delay * 2**n`
+    (capped at `max_delay`), or longer if the origin sent Retry-After.
+
+    With `hedge` enabled an attempt that is still running after the host's
+    p95 latency gets a duplicate request, and whichever answers first wins.
+    """
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        attempt_timeout: float = 20.0,
+        deadline: float = 60.0,
+        base_delay: float = 0.25,
+        max_delay: float = 8.0,
+        retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504),
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay: float = 0.05,
+        hedge_initial_delay: float = 2.0,
+    ):
+        self.attempts = attempts
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = retry_statuses
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        # Used until a host has MIN_LATENCY_SAMPLES samples
+        self.hedge_initial_delay = hedge_initial_delay
+
+    def backoff(self, attempt: int) -> float:
+        # "Full jitter": spreads retries from many callers over the window
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+DEFAULT_POLICY = RetryPolicy()
+_default_policy = DEFAULT_POLICY
+_latencies: Dict[str, deque] = {}
+
+
+def configure_resilience(policy: Optional[RetryPolicy]) -> None:
+    """
+    Sets the policy used by clients that were not given their own. None
+    disables retries.
+    """
+    global _default_policy
+    _default_policy = policy
+
+
+def get_default_policy() -> Optional[RetryPolicy]:
+    return _default_policy
+
+
+def record_latency(host: str, latency: float) -> None:
+    _latencies.setdefault(host, deque(maxlen=LATENCY_WINDOW)).append(latency)
+
+
+def hedge_delay(host: str, policy: RetryPolicy) -> float:
+    samples = sorted(_latencies.get(host, ()))
+    if len(samples) < MIN_LATENCY_SAMPLES:
+        return policy.hedge_initial_delay
+    index = min(len(samples) - 1, int(len(samples) * policy.hedge_quantile))
+    return max(policy.hedge_min_delay, samples[index])
+
+
+async def _first_success(tasks: set):
+    """
+    Returns the result of the first task to succeed, or raises the error of
+    the last one to fail.
+    """
+    pending = set(tasks)
+    error = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                return task.result()
+            error = task.exception()
+    raise error
+
+
+async def _hedged(send: Callable[[], Awaitable], host: str, policy: RetryPolicy):
+    tasks = {asyncio.ensure_future(send())}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay(host, policy))
+        if not done:
+            tasks.add(asyncio.ensure_future(send()))
+        return await _first_success(tasks)
+    finally:
+        for task in tasks:
+            if task.done() and not task.cancelled():
+                # Mark the loser's error as seen so asyncio doesn't log it
+                task.exception()
+            else:
+                task.cancel()
+
+
+async def send_with_retries(
+    send: Callable[[float], Awaitable],
+    host: Optional[str],
+    policy: RetryPolicy,
+    retryable: Tuple[type, ...],
+    timeout_error: Type[Exception],
+):
+    """
+    Runs `send(attempt_timeout)` under `policy`. Exceptions in `retryable`
+    (transport failures worth repeating, not e.g. an invalid URL) and
+    responses with a retryable status are retried until attempts or the
+    deadline run out; the last response is then returned as is, or the last
+    error re-raised.
+
+    Attempt durations are kept as `host`'s latency samples. With no host,
+    for sends whose duration isn't a latency (e.g. a whole download),
+    nothing is recorded and nothing is hedged.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + policy.deadline
+
+    async def attempt():
+        timeout = min(policy.attempt_timeout, max(0.001, deadline - loop.time()))
+        if host is None:
+            return await send(timeout)
+        started = time.monotonic()
+        try:
+            response = await send(timeout)
+        except (asyncio.CancelledError, timeout_error):
+            # A hedge loser or a timed out attempt took at least this long;
+            # leaving it out would pull the hedging delay down
+            record_latency(host, time.monotonic() - started)
+            raise
+        if response.status_code < 500:
+            record_latency(host, time.monotonic() - started)
+        return response
+
+    attempt_number = 0
+    while True:
+        attempt_number += 1
+        response, error = None, None
+        try:
+            if policy.hedge and host is not None:
+                response = await _hedged(attempt, host, policy)
+            else:
+                response = await attempt()
+        except retryable as e:
+            error = e
+
+        if response is not None and response.status_code not in policy.retry_statuses:
+            return response
+        if attempt_number >= policy.attempts:
+            break
+
+        delay = policy.backoff(attempt_number)
+        if response is not None:
+            delay = max(delay, parse_retry_after(response.headers.get("Retry-After")) or 0)
+        if loop.time() + delay >= deadline:
+            break
+        await asyncio.sleep(delay)
+
+    if response is not None:
+        return response
+    if loop.time() >= deadline:
+        raise timeout_error(f"Deadline of {policy.deadline}s exceeded") from error
+    raise error
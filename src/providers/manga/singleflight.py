@@ -0,0 +1,72 @@
+import asyncio
+import functools
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from http_client import contain_exit
+
+# In-flight calls keyed per event loop, since tasks are bound to one loop
+_in_flight: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_enabled = True
+
+
+def configure_singleflight(enabled: bool = True) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+def call_key(owner: str, method: str, args: tuple, kwargs: dict) -> Optional[Hashable]:
+    """
+    Returns the key identifying a call, or None when an argument is not
+    hashable and the call cannot be shared.
+    """
+    key = (owner, method, args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _finish(calls: Dict, key: Hashable, task: asyncio.Task) -> None:
+    calls.pop(key, None)
+    # Retrieve the error so it isn't logged when every caller was cancelled
+    if not task.cancelled():
+        task.exception()
+
+
+async def do(key: Hashable, factory: Callable[[], Awaitable]) -> Any:
+    """
+    Runs `factory()` unless a call with the same key is already in flight on
+    this loop, in which case its result (or error) is shared. The work runs
+    in its own task so one caller being cancelled doesn't fail the others;
+    see http_client.contain_exit for what happens to SystemExit and the like.
+    """
+    calls: Dict[Hashable, asyncio.Task] = _in_flight.setdefault(
+        asyncio.get_running_loop(), {}
+    )
+    task = calls.get(key)
+    if task is None:
+        task = calls[key] = asyncio.ensure_future(contain_exit(factory()))
+        task.add_done_callback(lambda done: _finish(calls, key, done))
+    return await asyncio.shield(task)
+
+
+def coalesce(method: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+    """
+    Wraps a provider coroutine so identical concurrent calls, keyed by
+    (provider, method, args), share a single fetch. Callers receive the same
+    result object and must not mutate it.
+    """
+    if getattr(method, "__coalesced__", False):
+        return method
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        key = call_key(type(self).__qualname__, method.__name__, args, kwargs)
+        if not _enabled or key is None:
+            return await method(self, *args, **kwargs)
+        return await do(key, lambda: method(self, *args, **kwargs))
+
+    wrapper.__coalesced__ = True
+    return wrapper
@@ -0,0 +1,266 @@
+import asyncio
+import contextlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Mapping, Optional, Tuple
+
+import singleflight
+from http_client import AsyncClient, get_async_client, run_sync
+from image_fetch import image_headers, open_image
+from image_store import (
+    DEFAULT_MAX_BYTES,
+    ImageStore,
+    ImageTooLarge,
+    StoredImage,
+    get_image_store,
+)
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = features = None
+
+# Output formats: Pillow format name and media type
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "avif": ("AVIF", "image/avif"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+}
+DEFAULT_QUALITY = 80
+# Widest variant we produce; larger requests are clamped
+MAX_WIDTH = 4096
+SOURCE_CHUNK_SIZE = 256 * 1024
+# (connect, read) seconds for fetching a source image
+SOURCE_TIMEOUT = (10.0, 30.0)
+
+
+def can_encode(format: str) -> bool:
+    """
+    Whether the installed Pillow can write `format` (a FORMATS key). WebP
+    and AVIF depend on optional libraries, and Pillow registers its AVIF
+    writer even when libavif is missing.
+    """
+    Image.init()
+    if FORMATS[format][0] not in Image.SAVE:
+        return False
+    try:
+        return bool(features.check_module(format))
+    except ValueError:
+        # Not a module this Pillow knows (jpeg, png, or AVIF from a plugin)
+        return True
+
+
+@dataclass(frozen=True, slots=True)
+class Variant:
+    """
+    A re-encoding of a source image: `format` from FORMATS, at most `width`
+    pixels wide (None keeps the source width; images are never upscaled).
+    """
+
+    format: str
+    width: Optional[int] = None
+    quality: int = DEFAULT_QUALITY
+
+    def __post_init__(self):
+        if self.format not in FORMATS:
+            raise ValueError(f"Unsupported image format {self.format!r}")
+        if Image is not None and not can_encode(self.format):
+            raise ValueError(f"This Pillow build can't encode {self.format}")
+        if self.width is not None and not 0 < self.width <= MAX_WIDTH:
+            raise ValueError(f"Width must be between 1 and {MAX_WIDTH}")
+        if not 1 <= self.quality <= 100:
+            raise ValueError("Quality must be between 1 and 100")
+
+    @property
+    def key(self) -> str:
+        return f"{self.width or 'full'}w-q{self.quality}.{self.format}"
+
+    @property
+    def media_type(self) -> str:
+        return FORMATS[self.format][1]
+
+
+def _transcode(source: str, destination: str, format: str, width: Optional[int], quality: int) -> None:
+    # Runs in a worker process. Pillow's own errors for oversized sources and
+    # missing encoders are not OSErrors; callers only expect those
+    try:
+        _encode(source, destination, format, width, quality)
+    except Image.DecompressionBombError as e:
+        raise OSError(f"Source image is too large: {e}") from None
+    except KeyError as e:
+        raise OSError(f"No {format} encoder in this Pillow build: {e}") from None
+
+
+def _encode(source: str, destination: str, format: str, width: Optional[int], quality: int) -> None:
+    with Image.open(source) as image:
+        if width and image.width > width:
+            size = (width, max(1, round(image.height * width / image.width)))
+            # Lets JPEG decode at a reduced scale instead of full size
+            image.draft("RGB", size)
+            image = image.resize(size, Image.LANCZOS)
+        else:
+            image.load()
+        if image.mode == "P":
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        if format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA" if "A" in image.mode else "RGB")
+        image.save(destination, format=FORMATS[format][0], quality=quality)
+
+
+class Transcoder:
+    """
+    Produces Variants of images on demand in a pool of `max_workers`
+    processes (half the CPUs by default), so encoding never runs on the
+    event loop and never takes every core. Results are kept in their own
+    ImageStore under `directory`, keyed by (source URL, variant), within
+    `max_bytes`. Sources come from the shared image store when it has
+    them, and are added to it when fetched.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_workers: Optional[int] = None,
+        client: Optional[AsyncClient] = None,
+    ):
+        if Image is None:
+            raise RuntimeError("Transcoding needs Pillow; install it with `pip install pillow`")
+        self.store = ImageStore(directory, max_bytes)
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+        self.client = client or get_async_client()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.max_workers)
+        return self._pool
+
+    async def _source(
+        self, url: str, headers: Mapping[str, str], public_only: bool
+    ) -> Tuple[str, bool]:
+        """
+        Returns a local path of the source image and whether it is a
+        temporary file the caller removes.
+        """
+        shared = get_image_store()
+        if shared is not None:
+            entry = shared.get(url)
+            if entry is not None and await asyncio.to_thread(os.path.exists, entry.path):
+                return entry.path, False
+
+        path = (shared if shared is not None else self.store).temp_path()
+        async with open_image(
+            self.client, url, image_headers(headers), SOURCE_TIMEOUT, public_only
+        ) as response:
+            response.raise_for_status()
+            file = await asyncio.to_thread(open, path, "wb")
+            try:
+                async for chunk in response.iter_chunks(SOURCE_CHUNK_SIZE):
+                    await asyncio.to_thread(file.write, chunk)
+            except BaseException:
+                await asyncio.to_thread(file.close)
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+                raise
+            await asyncio.to_thread(file.close)
+        content_type = response.headers.get("Content-Type")
+        cache_control = response.headers.get("Cache-Control")
+        if shared is not None and shared.accepts(content_type, cache_control):
+            try:
+                entry = await asyncio.to_thread(
+                    shared.add_file, url, path, content_type, cache_control
+                )
+            except ImageTooLarge:
+                # Left at `path`; transcoded from there and then removed
+                pass
+            else:
+                return entry.path, False
+        return path, True
+
+    async def _produce(
+        self, url: str, variant: Variant, headers: Mapping[str, str], public_only: bool
+    ) -> StoredImage:
+        key = f"{url}#{variant.key}"
+        entry = self.store.get(key)
+        if entry is not None and await asyncio.to_thread(os.path.exists, entry.path):
+            return entry
+
+        source, temporary = await self._source(url, headers, public_only)
+        destination = self.store.temp_path()
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor(),
+                _transcode,
+                source,
+                destination,
+                variant.format,
+                variant.width,
+                variant.quality,
+            )
+            return await asyncio.to_thread(
+                self.store.add_file, key, destination, variant.media_type
+            )
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(destination)
+            raise
+        finally:
+            if temporary:
+                with contextlib.suppress(OSError):
+                    os.remove(source)
+
+    async def variant_async(
+        self,
+        url: str,
+        variant: Variant,
+        headers: Optional[Mapping[str, str]] = None,
+        public_only: bool = False,
+    ) -> StoredImage:
+        """
+        Returns the stored `variant` of the image at `url`, making it first
+        if needed; `headers` (a page's headerForImage) are sent when the
+        source has to be fetched, only from public addresses with
+        `public_only` (see image_fetch.open_image). Concurrent requests for
+        the same variant share one encode. Undecodable sources raise OSError.
+        """
+        return await singleflight.do(
+            ("transcode", url, variant, public_only),
+            lambda: self._produce(url, variant, headers or {}, public_only),
+        )
+
+    def variant(
+        self, url: str, variant: Variant, headers: Optional[Mapping[str, str]] = None
+    ) -> StoredImage:
+        return run_sync(self.variant_async(url, variant, headers))
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+_transcoder: Optional[Transcoder] = None
+
+
+def configure_transcoder(
+    directory: Optional[str] = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    max_workers: Optional[int] = None,
+) -> None:
+    """
+    Turns the shared transcoder on, keeping variants in `directory`, or off
+    with None, the default.
+    """
+    global _transcoder
+    if _transcoder is not None:
+        _transcoder.close()
+    _transcoder = Transcoder(directory, max_bytes, max_workers) if directory else None
+
+
+def get_transcoder() -> Optional[Transcoder]:
+    return _transcoder
@@ -1,6 +1,10 @@
-import requests
-from bs4 import BeautifulSoup
+from dataclasses import dataclass
 from typing import List, Dict, Union
+import soupsieve as sv
+from debug_capture import capture
+from html_parser import iter_rows
+from http_client import RequestError, iter_sync
+from provider import MangaProvider
 
 
 class MediaStatus:
@@ -8,85 +12,74 @@ class MediaStatus:
     ONGOING = "ongoing"
 
 
+@dataclass(slots=True)
 class VyvyMangaSearchResultData:
-    def __init__(
-        self,
-        authors: List[Dict],
-        completed: int,
-        created_at: str,
-        description: str,
-        id: int,
-        lastChapter: str,
-        latest_chapter_id: int,
-        main_manga_id: Union[int, None],
-        name: str,
-        name_url: str,
-        scored: int,
-        status: int,
-        thumbnail: str,
-        title: str,
-        updated_at: str,
-        viewed: int,
-        voted: int,
-    ):
-        self.authors = authors
-        self.completed = completed
-        self.created_at = created_at
-        self.description = description
-        self.id = id
-        self.lastChapter = lastChapter
-        self.latest_chapter_id = latest_chapter_id
-        self.main_manga_id = main_manga_id
-        self.name = name
-        self.name_url = name_url
-        self.scored = scored
-        self.status = status
-        self.thumbnail = thumbnail
-        self.title = title
-        self.updated_at = updated_at
-        self.viewed = viewed
-        self.voted = voted
-
-
-class VyvyManga:
+    authors: List[Dict]
+    completed: int
+    created_at: str
+    description: str
+    id: int
+    lastChapter: str
+    latest_chapter_id: int
+    main_manga_id: Union[int, None]
+    name: str
+    name_url: str
+    scored: int
+    status: int
+    thumbnail: str
+    title: str
+    updated_at: str
+    viewed: int
+    voted: int
+
+
+class VyvyManga(MangaProvider):
     name = "Vyvymanga"
     base_url = "https://vyvymanga.net/api"
     logo = "https://vyvymanga.net/web/img/icon.png"
     class_path = "MANGA.VyvyManga"
     base_website_url = "https://vymanga.com"
-
-    def __init__(self):
-        self.session = requests.Session()
-
-    def search(self, query: str, page: int = 1) -> Dict:
+    CHAPTER_ROWS = sv.compile(".list-group > a")
+    SEARCH_RESULTS = sv.compile(".row.book-list .comic-item a")
+    SEARCH_IMAGE = sv.compile("div.comic-image img")
+    SEARCH_TITLE = sv.compile("div.comic-title")
+    SEARCH_LAST_CHAPTER = sv.compile("div.comic-image span.tray-item")
+    PAGINATION = sv.compile("ul.pagination > li")
+    INFO = sv.compile(".col-md-7")
+    TITLE = sv.compile(".title")
+    IMAGE = sv.compile(".img-manga img")
+    AUTHORS = sv.compile('p:has(span.pre-title:-soup-contains("Authors")) a')
+    STATUS = sv.compile('p:has(span.pre-title:-soup-contains("Status")) span.text-ongoing')
+    GENRES = sv.compile('p:has(span.pre-title:-soup-contains("Genres")) a')
+    DESCRIPTION = sv.compile(".summary > .content")
+    PAGES = sv.compile(".vview.carousel-inner > div > img")
+
+    async def search_async(self, query: str, page: int = 1) -> Dict:
         if page < 1:
             raise ValueError("Page must be equal to 1 or greater")
 
         try:
             formatted_query = query.strip().lower().replace(" ", "+")
-            response = self.session.get(
+            response = await self.client.get(
                 f"{self.base_website_url}/search?search_po=0&q={formatted_query}&page={page}"
             )
             response.raise_for_status()
             data = response.text
-            soup = BeautifulSoup(data, "html.parser")
+            soup = self.parse_html(data)
         
-            manga_items = soup.select(".row.book-list .comic-item a")
-            print("Manga items: ", manga_items[0])
+            manga_items = self.SEARCH_RESULTS.select(soup)
             result = []
             for elem in manga_items:
-                image_tag = elem.select("div.comic-image img")[0]
+                image_tag = self.SEARCH_IMAGE.select(elem)[0]
                 
                 image_url = image_tag['data-src']
-                print("image url:", image_url)
-                
                 id_parts = image_url.split("cover/")
                 manga_id = id_parts[1].split("/")[0] if len(id_parts) > 1 else ""
                 
-                title_tag = elem.select("div.comic-title")[0]
+                title_tag = self.SEARCH_TITLE.select(elem)[0]
                 title = title_tag.text.strip() if title_tag else ""
                 
-                last_chap_tag = elem.select("div.comic-image span.tray-item")[0]
+                last_chap_tag = self.SEARCH_LAST_CHAPTER.select(elem)[0]
                 last_chapter = last_chap_tag.text.strip() if last_chap_tag else ""
                 
                 result.append({
@@ -97,7 +90,7 @@ class VyvyManga:
                 })
             
             
-            pagination = soup.select("ul.pagination > li")
+            pagination = self.PAGINATION.select(soup)
             has_next_page = False
             total_pages = page  
             
@@ -113,12 +106,12 @@ class VyvyManga:
                 "totalPages": total_pages,
                 "results": result,
             }
-        except requests.RequestException as e:
-            raise SystemExit(e)
+        except RequestError as e:
+            raise ValueError(f"Request failed: {e}")
         
-    def fetch_manga_info(self, manga_id: str) -> Dict:
+    async def fetch_manga_info_async(self, manga_id: str) -> Dict:
         try:
-            response = self.session.get(
+            response = await self.client.get(
                 f"{self.base_website_url}/manga/{manga_id}",
                 headers={
                     "Accept": "application/json, text/javascript, */*; q=0.01",
@@ -127,44 +120,37 @@ class VyvyManga:
             )
             response.raise_for_status()
             data = response.text
-            soup = BeautifulSoup(data, "html.parser")
+            soup = self.parse_html(data)
+            capture("vyvymanga.manga_info", response.url, data, response.status_code)
 
-            with open("vyvy_manga_info.html", "w", encoding="utf-8") as f:
-                f.write(data)
-
-            div = soup.select_one('.col-md-7')
+            div = self.INFO.select_one(soup)
             if not div:
                 raise ValueError("Could not find the main manga info div")
 
-            title_element = div.select_one('.title')
+            title_element = self.TITLE.select_one(div)
             title = title_element.text.strip() if title_element else "Unknown Title"
 
-            img_element = div.select_one('.img-manga img')
+            img_element = self.IMAGE.select_one(div)
             img = img_element['src'] if img_element else "No Image"
 
             authors = [
                 ele.text.strip()
-                for ele in div.select('p:has(span.pre-title:contains("Authors")) a')
+                for ele in self.AUTHORS.select(div)
             ]
 
-            status_element = div.select_one('p:has(span.pre-title:contains("Status")) span.text-ongoing')
+            status_element = self.STATUS.select_one(div)
             status = status_element.text.strip() if status_element else "Unknown Status"
 
             genres = [
                 ele.text.strip()
-                for ele in div.select('p:has(span.pre-title:contains("Genres")) a')
+                for ele in self.GENRES.select(div)
             ]
 
-            description_element = soup.select_one('.summary > .content')
+            description_element = self.DESCRIPTION.select_one(soup)
             description = description_element.text.strip() if description_element else "No Description"
 
             chapters = [
-                {
-                    "id": ele["href"],
-                    "title": ele.text.replace(ele.find("p").text.strip(), "").strip(),
-                    "releaseDate": ele.find("p").text.strip(),
-                }
-                for ele in soup.select(".list-group > a")
+                self._parse_chapter(ele) for ele in self.CHAPTER_ROWS.select(soup)
             ][::-1]
 
             return {
@@ -177,22 +163,57 @@ class VyvyManga:
                 "description": description,
                 "chapters": chapters,
             }
-        except requests.RequestException as e:
-            raise SystemExit(e)
-
-    def fetch_chapter_pages(self, chapter_id: str) -> List[Dict]:
+        except RequestError as e:
+            raise ValueError(f"Request failed: {e}")
+
+    def _parse_chapter(self, ele) -> Dict:
+        release_date = ele.find("p").text.strip()
+        return {
+            "id": ele["href"],
+            "title": ele.text.replace(release_date, "").strip(),
+            "releaseDate": release_date,
+        }
+
+    async def iter_chapters_async(self, manga_id: str):
+        """
+        Yields chapters newest first as the page lists them (fetch_manga_info
+        returns them oldest first). With parser_backend "lxml" they arrive
+        while the page is still downloading, without the whole document in
+        memory (see html_parser.iter_rows).
+        """
+        try:
+            async with self.client.stream(
+                "GET",
+                f"{self.base_website_url}/manga/{manga_id}",
+                headers={
+                    "Accept": "application/json, text/javascript, */*; q=0.01",
+                    "Referer": f"{self.base_website_url}/",
+                },
+            ) as response:
+                response.raise_for_status()
+                async for ele in iter_rows(
+                    response.iter_chunks(), self.CHAPTER_ROWS, response.encoding, self.parser_backend
+                ):
+                    yield self._parse_chapter(ele)
+        except RequestError as e:
+            raise ValueError(f"Request failed: {e}")
+
+    def iter_chapters(self, manga_id: str):
+        return iter_sync(self.iter_chapters_async(manga_id))
+
+    async def fetch_chapter_pages_async(self, chapter_id: str) -> List[Dict]:
         try:
-            response = self.session.get(chapter_id)
+            response = await self.client.get(chapter_id)
             response.raise_for_status()
             data = response.text
-            soup = BeautifulSoup(data, "html.parser")
+            soup = self.parse_html(data)
 
             images = [
                 {"img": img["data-src"][:-5], "page": index + 1}
                 for index, img in enumerate(
-                    soup.select(".vview.carousel-inner > div > img")
+                    self.PAGES.select(soup)
                 )
             ]
             return images
-        except requests.RequestException as e:
-            raise SystemExit(e)
\ No newline at end of file
+        except RequestError as e:
+            raise ValueError(f"Request failed: {e}")
\ No newline at end of file
@@ -1,10 +1,33 @@
-import requests
-from bs4 import BeautifulSoup
 from typing import List, Dict, Optional
+import soupsieve as sv
+from http_client import HTTPError
+from models import HEADERS
+from provider import MangaProvider
+
+
+class WeebCentral(MangaProvider):
+    cache_ttl = 300
+
+    TITLE = sv.compile("h1.text-2xl.font-bold")
+    COVER = sv.compile("section.flex.items-center.justify-center picture img")
+    DESCRIPTION = sv.compile("li p.whitespace-pre-wrap")
+    STATUS = sv.compile("li strong:-soup-contains('Status:') + a")
+    TYPE = sv.compile("li strong:-soup-contains('Type:') + a")
+    RELEASED = sv.compile("li strong:-soup-contains('Released:') + span")
+    AUTHORS = sv.compile("li strong:-soup-contains('Author') + span a")
+    TAGS = sv.compile("li strong:-soup-contains('Tags') ~ span a")
+    CHAPTERS = sv.compile("#chapter-list .flex.items-center a")
+    CHAPTER_TITLE = sv.compile("span.grow span")
+    CHAPTER_TIME = sv.compile("time")
+    SEARCH_RESULTS = sv.compile("a.btn.join-item.h-20")
+    SEARCH_IMAGE = sv.compile("div.w-12.h-12.overflow-hidden picture img")
+    SEARCH_TITLE = sv.compile(
+        "div.flex-1.overflow-hidden.text-left.text-ellipsis.leading-normal.line-clamp-2"
+    )
+    PAGES = sv.compile("img.maw-w-full.mx-auto")
 
-
-class WeebCentral:
     def __init__(self):
+        super().__init__()
         self.name = "WeebCentral"
         self.base_url = "https://weebcentral.com/"
         self.logo = "NONE"
@@ -13,12 +36,12 @@ class WeebCentral:
             "User-Agent": "Mozilla/5.0",
         }
 
-    def _get_request(self, url: str) -> str:
-        response = requests.get(f"{self.base_url}{url}", headers=self.headers)
+    async def _get_request(self, url: str) -> str:
+        response = await self.client.get(f"{self.base_url}{url}", headers=self.headers)
         response.raise_for_status()
         return response.text
     
-    def fetch_manga_info(self, manga_id: str) -> Dict:
+    async def fetch_manga_info_async(self, manga_id: str) -> Dict:
         manga_info = {
             "id": manga_id,
             "title": "",
@@ -32,58 +55,60 @@ class WeebCentral:
             "chapters": []
         }
         try:
-            html_data = self._get_request(f"/series/{manga_id}")
-            soup = BeautifulSoup(html_data, "html.parser")
+            html_data = await self._get_request(f"/series/{manga_id}")
+            soup = self.parse_html(html_data)
 
             # Extract title
-            title_element = soup.select_one("h1.text-2xl.font-bold")
+            title_element = self.TITLE.select_one(soup)
             if title_element:
                 manga_info["title"] = title_element.text.strip()
 
             # Extract cover image
-            cover_element = soup.select_one("section.flex.items-center.justify-center picture img")
+            cover_element = self.COVER.select_one(soup)
             if cover_element and "src" in cover_element.attrs:
                 manga_info["cover_url"] = cover_element["src"]
 
             # Extract description
-            description_element = soup.select_one("li p.whitespace-pre-wrap")
+            description_element = self.DESCRIPTION.select_one(soup)
             if description_element:
                 manga_info["description"] = description_element.text.strip()
 
             # Extract status
-            status_element = soup.select_one("li strong:-soup-contains('Status:') + a")
+            status_element = self.STATUS.select_one(soup)
             if status_element:
                 manga_info["status"] = status_element.text.strip()
 
             # Extract type
-            type_element = soup.select_one("li strong:-soup-contains('Type:') + a")
+            type_element = self.TYPE.select_one(soup)
             if type_element:
                 manga_info["type"] = type_element.text.strip()
 
             # Extract released year
-            released_element = soup.select_one("li strong:-soup-contains('Released:') + span")
+            released_element = self.RELEASED.select_one(soup)
             if released_element:
                 manga_info["released"] = released_element.text.strip()
 
             # Extract authors
-            author_elements = soup.select("li strong:-soup-contains('Author') + span a")
+            author_elements = self.AUTHORS.select(soup)
             if author_elements:
                 manga_info["authors"] = [author.text.strip() for author in author_elements]
 
             # Extract tags
-            tag_elements = soup.select("li strong:-soup-contains('Tags') ~ span a")
+            tag_elements = self.TAGS.select(soup)
             if tag_elements:
                 manga_info["tags"] = [tag.text.strip() for tag in tag_elements]
 
             # Extract chapters
-            chapter_elements = soup.select("#chapter-list .flex.items-center a")
+            chapter_elements = self.CHAPTERS.select(soup)
             chapters = []
             for chapter in chapter_elements:
                 chapter_url = chapter.get("href", "")
                 if chapter_url:
                     chapter_id = chapter_url.split("/")[-1]
-                    chapter_title = chapter.select_one("span.grow span").text.strip() if chapter.select_one("span.grow span") else ""
-                    chapter_time = chapter.select_one("time").get("datetime", "") if chapter.select_one("time") else ""
+                    title_element = self.CHAPTER_TITLE.select_one(chapter)
+                    time_element = self.CHAPTER_TIME.select_one(chapter)
+                    chapter_title = title_element.text.strip() if title_element else ""
+                    chapter_time = time_element.get("datetime", "") if time_element else ""
                     
                     chapters.append({
                         "id": chapter_id,
@@ -94,12 +119,12 @@ class WeebCentral:
             manga_info["chapters"] = chapters
 
             return manga_info
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
 
-    def search(
+    async def search_async(
         self, query: str) -> Dict:
         try:
 
@@ -132,27 +157,25 @@ class WeebCentral:
                 'text': str(query),
             }
 
-            html_data = requests.post(
+            response = await self.client.post(
                 'https://weebcentral.com/search/simple',
                 params=params,
                 headers=headers,
                 data=data,
                 verify=False,
-            ).text         
-            soup = BeautifulSoup(html_data, "html.parser")
+            )
+            html_data = response.text
+            soup = self.parse_html(html_data)
 
             results = []
-            for el in soup.select("a.btn.join-item.h-20"):
+            for el in self.SEARCH_RESULTS.select(soup):
                 link = el['href']
-                img = el.select_one("div.w-12.h-12.overflow-hidden picture img")['src']
+                img = self.SEARCH_IMAGE.select_one(el)['src']
+                title = self.SEARCH_TITLE.select_one(el)
                 results.append(
                     {
                         "id": link.split("/series/")[-1] if link else "",
-                        "title": (
-                            el.select_one("div.flex-1.overflow-hidden.text-left.text-ellipsis.leading-normal.line-clamp-2").text.strip()
-                            if el.select_one("div.flex-1.overflow-hidden.text-left.text-ellipsis.leading-normal.line-clamp-2")
-                            else ""
-                        ),
+                        "title": title.text.strip() if title else "",
                         "image": img if img else "",
                         "headerForImage": {
                             "Referer": self.base_url
@@ -161,27 +184,28 @@ class WeebCentral:
                 )
 
             return {"results": results}
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
 
-    def fetch_chapter_pages(self, chapter_id: str) -> List[Dict]:
+    async def fetch_chapter_pages_async(self, chapter_id: str) -> List[Dict]:
         try:
-            html_data = self._get_request(f"chapters/{chapter_id}/images?is_prev=False&current_page=1&reading_style=long_strip")
-            soup = BeautifulSoup(html_data, "html.parser")
-            page_selector = "img.maw-w-full.mx-auto"
+            html_data = await self._get_request(f"chapters/{chapter_id}/images?is_prev=False&current_page=1&reading_style=long_strip")
+            soup = self.parse_html(html_data)
+            # One read-only mapping shared by every page, and every chapter
+            header = HEADERS.share({"Referer": self.base_url})
             pages = [
                 {
                     "img": el["src"],
                     "page": i+1,
-                    "headerForImage": {"Referer": self.base_url},
+                    "headerForImage": header,
                 }
-                for i, el in enumerate(soup.select(page_selector))
+                for i, el in enumerate(self.PAGES.select(soup))
             ]
 
             return pages
-        except requests.HTTPError as e:
+        except HTTPError as e:
             raise ValueError(f"HTTP Error: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import re
+import sys
+import threading
+
+import pytest
+from aiohttp import web
+
+# The provider modules import each other by bare name from their directory
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "providers", "manga")
+)
+
+
+class Server:
+    """
+    An aiohttp app served from a thread for the duration of a test.
+    `url(path)` builds an absolute URL to it.
+    """
+
+    def __init__(self, app: web.Application):
+        self._app = app
+        self._loop = asyncio.new_event_loop()
+        self._runner = web.AppRunner(app)
+        self.port = None
+
+    def start(self) -> "Server":
+        ready = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, "127.0.0.1", 0)
+            self._loop.run_until_complete(site.start())
+            self.port = site._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+        ready.wait(5)
+        return self
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def url(self, path: str = "/") -> str:
+        return f"http://127.0.0.1:{self.port}{path}"
+
+
+@pytest.fixture
+def serve():
+    """
+    Starts a Server for a route table, e.g. serve({"/a": handler}).
+    """
+    servers = []
+
+    def start(routes) -> Server:
+        app = web.Application()
+        for path, handler in routes.items():
+            app.router.add_route("*", path, handler)
+        server = Server(app).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def _encode(value: int, radix: int) -> str:
+    digits = ""
+    while True:
+        value, digit = divmod(value, radix)
+        digits = ALPHABET[digit] + digits
+        if not value:
+            return digits
+
+
+def _pack(source: str, radix: int = 62) -> str:
+    # Minimal Dean Edwards packer: every word becomes its base-`radix` index
+    words = []
+    for word in re.findall(r"\b\w+\b", source, re.ASCII):
+        if word not in words:
+            words.append(word)
+    index = {word: _encode(n, radix) for n, word in enumerate(words)}
+    payload = re.sub(r"\b\w+\b", lambda m: index[m.group(0)], source, flags=re.ASCII)
+    payload = payload.replace("\\", "\\\\").replace("'", "\\'")
+    return (
+        "eval(function(p,a,c,k,e,d){e=function(c){return c};"
+        "if(!''.replace(/^/,String)){while(c--)d[c]=k[c]||c;k=[function(e){return d[e]}];"
+        "e=function(){return'\\\\w+'};c=1};while(c--)if(k[c])p=p.replace("
+        "new RegExp('\\\\b'+e(c)+'\\\\b','g'),k[c]);return p}"
+        f"('{payload}',{radix},{len(words)},'{'|'.join(words)}'.split('|'),0,{{}}))"
+    )
+
+
+@pytest.fixture
+def pack():
+    """
+    Packs a script the way p.a.c.k.e.r. does, e.g. pack("var a='b';").
+    """
+    return _pack
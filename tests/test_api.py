@@ -0,0 +1,87 @@
+import os
+import sys
+
+import pytest
+from aiohttp import web
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "api"))
+import main  # noqa: E402
+
+import image_fetch  # noqa: E402
+from image_store import ImageStore  # noqa: E402
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(100)
+
+
+async def _png(request):
+    return web.Response(body=PNG, content_type="image/png", headers={"Cache-Control": "max-age=60"})
+
+
+@pytest.fixture
+def api():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def any_host(monkeypatch):
+    # The test server is on loopback, which the proxy refuses
+    async def allow(url):
+        pass
+
+    monkeypatch.setattr(image_fetch, "check_public_url", allow)
+
+
+def test_refuses_other_schemes(api):
+    assert api.get("/image", params={"url": "file:///etc/passwd"}).status_code == 400
+
+
+def test_refuses_local_addresses(api, serve):
+    server = serve({"/a.png": _png})
+    for url in (server.url("/a.png"), "http://localhost/a.png", "http://169.254.169.254/latest"):
+        response = api.get("/image", params={"url": url})
+        assert response.status_code == 403, url
+
+
+def test_relays_images(api, serve, any_host):
+    seen = []
+
+    async def image(request):
+        seen.append(request.headers.get("Referer"))
+        return await _png(request)
+
+    server = serve({"/a.png": image})
+    response = api.get("/image", params={"url": server.url("/a.png"), "referer": "https://site.example/"})
+    assert response.status_code == 200
+    assert response.content == PNG
+    assert response.headers["Content-Type"] == "image/png"
+    assert response.headers["Cache-Control"] == "max-age=60"
+    assert seen == ["https://site.example/"]
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    store = ImageStore(str(tmp_path))
+    monkeypatch.setattr(main, "get_image_store", lambda: store)
+    return store
+
+
+def test_stores_images_but_not_pages_or_private_bodies(api, serve, any_host, store):
+    async def page(request):
+        return web.Response(text="<html>gone</html>", content_type="text/html")
+
+    async def private(request):
+        return web.Response(body=PNG, content_type="image/png", headers={"Cache-Control": "private"})
+
+    server = serve({"/a.png": _png, "/page": page, "/private.png": private})
+    for path in ("/a.png", "/page", "/private.png"):
+        assert api.get("/image", params={"url": server.url(path)}).status_code == 200
+
+    stored = store.get(server.url("/a.png"))
+    assert stored is not None and open(stored.path, "rb").read() == PNG
+    assert store.get(server.url("/page")) is None
+    assert store.get(server.url("/private.png")) is None
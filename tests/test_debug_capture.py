@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+import debug_capture
+from debug_capture import capture, capture_enabled, captured, configure_capture
+
+
+@pytest.fixture(autouse=True)
+def capture_off():
+    yield
+    configure_capture(None)
+
+
+def test_off_by_default():
+    assert not capture_enabled()
+    capture("x", "http://x/", "body")
+    assert captured() == []
+
+
+def test_memory_ring_is_bounded_by_entries_and_bytes():
+    configure_capture("memory", max_entries=3, max_bytes=10)
+    for n in range(5):
+        capture(f"page{n}", "http://x/", "ab", 200)
+    assert [e.name for e in captured()] == ["page2", "page3", "page4"]
+    assert captured()[0].text == "ab"
+
+    capture("big", "http://x/", b"123456789")
+    assert [e.name for e in captured()] == ["big"]
+
+
+def test_spool_rotates_files(tmp_path):
+    configure_capture("spool", str(tmp_path), max_entries=2)
+    for n in range(4):
+        capture(f"search/{n}", "http://x/?q=1", "<html></html>", 200)
+    # Closing waits for the writer thread to drain its queue
+    sink = debug_capture._sink
+    sink.close()
+    files = sink.entries()
+    assert len(files) == 2
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(f) for f in files)
+    assert files[-1].endswith("-search_3.html")
+    with open(files[-1], "rb") as f:
+        assert f.read() == b"<!-- 200 http://x/?q=1 -->\n<html></html>"
+    debug_capture._sink = None
+
+
+def test_bad_configuration():
+    with pytest.raises(ValueError):
+        configure_capture("spool")
+    with pytest.raises(ValueError):
+        configure_capture("disk")
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+import rate_limit
+from downloader import download_chapter
+from image_fetch import IMAGE_HEADERS, ImageLimiter, image_headers
+from image_store import ImageStore
+from resilience import RetryPolicy
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(100)
+
+
+@pytest.fixture(autouse=True)
+def fresh_image_hosts(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_image_hosts", set())
+
+
+def test_image_headers_layer_in_order():
+    assert image_headers() == IMAGE_HEADERS
+    assert image_headers({"Referer": "a", "User-Agent": "x"}, None, {"Referer": "b"}) == {
+        "User-Agent": "x",
+        "Referer": "b",
+    }
+
+
+def test_image_limiter_caps_each_host():
+    limiter = ImageLimiter(concurrency=10, per_host=2)
+    state = {"a": 0, "b": 0, "peak": {}}
+
+    async def fetch(url, host):
+        async with limiter.slot(url):
+            state[host] += 1
+            state["peak"][host] = max(state["peak"].get(host, 0), state[host])
+            await asyncio.sleep(0.01)
+            state[host] -= 1
+
+    async def main():
+        await asyncio.gather(
+            *(fetch(f"http://a.example/{n}.jpg", "a") for n in range(6)),
+            *(fetch(f"http://b.example:81/{n}.jpg", "b") for n in range(6)),
+        )
+
+    asyncio.run(main())
+    assert state["peak"] == {"a": 2, "b": 2}
+    assert rate_limit._image_hosts == {"a.example", "b.example"}
+
+
+def test_downloads_pages_in_order(serve, tmp_path):
+    seen = []
+
+    async def image(request):
+        seen.append((request.match_info["name"], request.headers.get("Referer"), request.headers["User-Agent"]))
+        return web.Response(body=PNG, content_type="image/png")
+
+    server = serve({"/img/{name}": image})
+    pages = [
+        {"img": server.url("/img/a.jpg"), "headerForImage": {"Referer": "https://site.example/"}},
+        {"img": server.url("/img/b"), "page": 2},
+        {"error": "Could not extract the page"},
+    ]
+    results = download_chapter(pages, str(tmp_path / "chapter"), retry_policy=RetryPolicy(attempts=1))
+
+    assert [r.ok for r in results] == [True, True, False]
+    assert results[0].path.endswith("001.jpg")
+    # No extension in the URL: taken from the content type
+    assert results[1].path.endswith("002.png")
+    assert results[2].error == "Could not extract the page"
+    assert sorted(p.name for p in (tmp_path / "chapter").iterdir()) == ["001.jpg", "002.png"]
+    assert (tmp_path / "chapter" / "001.jpg").read_bytes() == PNG
+    assert sorted(seen) == [
+        ("a.jpg", "https://site.example/", IMAGE_HEADERS["User-Agent"]),
+        ("b", None, IMAGE_HEADERS["User-Agent"]),
+    ]
+    assert "127.0.0.1" in rate_limit._image_hosts
+
+
+def test_retryable_statuses_are_retried_and_others_are_not(serve, tmp_path):
+    calls = {"flaky": 0, "gone": 0}
+
+    async def flaky(request):
+        calls["flaky"] += 1
+        if calls["flaky"] < 3:
+            return web.Response(status=503)
+        return web.Response(body=PNG, content_type="image/png")
+
+    async def gone(request):
+        calls["gone"] += 1
+        return web.Response(status=404)
+
+    server = serve({"/flaky.png": flaky, "/gone.png": gone})
+    results = download_chapter(
+        [{"img": server.url("/flaky.png")}, {"img": server.url("/gone.png")}],
+        str(tmp_path),
+        retry_policy=RetryPolicy(attempts=3, base_delay=0.001),
+    )
+
+    assert results[0].ok and results[0].size == len(PNG)
+    assert calls["flaky"] == 3
+    assert not results[1].ok and "404" in results[1].error
+    assert calls["gone"] == 1
+    # Failed attempts leave no partial or empty files behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["001.png"]
+
+
+def test_store_takes_pages_that_fit(serve, tmp_path):
+    async def image(request):
+        return web.Response(body=PNG if request.match_info["name"] == "small" else PNG * 2, content_type="image/png")
+
+    server = serve({"/img/{name}": image})
+    store = ImageStore(str(tmp_path / "store"), max_bytes=len(PNG) + 10)
+    pages = [{"img": server.url("/img/small")}, {"img": server.url("/img/large")}]
+    results = download_chapter(
+        pages, str(tmp_path / "chapter"), store=store, retry_policy=RetryPolicy(attempts=1)
+    )
+
+    # Too large for the store, but still downloaded
+    assert [r.size for r in results] == [len(PNG), len(PNG) * 2]
+    assert store.get(server.url("/img/small")) is not None
+    assert store.get(server.url("/img/large")) is None
+    assert store.size == len(PNG)
@@ -0,0 +1,49 @@
+import json
+from typing import List, Optional, TypedDict
+
+import pytest
+
+import fast_json
+from fast_json import decode, loads
+
+
+class _Chapter(TypedDict, total=False):
+    hid: str
+    chap: Optional[str]
+
+
+class _Chapters(TypedDict, total=False):
+    chapters: List[_Chapter]
+
+
+DOC = {"chapters": [{"hid": "a", "chap": "1", "extra": [1, 2]}, {"hid": "b", "chap": None}], "total": 2}
+
+
+@pytest.mark.parametrize("backend", ["orjson", "msgspec", "json"])
+def test_loads_backends_agree(backend, monkeypatch):
+    if backend != "json" and getattr(fast_json, backend) is None:
+        pytest.skip(f"{backend} is not installed")
+    for other in ("orjson", "msgspec"):
+        if other != backend:
+            monkeypatch.setattr(fast_json, other, None)
+    raw = json.dumps(DOC)
+    assert loads(raw) == loads(raw.encode()) == DOC
+
+
+def test_decode_without_schema_is_loads():
+    assert decode(json.dumps(DOC)) == DOC
+
+
+def test_decode_with_a_schema_keeps_the_named_fields():
+    decoded = decode(json.dumps(DOC).encode(), _Chapters)
+    assert [c["hid"] for c in decoded["chapters"]] == ["a", "b"]
+    assert decoded["chapters"][1]["chap"] is None
+    if fast_json.msgspec is not None:
+        # Unnamed fields are skipped
+        assert "total" not in decoded
+        assert "extra" not in decoded["chapters"][0]
+
+
+def test_decode_falls_back_when_the_payload_does_not_match():
+    payload = {"chapters": "not a list"}
+    assert decode(json.dumps(payload), _Chapters) == payload
@@ -0,0 +1,190 @@
+import asyncio
+
+import pytest
+
+import html_parser
+from html_parser import (
+    AVAILABLE_BACKENDS,
+    BackendMismatch,
+    check_backends,
+    configure_parser,
+    find_attribute,
+    find_scripts,
+    iter_rows,
+    parse_attributes,
+    parse_html,
+    parse_partial,
+    resolve_backend,
+)
+
+PAGE = """
+<html><body>
+  <ul class="list"><li><a href="/c/1">One</a></li><li><a href="/c/2">Two &amp; more</a></li></ul>
+</body></html>
+"""
+
+
+def test_stdlib_backend_is_always_available():
+    assert "html.parser" in AVAILABLE_BACKENDS
+
+
+def test_default_backend_is_the_stdlib_one_even_with_lxml():
+    # Other backends are opted into per provider
+    assert html_parser._default_backend == "html.parser"
+    assert resolve_backend() == "html.parser"
+
+
+def test_configure_parser_rejects_missing_backends(monkeypatch):
+    monkeypatch.setattr(html_parser, "_default_backend", html_parser._default_backend)
+    with pytest.raises(ValueError, match="not available"):
+        configure_parser("no-such-parser")
+    configure_parser("html.parser")
+    assert resolve_backend() == "html.parser"
+    # A provider's own choice wins when it is installed
+    assert resolve_backend(AVAILABLE_BACKENDS[0]) == AVAILABLE_BACKENDS[0]
+    assert resolve_backend("no-such-parser") == "html.parser"
+
+
+@pytest.mark.parametrize("backend", AVAILABLE_BACKENDS)
+def test_backends_extract_the_same_rows(backend):
+    soup = parse_html(PAGE, backend)
+    rows = [(a["href"], a.text) for a in soup.select("ul.list > li > a")]
+    assert rows == [("/c/1", "One"), ("/c/2", "Two & more")]
+
+
+def test_check_backends_forces_each_backend():
+    seen = []
+
+    async def call():
+        seen.append(resolve_backend("html.parser"))
+        return [a.text for a in parse_html(PAGE, "html.parser").select("a")]
+
+    assert asyncio.run(check_backends(call)) == ["One", "Two & more"]
+    assert seen == list(AVAILABLE_BACKENDS)
+
+
+def test_check_backends_reports_mismatches():
+    async def call():
+        return resolve_backend()
+
+    if len(AVAILABLE_BACKENDS) < 2:
+        pytest.skip("needs two parser backends")
+    with pytest.raises(BackendMismatch) as error:
+        asyncio.run(check_backends(call))
+    assert set(error.value.results) == set(AVAILABLE_BACKENDS)
+
+
+ISLANDS = """
+<astro-island uid="1" component-url="/nav.js" props='{"a":1}'></astro-island>
+<astro-island uid="2" component-url="/reader.js" props="{&quot;pages&quot;:[1]}"></astro-island>
+<script type="application/json" id="data">{"x": "</div>"}</script>
+<script src="/app.js"></script>
+"""
+
+
+def test_parse_attributes_decodes_entities_and_keeps_the_first():
+    assert parse_attributes('A="1" b=\'x &amp; y\' c=bare d a="2"') == {
+        "a": "1", "b": "x & y", "c": "bare", "d": ""
+    }
+
+
+def test_find_attribute_matches_on_attrs():
+    assert find_attribute(ISLANDS, "astro-island", "props") == '{"a":1}'
+    assert (
+        find_attribute(ISLANDS, "astro-island", "props", {"component-url": "/reader.js"})
+        == '{"pages":[1]}'
+    )
+    assert find_attribute(ISLANDS, "astro-island", "props", {"uid": "9"}) is None
+
+
+def test_find_attribute_parses_only_when_the_scan_finds_nothing(monkeypatch):
+    calls = []
+
+    def partial(*args, **kwargs):
+        calls.append(args[1])
+        return parse_partial(*args, **kwargs)
+
+    monkeypatch.setattr(html_parser, "parse_partial", partial)
+    assert find_attribute(ISLANDS, "astro-island", "uid") == "1"
+    assert calls == []
+    assert find_attribute(ISLANDS, "img", "src") is None
+    assert calls == ["img"]
+
+
+def test_find_scripts_returns_attributes_and_raw_text():
+    scripts = find_scripts(ISLANDS)
+    assert scripts == [
+        ({"type": "application/json", "id": "data"}, '{"x": "</div>"}'),
+        ({"src": "/app.js"}, ""),
+    ]
+
+
+@pytest.mark.parametrize("backend", AVAILABLE_BACKENDS)
+def test_parse_partial_keeps_only_matching_tags(backend):
+    soup = parse_partial(PAGE + ISLANDS, "a", backend=backend)
+    assert [a["href"] for a in soup.find_all("a")] == ["/c/1", "/c/2"]
+    assert soup.find("ul") is None
+    assert soup.find("script") is None
+
+
+LIST = (
+    '<html><body><ul class="detail-main-list">'
+    + "".join(f'<li class="row"><a href="/c/{n}">Chapter {n} <b>new</b></a><!-- c --></li>' for n in range(50))
+    + '</ul><div class="row">not a chapter</div></body></html>'
+)
+
+
+async def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        await asyncio.sleep(0)
+        yield data[start:start + size]
+
+
+def _rows(markup: str, selector: str, size: int = 7, backend: str = "lxml"):
+    async def main():
+        return [row async for row in iter_rows(_chunks(markup.encode(), size), selector, backend=backend)]
+
+    return asyncio.run(main())
+
+
+needs_lxml = pytest.mark.skipif("lxml" not in AVAILABLE_BACKENDS, reason="streams with lxml only")
+
+
+@needs_lxml
+@pytest.mark.parametrize("selector", ["ul.detail-main-list > li", "ul li.row > a", "li a b"])
+def test_iter_rows_matches_a_full_parse(selector):
+    expected = [str(tag) for tag in parse_html(LIST, "html.parser").select(selector)]
+    assert [str(row) for row in _rows(LIST, selector)] == expected
+
+
+@needs_lxml
+def test_iter_rows_yields_nested_rows():
+    markup = "<div class='x'>a<div class='x'>b</div></div>"
+    assert [row.get_text() for row in _rows(markup, "div.x", size=3)] == ["b", "ab"]
+
+
+@needs_lxml
+def test_iter_rows_rejects_unsupported_selectors():
+    with pytest.raises(ValueError, match="Unsupported"):
+        _rows(LIST, "li:nth-child(2)")
+
+
+def test_iter_rows_parses_whole_with_other_backends(monkeypatch):
+    calls = []
+    full_parse = html_parser.parse_html
+
+    def parse(markup, backend=None):
+        calls.append(resolve_backend(backend))
+        return full_parse(markup, backend)
+
+    monkeypatch.setattr(html_parser, "parse_html", parse)
+    # The default backend, so the rows are html.parser's
+    rows = _rows(LIST, "ul.detail-main-list > li > a", backend=None)
+    assert [row["href"] for row in rows] == [f"/c/{n}" for n in range(50)]
+    assert calls == ["html.parser"]
+
+
+def test_iter_rows_without_lxml(monkeypatch):
+    monkeypatch.setattr(html_parser, "etree", None)
+    rows = _rows(LIST, "ul.detail-main-list > li > a")
+    assert [row["href"] for row in rows] == [f"/c/{n}" for n in range(50)]
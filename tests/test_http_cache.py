@@ -0,0 +1,101 @@
+import time
+
+from aiohttp import web
+from multidict import CIMultiDict
+
+import http_cache
+from http_cache import CacheEntry, HttpCache, cache_key, freshness_lifetime
+from http_client import AsyncClient, run_sync
+
+
+def _entry(body: bytes, expires_in: float = 60, headers=()) -> CacheEntry:
+    return CacheEntry("http://x/", 200, headers, body, "utf-8", time.time() + expires_in)
+
+
+def test_freshness_lifetime():
+    assert freshness_lifetime(CIMultiDict({"Cache-Control": "max-age=30"}), None) == 30
+    assert freshness_lifetime(CIMultiDict({"Cache-Control": "public, s-maxage=5, max-age=30"}), None) == 5
+    assert freshness_lifetime(CIMultiDict({"Cache-Control": "no-cache"}), 100) == 0
+    assert freshness_lifetime(CIMultiDict({"Cache-Control": "no-store"}), 100) is None
+    assert freshness_lifetime(CIMultiDict(), 100) == 100
+    assert freshness_lifetime(CIMultiDict(), None) == 0
+    headers = CIMultiDict(
+        {"Expires": "Thu, 01 Jan 2026 00:01:00 GMT", "Date": "Thu, 01 Jan 2026 00:00:00 GMT"}
+    )
+    assert freshness_lifetime(headers, None) == 60
+
+
+def test_cache_key_depends_on_params_and_headers():
+    base = cache_key("http://x/", {"a": 1}, {"Referer": "r"})
+    assert base == cache_key("http://x/", [("a", "1")], {"referer": "r"})
+    assert base != cache_key("http://x/", {"a": 2}, {"Referer": "r"})
+    assert base != cache_key("http://x/", {"a": 1}, {"Referer": "other"})
+
+
+def test_validators():
+    entry = _entry(b"", headers=[("ETag", '"v1"'), ("Last-Modified", "yesterday")])
+    assert entry.validators() == {"If-None-Match": '"v1"', "If-Modified-Since": "yesterday"}
+
+
+def test_memory_is_bounded_by_bytes():
+    cache = HttpCache(memory_bytes=1000)
+    for n in range(5):
+        cache.set(f"k{n}", _entry(bytes(300)))
+    assert cache.memory_size <= 1000
+    assert cache.get("k0") is None
+    assert cache.get("k4") is not None
+
+    cache.set("huge", _entry(bytes(5000)))
+    assert cache.get("huge") is None
+    assert cache.get("k4") is not None
+
+
+def test_memory_is_bounded_by_entries():
+    cache = HttpCache(memory_entries=2)
+    for n in range(3):
+        cache.set(f"k{n}", _entry(b"x"))
+    assert cache.get("k0") is None
+    assert cache.memory_size == 2
+
+
+def test_disk_is_bounded_and_survives_restart(tmp_path):
+    cache = HttpCache(str(tmp_path), memory_entries=1, disk_bytes=2000)
+    for n in range(5):
+        cache.set(f"k{n:02}", _entry(bytes(600)))
+        time.sleep(0.01)
+    assert cache.disk_size <= 2000
+    assert cache.get("k00") is None
+    assert cache.get("k04").content == bytes(600)
+
+    cache.set("huge", _entry(bytes(5000)))
+    assert not (tmp_path / "hu" / "huge").exists()
+
+    reloaded = HttpCache(str(tmp_path), disk_bytes=2000)
+    assert reloaded.disk_size == cache.disk_size
+    assert reloaded.get("k04").content == bytes(600)
+
+    # Shrinking the budget keeps the newest entries
+    smaller = HttpCache(str(tmp_path), disk_bytes=1000)
+    assert smaller.disk_size <= 1000
+    assert smaller.get("k03") is None
+    assert smaller.get("k04") is not None
+
+
+def test_client_revalidates_with_etag(serve, monkeypatch):
+    calls = []
+
+    async def page(request):
+        calls.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"'})
+        return web.Response(text="hello", headers={"ETag": '"v1"', "Cache-Control": "no-cache"})
+
+    monkeypatch.setattr(http_cache, "_cache", HttpCache())
+    server = serve({"/page": page})
+    client = AsyncClient()
+
+    first = run_sync(client.get(server.url("/page")), timeout=10)
+    second = run_sync(client.get(server.url("/page")), timeout=10)
+    assert first.text == second.text == "hello"
+    assert second.status_code == 200
+    assert calls == [None, '"v1"']
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+import requests
+
+from http_client import Timeout, configure_pool, mount_pools, run_sync
+
+
+def test_mount_pools_caps_configured_hosts():
+    configure_pool(host_limits={"images.example": 2})
+    try:
+        session = mount_pools(requests.Session())
+        adapter = session.get_adapter("https://images.example/a.png")
+        assert adapter._pool_maxsize == 2
+        assert adapter._pool_block
+        assert session.get_adapter("https://other.example/") is not adapter
+    finally:
+        configure_pool(host_limits={})
+
+
+def test_run_sync_returns_result():
+    async def work():
+        await asyncio.sleep(0)
+        return 42
+
+    assert run_sync(work()) == 42
+
+
+def test_run_sync_timeout_cancels_coroutine():
+    cancelled = []
+
+    async def stall():
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with pytest.raises(Timeout):
+        run_sync(stall(), timeout=0.1)
+    # The background loop is still usable afterwards
+    assert run_sync(asyncio.sleep(0, result="ok"), timeout=5) == "ok"
+    assert cancelled == [True]
+
+
+def test_run_sync_refuses_running_loop():
+    async def caller():
+        with pytest.raises(RuntimeError):
+            run_sync(asyncio.sleep(0))
+
+    asyncio.run(caller())
@@ -0,0 +1,181 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+import image_fetch
+import rate_limit
+from http_client import AsyncClient, PublicResolver, Timeout
+from image_fetch import BlockedAddress, check_public_url, is_public_address, open_image
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(100)
+
+
+@pytest.mark.parametrize(
+    "address",
+    ["127.0.0.1", "10.0.0.1", "192.168.1.1", "169.254.169.254", "::1", "fe80::1%eth0",
+     "::ffff:127.0.0.1", "0.0.0.0", "224.0.0.1", "100.64.0.1"],
+)
+def test_non_public_addresses(address):
+    assert not is_public_address(address)
+
+
+def test_public_addresses():
+    assert is_public_address("8.8.8.8")
+    assert is_public_address("2606:4700:4700::1111")
+
+
+@pytest.mark.parametrize(
+    "url", ["http://127.0.0.1/a.png", "http://localhost:8080/a.png", "http://[::1]/", "file:///etc/passwd", "http:///x"]
+)
+def test_check_public_url_refuses(url):
+    with pytest.raises(BlockedAddress):
+        asyncio.run(check_public_url(url))
+
+
+def _serve_redirects(serve):
+    async def start(request):
+        raise web.HTTPFound(request.query.get("to", "/img.png"))
+
+    async def loop(request):
+        raise web.HTTPFound("/loop")
+
+    async def img(request):
+        return web.Response(body=PNG, content_type="image/png")
+
+    return serve({"/start": start, "/loop": loop, "/img.png": img, "/private.png": img})
+
+
+def _open(url, public_only):
+    async def main():
+        client = AsyncClient()
+        try:
+            async with open_image(client, url, {}, (5, 5), public_only) as response:
+                return response.status_code, b"".join([c async for c in response.iter_chunks()])
+        finally:
+            await client.close()
+            await client.public().close()
+
+    return asyncio.run(main())
+
+
+def test_open_image_checks_every_hop(serve, monkeypatch):
+    server = _serve_redirects(serve)
+    checked = []
+
+    async def check(url):
+        checked.append(url.rsplit("/", 1)[1])
+        if "private" in url:
+            raise BlockedAddress(f"{url} is private")
+
+    monkeypatch.setattr(image_fetch, "check_public_url", check)
+    assert _open(server.url("/start"), True) == (200, PNG)
+    assert checked == ["start", "img.png"]
+
+    with pytest.raises(BlockedAddress):
+        _open(server.url("/start?to=/private.png"), True)
+    with pytest.raises(image_fetch.RequestError, match="Too many redirects"):
+        _open(server.url("/loop"), True)
+
+
+def test_open_image_refuses_local_hosts(serve):
+    server = _serve_redirects(serve)
+    with pytest.raises(BlockedAddress):
+        _open(server.url("/img.png"), True)
+    # Library callers fetching their own URLs aren't restricted
+    assert _open(server.url("/start"), False) == (200, PNG)
+
+
+class _Rebinding:
+    """
+    A resolver answering with a public address first and loopback after.
+    """
+
+    def __init__(self):
+        self.answers = ["93.184.216.34", "127.0.0.1"]
+
+    async def resolve(self, host, port=0, family=0):
+        address = self.answers.pop(0)
+        return [{"hostname": host, "host": address, "port": port, "family": family, "proto": 0, "flags": 0}]
+
+    async def close(self):
+        pass
+
+
+def test_public_resolver_refuses_a_rebound_name():
+    resolver = PublicResolver(_Rebinding())
+
+    async def main():
+        first = await resolver.resolve("rebind.example", 80)
+        with pytest.raises(BlockedAddress):
+            await resolver.resolve("rebind.example", 80)
+        return first
+
+    assert asyncio.run(main())[0]["host"] == "93.184.216.34"
+
+
+def test_open_image_refuses_names_that_resolve_privately_at_connect(serve, monkeypatch):
+    server = _serve_redirects(serve)
+
+    # As if the check had seen a public address and the name then rebound
+    async def passed(url):
+        pass
+
+    monkeypatch.setattr(image_fetch, "check_public_url", passed)
+    with pytest.raises(BlockedAddress, match="localhost"):
+        _open(f"http://localhost:{server.port}/img.png", True)
+    # Not limited unless asked
+    assert _open(f"http://localhost:{server.port}/img.png", False) == (200, PNG)
+
+
+@pytest.fixture
+def one_at_a_time(monkeypatch):
+    monkeypatch.setitem(
+        rate_limit._host_settings, "127.0.0.1", {"initial_concurrency": 1, "max_concurrency": 1}
+    )
+
+
+def test_streams_give_back_their_pacing_place_at_the_headers(serve, one_at_a_time):
+    async def slow_body(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        await asyncio.sleep(0.5)
+        await response.write(b"x")
+        return response
+
+    server = serve({"/slow": slow_body, "/fast": slow_body})
+
+    async def main():
+        client = AsyncClient()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        async with client.stream("GET", server.url("/slow")) as first:
+            # The first body is still unread; a second stream gets its headers
+            async with client.stream("GET", server.url("/fast"), timeout=(0.3, 5)) as second:
+                headers_after = loop.time() - started
+                assert second.status_code == 200
+            assert b"".join([c async for c in first.iter_chunks()]) == b"x"
+        await client.close()
+        return headers_after
+
+    assert asyncio.run(main()) < 0.3
+
+
+def test_waiting_for_a_pacing_place_times_out(serve, one_at_a_time):
+    async def slow_headers(request):
+        await asyncio.sleep(0.5)
+        return web.Response(text="late")
+
+    server = serve({"/slow": slow_headers})
+
+    async def main():
+        client = AsyncClient()
+        first = asyncio.ensure_future(client.get(server.url("/slow")))
+        await asyncio.sleep(0.05)
+        with pytest.raises(Timeout, match="waiting"):
+            async with client.stream("GET", server.url("/slow"), timeout=(0.1, 5)):
+                pass
+        assert (await first).text == "late"
+        await client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+import json
+
+import pytest
+from aiohttp import web
+
+import rate_limit
+from image_fetch import IMAGE_HEADERS
+from image_health import check_chapters, check_pages, main
+from resilience import RetryPolicy
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(100)
+ONCE = RetryPolicy(attempts=1)
+
+
+@pytest.fixture(autouse=True)
+def fresh_image_hosts(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_image_hosts", set())
+
+
+def test_reports_each_page(serve):
+    seen = []
+
+    async def image(request):
+        seen.append((request.method, request.headers.get("Referer"), request.headers["User-Agent"]))
+        return web.Response(body=PNG, content_type="image/png")
+
+    async def page(request):
+        return web.Response(text="<html>gone</html>", content_type="text/html")
+
+    async def missing(request):
+        return web.Response(status=404)
+
+    server = serve({"/a.png": image, "/page": page, "/missing": missing})
+    results = check_pages(
+        [
+            {"img": server.url("/a.png"), "headerForImage": {"Referer": "https://site.example/"}},
+            {"img": server.url("/page")},
+            {"img": server.url("/missing")},
+            {"error": "Could not extract the page"},
+        ],
+        retry_policy=ONCE,
+    )
+
+    assert [r.ok for r in results] == [True, False, False, False]
+    assert (results[0].status, results[0].content_type, results[0].size) == (200, "image/png", len(PNG))
+    assert results[1].error == "Not an image (text/html)"
+    assert results[2].error == "HTTP 404"
+    assert results[3].error == "Could not extract the page"
+    assert seen == [("HEAD", "https://site.example/", IMAGE_HEADERS["User-Agent"])]
+    assert "127.0.0.1" in rate_limit._image_hosts
+
+
+def test_falls_back_to_a_range_get_when_head_is_refused(serve):
+    seen = []
+
+    async def image(request):
+        seen.append((request.method, request.headers.get("Range")))
+        if request.method == "HEAD":
+            return web.Response(status=405)
+        return web.Response(
+            status=206, body=PNG[:1], content_type="image/png",
+            headers={"Content-Range": f"bytes 0-0/{len(PNG)}"},
+        )
+
+    url = serve({"/a.png": image}).url("/a.png")
+    [result] = check_pages([{"img": url}], retry_policy=ONCE)
+
+    assert result.ok and result.status == 206 and result.size == len(PNG)
+    assert seen == [("HEAD", None), ("GET", "bytes=0-0")]
+
+
+def test_retries_through_the_shared_policy(serve):
+    calls = {"flaky": 0, "down": 0}
+
+    async def flaky(request):
+        calls["flaky"] += 1
+        if calls["flaky"] == 1:
+            return web.Response(status=503)
+        return web.Response(body=PNG, content_type="image/png")
+
+    async def down(request):
+        calls["down"] += 1
+        return web.Response(status=503)
+
+    server = serve({"/flaky": flaky, "/down": down})
+    policy = RetryPolicy(attempts=3, base_delay=0.01, max_delay=0.01)
+    report = check_chapters(
+        {"1": [{"img": server.url("/flaky")}], "2": [{"img": server.url("/down")}]},
+        retry_policy=policy,
+    )
+
+    assert report["1"][0].ok
+    assert report["2"][0].error == "HTTP 503"
+    assert calls == {"flaky": 2, "down": 3}
+
+
+def test_connection_errors_are_reported():
+    [result] = check_pages([{"img": "http://127.0.0.1:1/a.png"}], retry_policy=ONCE)
+    assert not result.ok and result.status is None and result.error
+
+
+def test_main_exit_status(serve, tmp_path, capsys):
+    async def image(request):
+        return web.Response(body=PNG, content_type="image/png")
+
+    server = serve({"/a.png": image})
+    good = tmp_path / "good.json"
+    good.write_text(json.dumps([{"img": server.url("/a.png")}]))
+    bad = tmp_path / "bad.json"
+    bad.write_text(json.dumps({"ch1": [{"img": server.url("/nope")}]}))
+
+    assert main([str(good)]) == 0
+    assert main([str(good), str(bad), "--failures-only", "--json"]) == 1
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["chapter"] for line in lines[1:]] == ["ch1"]
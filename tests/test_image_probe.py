@@ -0,0 +1,153 @@
+import struct
+
+import pytest
+from aiohttp import web
+
+import rate_limit
+from image_probe import SizeCache, attach_sizes, get_size_cache, parse_size, probe_sizes
+from image_store import ImageStore
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    get_size_cache().clear()
+    monkeypatch.setattr(rate_limit, "_image_hosts", set())
+    yield
+    get_size_cache().clear()
+
+
+def _png(width, height):
+    return b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\x0dIHDR" + struct.pack(">II", width, height) + bytes(20)
+
+
+def _gif(width, height):
+    return b"GIF89a" + struct.pack("<HH", width, height) + bytes(30)
+
+
+def _webp(chunk, payload):
+    return b"RIFF" + bytes(4) + b"WEBP" + chunk + struct.pack("<I", len(payload)) + payload + bytes(10)
+
+
+def _exif(orientation, order=b"II"):
+    o = "<" if order == b"II" else ">"
+    tiff = (
+        order + struct.pack(o + "HI", 42, 8)
+        + struct.pack(o + "H", 2)
+        # Another tag first, then Orientation (SHORT)
+        + struct.pack(o + "HHII", 0x010F, 2, 4, 0)
+        + struct.pack(o + "HHIH", 0x0112, 3, 1, orientation) + bytes(2)
+        + bytes(4)
+    )
+    body = b"Exif\x00\x00" + tiff
+    return b"\xff\xe1" + struct.pack(">H", len(body) + 2) + body
+
+
+def _jpeg(width, height, *segments):
+    sof = b"\xff\xc0" + struct.pack(">HBHHB", 17, 8, height, width, 3) + bytes(9)
+    return b"\xff\xd8" + b"".join(segments) + sof + b"\xff\xda" + bytes(20)
+
+
+def _app(marker, size):
+    return bytes([0xFF, marker]) + struct.pack(">H", size + 2) + bytes(size)
+
+
+def test_parse_png_gif_and_webp():
+    assert parse_size(_png(800, 1200)) == ((800, 1200), 0)
+    assert parse_size(_gif(320, 240)) == ((320, 240), 0)
+    assert parse_size(_webp(b"VP8 ", b"\x00\x00\x00\x9d\x01\x2a" + struct.pack("<HH", 640, 480))) == ((640, 480), 0)
+    bits = (1023 - 1) | ((2047 - 1) << 14)
+    assert parse_size(_webp(b"VP8L", b"\x2f" + bits.to_bytes(4, "little"))) == ((1023, 2047), 0)
+    vp8x = bytes(4) + (5000 - 1).to_bytes(3, "little") + (300 - 1).to_bytes(3, "little")
+    assert parse_size(_webp(b"VP8X", vp8x)) == ((5000, 300), 0)
+
+
+def test_parse_jpeg():
+    assert parse_size(_jpeg(1000, 1500)) == ((1000, 1500), 0)
+    # Metadata segments are skipped, and restart with fill bytes tolerated
+    assert parse_size(_jpeg(1000, 1500, _app(0xE0, 14), b"\xff", _app(0xED, 50))) == ((1000, 1500), 0)
+
+
+@pytest.mark.parametrize("order", [b"II", b"MM"])
+def test_parse_jpeg_honours_exif_orientation(order):
+    assert parse_size(_jpeg(1000, 1500, _exif(1, order))) == ((1000, 1500), 0)
+    assert parse_size(_jpeg(1000, 1500, _exif(3, order))) == ((1000, 1500), 0)
+    for orientation in (5, 6, 7, 8):
+        assert parse_size(_jpeg(1000, 1500, _exif(orientation, order))) == ((1500, 1000), 0)
+
+
+def test_parse_asks_for_more_bytes():
+    data = _jpeg(1000, 1500, _app(0xE2, 5000))
+    size, needed = parse_size(data[:4096])
+    # Enough to get past the segment, not necessarily to the end
+    assert size is None and 4096 < needed <= len(data)
+    size, further = parse_size(data[:needed])
+    assert size is None and further > needed
+    assert parse_size(data) == ((1000, 1500), 0)
+
+    # A truncated Exif segment is waited for rather than skipped
+    exif = _exif(6) + _app(0xE1, 200)
+    data = _jpeg(1000, 1500, exif)
+    size, needed = parse_size(data[:32])
+    assert size is None and needed > 32
+    assert parse_size(data) == ((1500, 1000), 0)
+
+    assert parse_size(b"\x89PNG") == (None, 30)
+    assert parse_size(b"<html>" + bytes(40)) == (None, 0)
+
+
+def test_size_cache_is_a_bounded_lru():
+    cache = SizeCache(max_entries=2)
+    cache.set("a", (1, 1))
+    cache.set("b", (2, 2))
+    assert cache.get("a") == (1, 1)
+    cache.set("c", (3, 3))
+
+    assert cache.get("b") is None
+    assert cache.get("a") == (1, 1) and cache.get("c") == (3, 3)
+    cache.clear()
+    assert cache.get("a") is None
+
+
+def test_probe_sizes_reads_ranges_and_caches(serve):
+    image = _jpeg(1000, 1500, _app(0xE2, 10_000), _exif(6))
+    seen = []
+
+    async def handler(request):
+        seen.append((request.headers.get("Range"), request.headers.get("Referer"), request.headers["User-Agent"]))
+        start, end = map(int, request.headers["Range"][len("bytes="):].split("-"))
+        return web.Response(
+            status=206, body=image[start:end + 1], content_type="image/jpeg",
+            headers={"Content-Range": f"bytes {start}-{end}/{len(image)}"},
+        )
+
+    async def page(request):
+        return web.Response(text="<html></html>", content_type="text/html")
+
+    server = serve({"/a.jpg": handler, "/page": page})
+    pages = [
+        {"img": server.url("/a.jpg"), "headerForImage": {"Referer": "https://site.example/"}},
+        {"img": server.url("/page")},
+        {"error": "no image"},
+    ]
+    assert probe_sizes(pages) == [(1500, 1000), None, None]
+    # A first range, then follow-ups past the big segment and the Exif one
+    requests = len(seen)
+    assert seen[0][0] == "bytes=0-4095" and requests > 1
+    assert {referer for _, referer, _ in seen} == {"https://site.example/"}
+    assert all(agent == "Mozilla/5.0" for _, _, agent in seen)
+    assert "127.0.0.1" in rate_limit._image_hosts
+
+    # Cached, so no further requests
+    assert attach_sizes(pages[:1])[0]["width"] == 1500
+    assert len(seen) == requests
+
+
+def test_probe_sizes_prefers_the_image_store(monkeypatch, tmp_path):
+    store = ImageStore(str(tmp_path))
+    path = store.temp_path()
+    with open(path, "wb") as f:
+        f.write(_png(12, 34))
+    store.add_file("http://images.invalid/a.png", path, "image/png")
+    monkeypatch.setattr("image_probe.get_image_store", lambda: store)
+
+    assert probe_sizes([{"img": "http://images.invalid/a.png"}]) == [(12, 34)]
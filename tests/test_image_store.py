@@ -0,0 +1,136 @@
+import os
+
+import pytest
+
+from image_store import ImageStore, ImageTooLarge
+
+
+def _put(store, url, body, content_type="image/png"):
+    path = store.temp_path()
+    with open(path, "wb") as f:
+        f.write(body)
+    return store.add_file(url, path, content_type)
+
+
+def test_writer_commits_and_get_returns_entry(tmp_path):
+    store = ImageStore(str(tmp_path), max_bytes=100)
+    writer = store.writer("http://a/1.png", "image/png", "max-age=60")
+    writer.write(b"abc")
+    writer.write(b"def")
+    entry = writer.commit()
+
+    assert store.get("http://a/1.png") == entry
+    assert entry.hits == 1
+    assert open(entry.path, "rb").read() == b"abcdef"
+    assert (entry.content_type, entry.cache_control) == ("image/png", "max-age=60")
+    assert store.size == 6
+    assert store.get("http://a/2.png") is None
+
+
+def test_lru_evicts_least_recently_read(tmp_path):
+    store = ImageStore(str(tmp_path), max_bytes=30)
+    for name in "abc":
+        _put(store, f"http://a/{name}", bytes(10))
+    store.get("http://a/a")
+    _put(store, "http://a/d", bytes(10))
+
+    assert store.get("http://a/b") is None
+    assert all(store.get(f"http://a/{name}") for name in "acd")
+    assert store.size == 30
+
+
+def test_lfu_evicts_least_often_read_and_keeps_the_new_entry(tmp_path):
+    store = ImageStore(str(tmp_path), max_bytes=30, policy="lfu")
+    for name in "abc":
+        _put(store, f"http://a/{name}", bytes(10))
+    for _ in range(3):
+        store.get("http://a/a")
+    store.get("http://a/b")
+    store.get("http://a/c")
+    store.get("http://a/c")
+
+    # Never read, but only just stored
+    new = _put(store, "http://a/d", bytes(10))
+    assert os.path.exists(new.path)
+    assert store.get("http://a/b") is None
+    # Of c (2 reads) and d (1 read now), d goes
+    _put(store, "http://a/e", bytes(10))
+    assert store.get("http://a/d") is None
+    assert store.get("http://a/a") and store.get("http://a/c") and store.get("http://a/e")
+
+
+def test_lfu_breaks_ties_by_least_recent_read(tmp_path):
+    store = ImageStore(str(tmp_path), max_bytes=20, policy="lfu")
+    _put(store, "http://a/a", bytes(10))
+    _put(store, "http://a/b", bytes(10))
+    store.get("http://a/b")
+    store.get("http://a/a")
+    _put(store, "http://a/c", bytes(10))
+
+    assert store.get("http://a/b") is None
+    assert store.get("http://a/a") is not None
+
+
+def test_refuses_bodies_larger_than_the_store(tmp_path):
+    store = ImageStore(str(tmp_path), max_bytes=10)
+    _put(store, "http://a/small", bytes(5))
+
+    writer = store.writer("http://a/big")
+    writer.write(bytes(8))
+    with pytest.raises(ImageTooLarge):
+        writer.write(bytes(8))
+    writer.abort()
+
+    path = store.temp_path()
+    with open(path, "wb") as f:
+        f.write(bytes(11))
+    with pytest.raises(ImageTooLarge):
+        store.add_file("http://a/big", path)
+    # Left for the caller, and nothing was evicted for it
+    assert os.path.exists(path)
+    assert store.get("http://a/small") is not None
+    assert store.get("http://a/big") is None
+    assert os.listdir(tmp_path / "tmp") == [os.path.basename(path)]
+
+
+def test_dedup_keeps_one_body_for_several_urls(tmp_path):
+    store = ImageStore(str(tmp_path), max_bytes=100, dedup=True)
+    first = _put(store, "http://a/1", b"same")
+    second = _put(store, "http://b/1", b"same")
+
+    assert first.path == second.path
+    assert store.size == 4 and len(store) == 2
+    # Replacing one URL's body keeps the shared one for the other
+    _put(store, "http://a/1", b"new")
+    assert open(second.path, "rb").read() == b"same"
+    assert store.size == 7
+    store.clear()
+    assert not os.path.exists(second.path)
+    assert store.size == 0
+
+
+def test_reload_rebuilds_the_index(tmp_path):
+    store = ImageStore(str(tmp_path), max_bytes=100, policy="lfu")
+    _put(store, "http://a/1", b"one")
+    _put(store, "http://a/2", b"two")
+    leftover = store.temp_path()
+    open(leftover, "wb").close()
+
+    reloaded = ImageStore(str(tmp_path), max_bytes=100, policy="lfu")
+    assert len(reloaded) == 2 and reloaded.size == 6
+    assert open(reloaded.get("http://a/2").path, "rb").read() == b"two"
+    assert not os.path.exists(leftover)
+
+    # A smaller limit evicts down to it, oldest first
+    smaller = ImageStore(str(tmp_path), max_bytes=3)
+    assert smaller.get("http://a/1") is None
+    assert smaller.get("http://a/2") is not None
+
+
+def test_accepts_only_storable_images():
+    assert ImageStore.accepts("image/webp", None)
+    assert ImageStore.accepts("application/octet-stream", "public, max-age=60")
+    assert not ImageStore.accepts("text/html; charset=utf-8", None)
+    assert not ImageStore.accepts(None, None)
+    assert not ImageStore.accepts("image/png", "no-store")
+    assert not ImageStore.accepts("image/png", "Private, max-age=0")
@@ -0,0 +1,52 @@
+import asyncio
+
+from aiohttp import web
+
+from mangadex import FEED_PAGE_SIZE, MangaDex
+
+TOTAL = 300
+
+
+def _feed_server(serve, requested):
+    async def feed(request):
+        offset = int(request.query["offset"])
+        requested.append(offset)
+        chapters = [
+            {
+                "id": f"c{n}",
+                "attributes": {"chapter": str(n), "title": None, "pages": 10},
+            }
+            for n in range(offset, min(TOTAL, offset + FEED_PAGE_SIZE))
+        ]
+        return web.json_response({"data": chapters, "total": TOTAL})
+
+    return serve({"/manga/{id}/feed": feed})
+
+
+def test_feed_pages_load_while_first_page_is_consumed(serve):
+    requested = []
+    provider = MangaDex()
+    provider.api_url = _feed_server(serve, requested).url("")
+
+    async def main():
+        stream = provider.iter_chapters_async("m1")
+        first = await stream.__anext__()
+        # Give the scheduled page requests time to run without reading on
+        await asyncio.sleep(0.5)
+        seen = list(requested)
+        await stream.aclose()
+        return first, seen
+
+    first, seen = asyncio.run(main())
+    assert first["id"] == "c0"
+    assert sorted(seen) == list(range(0, TOTAL, FEED_PAGE_SIZE))
+
+
+def test_fetch_all_chapters_keeps_feed_order(serve):
+    requested = []
+    provider = MangaDex()
+    provider.api_url = _feed_server(serve, requested).url("")
+
+    chapters = provider.fetch_all_chapters("m1")
+    assert [c["id"] for c in chapters] == [f"c{n}" for n in range(TOTAL)]
+    assert chapters[0] == {"id": "c0", "chapter": "0", "title": None, "pages": 10}
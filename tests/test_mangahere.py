@@ -0,0 +1,126 @@
+import asyncio
+
+from aiohttp import web
+
+import rate_limit
+from mangahere import MangaHere
+
+PAGES = 12
+HOST_LIMIT = 3
+
+
+def _chapter_page(pack) -> str:
+    options = "".join(f"<option>{n}</option>" for n in range(1, PAGES + 1))
+    key_script = pack("var guidkey=''+'ab'+'cd';")
+    return (
+        f"<html><body><select class='mangaread-page'>{options}</select>"
+        f"<script>var chapterid = 777;</script><script>{key_script}</script></body></html>"
+    )
+
+
+def test_pages_share_the_host_limit_across_chapters(serve, pack, monkeypatch):
+    state = {"in_flight": 0, "peak": 0, "keys": set()}
+
+    async def chapter(request):
+        return web.Response(text=_chapter_page(pack), content_type="text/html")
+
+    async def chapterfun(request):
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        state["keys"].add(request.query["key"])
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            state["in_flight"] -= 1
+        page = int(request.query["page"])
+        if page == 5:
+            return web.Response(text="")
+        script = pack(
+            f'var pix="//img.example/{request.query["cid"]}";'
+            f'var pvalue=["/{page:02}.jpg","/{page + 1:02}.jpg"];'
+        )
+        return web.Response(text=script)
+
+    server = serve({"/manga/{chapter:.+}/1.html": chapter, "/chapterfun.ashx": chapterfun})
+    provider = MangaHere()
+    provider.base_url = server.url("")
+    monkeypatch.setitem(
+        rate_limit._host_settings,
+        "127.0.0.1",
+        {"initial_concurrency": HOST_LIMIT, "max_concurrency": HOST_LIMIT},
+    )
+
+    async def main():
+        return await asyncio.gather(
+            provider.fetch_chapter_pages_async("title/c001"),
+            provider.fetch_chapter_pages_async("title/c002"),
+        )
+
+    first, second = asyncio.run(main())
+
+    assert state["peak"] <= HOST_LIMIT
+    assert state["keys"] == {"abcd"}
+    assert [page["page"] for page in first] == list(range(1, PAGES + 1))
+    assert first[0]["img"] == "https://img.example/777/01.jpg"
+    assert first[4]["img"] is None and first[4]["error"]
+    assert second[11]["img"] == "https://img.example/777/12.jpg"
+
+
+INFO_PAGE = """
+<html><body>
+<div class="detail-info-cover"><img src="/cover.jpg"></div>
+<div class="detail-info-right">
+  <span class="detail-info-right-title-font">Title</span>
+  <span class="detail-info-right-title-tip">Ongoing</span>
+  <span class="detail-info-right-title-star"><span>*</span><span>4.5</span></span>
+  <p class="detail-info-right-say"><a title="Author">Author</a></p>
+  <p class="detail-info-right-tag-list"><a title=" Action ">Action</a><a title="Drama">Drama</a></p>
+  <p class="fullcontent"> Story. </p>
+</div>
+<ul class="detail-main-list">
+  <li><a href="/manga/title/c002/1.html"><div><p class="title3">Ch.002</p><p class="title2">Jan 2</p></div></a></li>
+  <li><a href="/manga/title/c001/1.html"><div><p class="title3">Ch.001</p><p class="title2">Jan 1</p></div></a></li>
+</ul>
+</body></html>
+"""
+
+SEARCH_PAGE = """
+<html><body>
+<div class="container"><div><div><ul>
+  <li><a href="/manga/one/"><img src="/one.jpg"></a>
+      <p class="manga-list-4-item-title"><a>One</a></p>
+      <p class="manga-list-4-show-tag-list-2"><a>Completed</a></p><p>First.</p></li>
+  <li><a href="/manga/two/"><img src="/two.jpg"></a>
+      <p class="manga-list-4-item-title"><a>Two</a></p>
+      <p class="manga-list-4-show-tag-list-2"><a>Hiatus</a></p><p>Second.</p></li>
+</ul></div></div></div>
+<div class="pager-list-left"><a class="active">1</a><a>2</a></div>
+</body></html>
+"""
+
+
+def test_manga_info_and_search(serve):
+    async def info(request):
+        return web.Response(text=INFO_PAGE, content_type="text/html")
+
+    async def search(request):
+        return web.Response(text=SEARCH_PAGE, content_type="text/html")
+
+    provider = MangaHere()
+    provider.base_url = serve({"/manga/title": info, "/search": search}).url("")
+
+    manga = asyncio.run(provider.fetch_manga_info_async("title"))
+    assert (manga["title"], manga["description"], manga["image"]) == ("Title", "Story.", "/cover.jpg")
+    assert (manga["status"], manga["rating"]) == ("ONGOING", 4.5)
+    assert manga["genres"] == ["Action", "Drama"] and manga["authors"] == ["Author"]
+    assert manga["chapters"] == [
+        {"id": "title/c002/1", "title": "Ch.002", "releasedDate": "Jan 2"},
+        {"id": "title/c001/1", "title": "Ch.001", "releasedDate": "Jan 1"},
+    ]
+
+    results = asyncio.run(provider.search_async("x"))
+    assert results["hasNextPage"] is True
+    assert [(r["id"], r["title"], r["image"], r["description"], r["status"]) for r in results["results"]] == [
+        ("one", "One", "/one.jpg", "First.", "COMPLETED"),
+        ("two", "Two", "/two.jpg", "Second.", "UNKNOWN"),
+    ]
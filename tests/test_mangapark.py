@@ -0,0 +1,57 @@
+import json
+
+from aiohttp import web
+
+from mangapark import Mangapark, _iter_strings
+
+
+def test_iter_strings_walks_deep_json_in_order():
+    data = {"a": ["x", {"b": "y"}], "c": 1, "d": "z"}
+    assert list(_iter_strings(data)) == ["x", "y", "z"]
+
+    deep = "leaf"
+    for _ in range(5000):
+        deep = [deep]
+    assert list(_iter_strings(deep)) == ["leaf"]
+
+
+def test_chapter_pages_from_scripts_in_order_without_duplicates(serve):
+    state = {
+        "objs": [
+            "https://s1.example/media/1.jpg",
+            {"nested": ["https://s1.example/media/2.webp"]},
+            "https://s1.example/media/1.jpg",
+            'text with https://proxy.example/i0.wp.com/s2.example/3.png inside',
+            "https://s1.example/other/logo.png",
+        ]
+    }
+    body = (
+        f'<script type="qwik/json">{json.dumps(state)}</script>'
+        '<script>var next = "https://s1.example/media/4.gif";</script>'
+        '<script type="qwik/json">{not json</script>'
+    )
+
+    async def chapter(request):
+        return web.Response(text=body, content_type="text/html")
+
+    provider = Mangapark()
+    provider.base_url = serve({"/title/m/c-1": chapter}).url("")
+    pages = provider.fetch_chapter_pages("m/c-1")
+    assert pages == [
+        {"page": 1, "img": "https://s1.example/media/1.jpg"},
+        {"page": 2, "img": "https://s1.example/media/2.webp"},
+        {"page": 3, "img": "https://proxy.example/i0.wp.com/s2.example/3.png"},
+        {"page": 4, "img": "https://s1.example/media/4.gif"},
+    ]
+
+
+def test_chapter_pages_fall_back_to_img_tags(serve):
+    async def chapter(request):
+        return web.Response(
+            text='<img src="https://s.example/media/a.jpg"><img src="/logo.png">',
+            content_type="text/html",
+        )
+
+    provider = Mangapark()
+    provider.base_url = serve({"/title/c": chapter}).url("")
+    assert provider.fetch_chapter_pages("c") == [{"page": 1, "img": "https://s.example/media/a.jpg"}]
@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from models import Chapter, ChapterList, HeaderTable, Manga, MangaInfo, Page
+
+REFERER = {"Referer": "https://site.example/"}
+
+
+def test_header_table_stores_each_set_once():
+    table = HeaderTable()
+    assert table.add(None) == table.add({}) == 0
+    first = table.add(dict(REFERER))
+    assert table.add({"Referer": "https://site.example/"}) == first
+    assert table.share(dict(REFERER)) is table.get(first)
+    assert len(table) == 1
+    with pytest.raises(TypeError):
+        table.get(first)["Referer"] = "changed"
+
+
+def test_page_round_trip():
+    table = HeaderTable()
+    data = {"img": "https://i.example/1.jpg", "page": 1, "headerForImage": REFERER}
+    page = Page.from_dict(data, table)
+    assert page.to_dict() == data
+    assert Page.from_dict({"img": "x"}, table).to_dict() == {"img": "x", "page": None}
+
+
+def test_chapter_from_provider_keys():
+    chapter = Chapter.from_dict({"id": "c1", "chapter": "1", "releasedDate": "today", "views": "9"})
+    assert chapter == Chapter("c1", number="1", date="today")
+    assert chapter.to_dict() == {"id": "c1", "number": "1", "date": "today"}
+
+
+def test_chapter_list_builds_chapters_on_demand():
+    table = HeaderTable()
+    dicts = [
+        {"id": f"c{n}", "title": "Chapter", "num": str(n), "pages": n or None, "headerForImage": REFERER}
+        for n in range(5)
+    ]
+    chapters = ChapterList.from_dicts(dicts, table)
+    assert len(chapters) == 5
+    assert len(table) == 1
+    assert chapters[0].pages is None and chapters[4].pages == 4
+    assert chapters[-1].id == "c4"
+    assert chapters[0].headers is chapters[3].headers
+    assert [c.id for c in chapters[1:3]] == ["c1", "c2"]
+    assert [c.id for c in reversed(chapters)][0] == "c4"
+    with pytest.raises(IndexError):
+        chapters[5]
+    assert chapters.to_dicts()[2] == {
+        "id": "c2", "title": "Chapter", "number": "2", "pages": 2, "headerForImage": REFERER
+    }
+
+
+def test_manga_from_provider_dicts():
+    manga = Manga.from_dict(
+        {
+            "id": "m",
+            "img": "cover.jpg",
+            "descriptions": {"fr": "Bonjour", "en": "Hello"},
+            "altTitles": [{"ja": "Title"}, "Other"],
+            "authors": ["A"],
+            "chapters": [{"id": "c1"}],
+            "views": "100",
+        }
+    )
+    assert manga.image == "cover.jpg"
+    assert manga.description == "Hello"
+    assert manga.alt_titles == ("Title", "Other")
+    assert manga.to_dict()["chapters"] == [{"id": "c1"}]
+    assert "views" not in manga.to_dict()
+
+
+class Source:
+    """A chapter iterator factory recording the loops it ran on."""
+
+    def __init__(self, count=5):
+        self.count = count
+        self.started = 0
+        self.loops = set()
+
+    async def chapters(self):
+        self.started += 1
+        for n in range(self.count):
+            await asyncio.sleep(0.001)
+            self.loops.add(asyncio.get_running_loop())
+            yield {"id": f"c{n}"}
+
+    def __call__(self):
+        return self.chapters()
+
+
+def test_mapping_view_holds_only_loaded_data():
+    source = Source()
+    info = MangaInfo({"id": "m", "title": "T"}, source)
+
+    async def main():
+        # Reading the view inside a loop never blocks or loads
+        assert dict(info) == {"id": "m", "title": "T"}
+        assert "chapters" not in info
+        with pytest.raises(KeyError):
+            info["chapters"]
+        chapters = await info.chapters_async()
+        assert dict(info) == {"id": "m", "title": "T", "chapters": chapters}
+        return chapters
+
+    assert [c["id"] for c in asyncio.run(main())] == [f"c{n}" for n in range(5)]
+    assert len(info) == 3
+    assert source.started == 1
+
+
+def test_concurrent_loads_share_the_iterator():
+    source = Source()
+    info = MangaInfo({"id": "m"}, source)
+
+    async def main():
+        return await asyncio.gather(info.load_chapters_async(2), info.chapters_async(), info.chapters_async())
+
+    first_two, every, again = asyncio.run(main())
+    assert len(first_two) == 2 and len(every) == 5 and every is again
+    assert source.started == 1
+
+
+def test_loading_restarts_after_the_first_loop_closes():
+    source = Source()
+    info = MangaInfo({"id": "m"}, source)
+    assert len(asyncio.run(info.load_chapters_async(2))) == 2
+    assert [c["id"] for c in asyncio.run(info.chapters_async())] == [f"c{n}" for n in range(5)]
+    assert source.started == 2
+
+
+def test_other_loops_hand_loads_to_the_running_owner():
+    source = Source()
+    info = MangaInfo({"id": "m"}, source)
+    # Starts the iterator on the shared background loop
+    assert len(info.load_chapters(2)) == 2
+    chapters = asyncio.run(info.chapters_async())
+    assert [c["id"] for c in chapters] == [f"c{n}" for n in range(5)]
+    assert source.started == 1
+    assert len(source.loops) == 1
+    assert info.to_dict() == {"id": "m", "chapters": chapters}
@@ -0,0 +1,38 @@
+import pytest
+
+from packer import UnpackingError, eval_string_concat, unpack
+
+
+def test_unpack_reverses_the_symbol_table(pack):
+    source = "var pix=\"//img.example/store/manga/\";var pvalue=[\"/1/01.jpg\",\"/1/02.jpg\"];"
+    assert unpack(pack(source)) == source
+
+
+def test_unpack_handles_many_words_and_quotes(pack):
+    words = [f"w{n}" for n in range(200)]
+    source = "var s='it''s';" + "+".join(words)
+    assert unpack(pack(source)) == source
+    assert unpack(pack(source, radix=36)) == source
+
+
+def test_unpack_without_eval_prefix(pack):
+    packed = pack("var key='abc';")
+    assert unpack(packed[len("eval"):]) == "var key='abc';"
+
+
+def test_empty_symbol_means_the_word_itself():
+    packed = "}('0 1',62,2,'|b'.split('|'),0,{}))"
+    assert unpack(packed) == "0 b"
+
+
+def test_unpack_rejects_other_scripts():
+    with pytest.raises(UnpackingError):
+        unpack("var a = 1;")
+    with pytest.raises(UnpackingError):
+        unpack("}('0 1',62,3,'a|b'.split('|'),0,{}))")
+
+
+def test_eval_string_concat():
+    assert eval_string_concat("'' + 'ab' + \"cd\"+'e'") == "abcde"
+    with pytest.raises(UnpackingError):
+        eval_string_concat("'a' + b")
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+import singleflight
+from http_client import iter_sync, run_sync
+from vyvymanga import VyvyManga
+
+
+async def _exit():
+    await asyncio.sleep(0)
+    raise SystemExit("provider gave up")
+
+
+def test_run_sync_survives_system_exit():
+    with pytest.raises(RuntimeError, match="SystemExit"):
+        run_sync(_exit(), timeout=5)
+    # The shared loop is still running
+    assert run_sync(asyncio.sleep(0, result=1), timeout=5) == 1
+
+
+def test_iter_sync_survives_system_exit():
+    async def rows():
+        yield 1
+        raise SystemExit("provider gave up")
+
+    items = []
+    with pytest.raises(RuntimeError, match="SystemExit"):
+        for item in iter_sync(rows()):
+            items.append(item)
+    assert items == [1]
+    assert run_sync(asyncio.sleep(0, result=1), timeout=5) == 1
+
+
+def test_singleflight_contains_system_exit():
+    async def main():
+        with pytest.raises(RuntimeError, match="SystemExit"):
+            await singleflight.do("exit", _exit)
+        return "still running"
+
+    assert run_sync(main(), timeout=5) == "still running"
+
+
+async def _not_found(request):
+    return web.Response(status=404)
+
+
+def test_provider_http_error_is_an_ordinary_exception(serve):
+    server = serve({"/{tail:.*}": _not_found})
+    provider = VyvyManga()
+    provider.base_website_url = server.url("")
+
+    with pytest.raises(ValueError, match="404"):
+        provider.search("one piece")
+    with pytest.raises(ValueError, match="404"):
+        provider.fetch_manga_info("missing")
+    # Later blocking calls from any provider still run
+    with pytest.raises(ValueError, match="404"):
+        provider.fetch_chapter_pages(server.url("/chapter/1"))
+
+
+def test_vyvymanga_streams_chapters(serve):
+    rows = "".join(f'<a href="/c/{n}">Chapter {n}<p>Day {n}</p></a>' for n in range(3, 0, -1))
+
+    async def manga(request):
+        response = web.StreamResponse(headers={"Content-Type": "text/html"})
+        await response.prepare(request)
+        await response.write(b'<html><body><div class="list-group">')
+        await response.write(rows.encode())
+        await response.write(b"</div></body></html>")
+        return response
+
+    server = serve({"/manga/solo": manga, "/manga/missing": _not_found})
+    provider = VyvyManga()
+    provider.base_website_url = server.url("")
+
+    chapters = list(provider.iter_chapters("solo"))
+    assert [c["id"] for c in chapters] == ["/c/3", "/c/2", "/c/1"]
+    assert chapters[0] == {"id": "/c/3", "title": "Chapter 3", "releaseDate": "Day 3"}
+    with pytest.raises(ValueError, match="404"):
+        list(provider.iter_chapters("missing"))
@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+from aiohttp import web
+
+import rate_limit
+from http_client import AsyncClient
+from rate_limit import (
+    IMAGE_HOST_SETTINGS,
+    HostLimiter,
+    configure_rate_limits,
+    get_limiter,
+    mark_image_host,
+    parse_retry_after,
+)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("Thu, 01 Jan 1970 00:00:00 GMT") == 0.0
+
+
+def test_window_grows_on_healthy_responses():
+    limiter = HostLimiter(initial_concurrency=2, max_concurrency=3)
+    for _ in range(20):
+        limiter.record(200, 0.1)
+    assert limiter.limit == 3
+
+
+def test_window_backs_off_once_per_round_trip():
+    limiter = HostLimiter(initial_concurrency=8, backoff=0.5)
+    limiter.record(200, 0.1)
+    limiter.record(429, 0.1)
+    limiter.record(429, 0.1)
+    assert 4 <= limiter.limit < 5
+
+
+def test_latency_spike_counts_as_congestion():
+    limiter = HostLimiter(initial_concurrency=8, latency_tolerance=2.0)
+    limiter.record(200, 0.1)
+    limiter.record(200, 1.0)
+    assert limiter.limit < 8
+
+
+def test_retry_after_pauses_the_host():
+    limiter = HostLimiter()
+    limiter.record(503, 0.1, "0.2")
+
+    async def main():
+        started = time.monotonic()
+        await limiter.acquire()
+        await limiter.release()
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 0.15
+
+
+def test_concurrency_window_is_enforced():
+    limiter = HostLimiter(initial_concurrency=2)
+    state = {"in_flight": 0, "peak": 0}
+
+    async def request():
+        await limiter.acquire()
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        await limiter.release()
+
+    async def main():
+        await asyncio.gather(*(request() for _ in range(10)))
+
+    asyncio.run(main())
+    assert state["peak"] == 2
+
+
+def test_token_bucket_paces_requests():
+    limiter = HostLimiter(rate=20, burst=1, initial_concurrency=10)
+
+    async def main():
+        started = time.monotonic()
+        for _ in range(5):
+            await limiter.acquire()
+            await limiter.release()
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 0.18
+
+
+def test_image_hosts_get_image_settings(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_image_hosts", set(rate_limit.IMAGE_HOSTS))
+    monkeypatch.setattr(rate_limit, "_host_settings", {"cdn.example": {"max_concurrency": 20}})
+    configure_rate_limits()
+    mark_image_host("cdn.example")
+
+    async def main():
+        return get_limiter("cdn.example"), get_limiter("pages.example"), get_limiter("cdn.example")
+
+    image, page, again = asyncio.run(main())
+    assert image is again
+    assert image.limit == IMAGE_HOST_SETTINGS["initial_concurrency"]
+    assert image.max_concurrency == 20
+    assert page.limit == rate_limit.DEFAULT_SETTINGS["initial_concurrency"]
+
+
+def test_latency_is_measured_to_the_headers(serve, monkeypatch):
+    async def slow_body(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for _ in range(5):
+            await asyncio.sleep(0.1)
+            await response.write(b"x" * 1024)
+        return response
+
+    server = serve({"/big": slow_body})
+    recorded = []
+    original = HostLimiter.record
+
+    def record(self, status_code, latency, retry_after=None):
+        recorded.append(latency)
+        original(self, status_code, latency, retry_after)
+
+    monkeypatch.setattr(HostLimiter, "record", record)
+
+    async def main():
+        client = AsyncClient()
+        response = await client.get(server.url("/big"))
+        await client.close()
+        return response
+
+    response = asyncio.run(main())
+    assert len(response.content) == 5 * 1024
+    assert recorded and recorded[0] < 0.3
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+from multidict import CIMultiDict
+
+import resilience
+from http_client import ConnectError, RequestError, Timeout
+from resilience import RetryPolicy, hedge_delay, record_latency, send_with_retries
+
+RETRYABLE = (ConnectError, Timeout)
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, headers=None):
+        self.status_code = status_code
+        self.headers = CIMultiDict(headers or {})
+
+
+def _run(send, policy, host="retry.example"):
+    return asyncio.run(send_with_retries(send, host, policy, RETRYABLE, Timeout))
+
+
+@pytest.fixture(autouse=True)
+def fresh_latencies(monkeypatch):
+    monkeypatch.setattr(resilience, "_latencies", {})
+
+
+def test_backoff_stays_within_the_cap():
+    policy = RetryPolicy(base_delay=1.0, max_delay=3.0)
+    for attempt in range(10):
+        assert 0 <= policy.backoff(attempt) <= min(3.0, 2 ** attempt)
+
+
+def test_retries_statuses_until_success():
+    answers = [FakeResponse(503), FakeResponse(502), FakeResponse(200)]
+
+    async def send(timeout):
+        return answers.pop(0)
+
+    assert _run(send, RetryPolicy(base_delay=0.001)).status_code == 200
+    assert answers == []
+
+
+def test_returns_last_response_when_attempts_run_out():
+    calls = []
+
+    async def send(timeout):
+        calls.append(timeout)
+        return FakeResponse(503)
+
+    assert _run(send, RetryPolicy(attempts=2, base_delay=0.001)).status_code == 503
+    assert len(calls) == 2
+
+
+def test_retries_connection_errors():
+    errors = [ConnectError("reset"), Timeout("slow")]
+
+    async def send(timeout):
+        if errors:
+            raise errors.pop(0)
+        return FakeResponse(200)
+
+    assert _run(send, RetryPolicy(base_delay=0.001)).status_code == 200
+
+
+def test_other_request_errors_are_not_retried():
+    calls = []
+
+    async def send(timeout):
+        calls.append(timeout)
+        raise RequestError("invalid URL")
+
+    with pytest.raises(RequestError, match="invalid URL"):
+        _run(send, RetryPolicy(base_delay=0.001))
+    assert len(calls) == 1
+
+
+def test_retry_after_sets_the_minimum_delay():
+    answers = [FakeResponse(429, {"Retry-After": "0.2"}), FakeResponse(200)]
+
+    async def send(timeout):
+        return answers.pop(0)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        policy = RetryPolicy(base_delay=0.001)
+        await send_with_retries(send, "retry.example", policy, RETRYABLE, Timeout)
+        return loop.time() - started
+
+    assert asyncio.run(main()) >= 0.19
+
+
+def test_attempts_share_the_deadline():
+    timeouts = []
+
+    async def send(timeout):
+        timeouts.append(timeout)
+        await asyncio.sleep(timeout)
+        raise Timeout("slow")
+
+    with pytest.raises(Timeout, match="Deadline"):
+        _run(send, RetryPolicy(attempts=10, attempt_timeout=0.05, deadline=0.12, base_delay=0.001))
+    assert len(timeouts) < 10
+    assert sum(timeouts) <= 0.13
+
+
+def test_hedge_delay_uses_the_quantile():
+    policy = RetryPolicy(hedge_quantile=0.9, hedge_min_delay=0.0, hedge_initial_delay=5.0)
+    assert hedge_delay("h", policy) == 5.0
+    for n in range(100):
+        record_latency("h", n / 100)
+    assert hedge_delay("h", policy) == 0.9
+
+
+def test_hedged_request_wins_and_records_the_loser():
+    calls = []
+
+    async def send(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            await asyncio.sleep(5)
+        return FakeResponse(200)
+
+    policy = RetryPolicy(hedge=True, hedge_initial_delay=0.05)
+    response = _run(send, policy, host="hedge.example")
+    assert response.status_code == 200
+    assert len(calls) == 2
+    # The winner and the cancelled loser, which ran at least the hedge delay
+    samples = sorted(resilience._latencies["hedge.example"])
+    assert len(samples) == 2
+    assert samples[1] >= 0.05
+
+
+def test_no_host_means_no_samples_and_no_hedging():
+    calls = []
+
+    async def send(timeout):
+        calls.append(timeout)
+        await asyncio.sleep(0.02)
+        return FakeResponse(200)
+
+    policy = RetryPolicy(hedge=True, hedge_initial_delay=0.001)
+    response = asyncio.run(send_with_retries(send, None, policy, RETRYABLE, Timeout))
+    assert response.status_code == 200
+    assert len(calls) == 1
+    assert resilience._latencies == {}
@@ -0,0 +1,117 @@
+import pytest
+from aiohttp import web
+
+from chapmanganato import Manganato
+from mangapill import MangaPill
+from vyvymanga import VyvyManga
+
+VYVY_PAGE = """
+<html><body>
+<div class="col-md-7">
+  <h1 class="title">Solo Leveling</h1>
+  <div class="img-manga"><img src="/cover.jpg"></div>
+  <p><span class="pre-title">Authors</span> <a>Chugong</a></p>
+  <p><span class="pre-title">Status</span> <span class="text-ongoing">Completed</span></p>
+  <p><span class="pre-title">Genres</span> <a>Action</a><a>Fantasy</a></p>
+</div>
+<div class="summary"><div class="content"> Hunters. </div></div>
+<div class="list-group">
+  <a href="/c/2">Chapter 2<p>Jan 2</p></a>
+  <a href="/c/1">Chapter 1<p>Jan 1</p></a>
+</div>
+</body></html>
+"""
+
+MANGANATO_PAGE = """
+<html><body>
+<div class="panel-story-info">
+  <div class="story-info-left"><span class="info-image"><img src="/c.jpg"></span></div>
+  <div class="story-info-right">
+    <h1>Title</h1>
+    <table><tbody>
+      <tr><td class="table-value"><h2>Alt A;Alt B</h2></td></tr>
+      <tr><td class="table-value"><a>Author</a></td></tr>
+      <tr><td class="table-value">Ongoing</td></tr>
+      <tr><td class="table-value"><a>Drama</a></td></tr>
+    </tbody></table>
+    <div><p></p><p><span class="stre-value">1,234</span></p></div>
+  </div>
+</div>
+<div id="panel-story-info-description">Description : Text</div>
+<div class="container-main-left"><div class="panel-story-chapter-list"><ul>
+  <li><a href="/m/chapter-1">Chapter 1</a><span class="chapter-view text-nowrap">1,000</span>
+      <span class="chapter-time text-nowrap" title="Jan 01,2024"></span></li>
+</ul></div></div>
+</body></html>
+"""
+
+
+def test_vyvymanga_manga_info(serve):
+    async def page(request):
+        return web.Response(text=VYVY_PAGE, content_type="text/html")
+
+    provider = VyvyManga()
+    provider.base_website_url = serve({"/manga/solo": page}).url("")
+    info = provider.fetch_manga_info("solo")
+
+    assert info["title"] == "Solo Leveling"
+    assert info["img"] == "/cover.jpg"
+    assert info["authors"] == ["Chugong"]
+    assert info["status"] == "Completed"
+    assert info["genres"] == ["Action", "Fantasy"]
+    assert info["description"] == "Hunters."
+    assert [c["id"] for c in info["chapters"]] == ["/c/1", "/c/2"]
+    assert info["chapters"][0] == {"id": "/c/1", "title": "Chapter 1", "releaseDate": "Jan 1"}
+
+
+def test_manganato_manga_info(serve):
+    async def page(request):
+        return web.Response(text=MANGANATO_PAGE, content_type="text/html")
+
+    # Full URLs containing "read" are fetched as given
+    url = serve({"/read-manga": page}).url("/read-manga")
+    info = Manganato().fetch_manga_info(url)
+
+    assert info["title"] == "Title"
+    assert info["altTitles"] == ["Alt A", "Alt B"]
+    assert info["description"] == "Text"
+    assert info["authors"] == ["Author"]
+    assert info["genres"] == ["Drama"]
+    assert info["status"] == "ONGOING"
+    assert info["views"] == "1234"
+    assert info["chapters"] == [
+        {"id": "chapter-1", "title": "Chapter 1", "views": "1000", "releasedDate": "Jan 01,2024"}
+    ]
+
+
+def _assert_shared_and_read_only(pages):
+    headers = [page["headerForImage"] for page in pages]
+    assert len(pages) == 2 and headers[0] is headers[1]
+    with pytest.raises(TypeError):
+        headers[0]["Cookie"] = "a=1"
+
+
+def test_chapter_pages_share_read_only_headers(serve):
+    async def manganato(request):
+        return web.Response(
+            text="<div class='container-chapter-reader'><img src='/1.jpg' alt='1'><img src='/2.jpg' alt='2'></div>",
+            content_type="text/html",
+        )
+
+    async def mangapill(request):
+        page = "<chapter-page><div data-summary><div>page {n}/2</div></div><div><picture><img data-src='/{n}.jpg'></picture></div></chapter-page>"
+        return web.Response(text=page.format(n=1) + page.format(n=2), content_type="text/html")
+
+    server = serve({"/chapter-1": manganato, "/chapters/{id}": mangapill})
+    provider = Manganato()
+    provider.base_url = server.url("")
+    pages = provider.fetch_chapter_pages("chapter-1")
+    _assert_shared_and_read_only(pages)
+    assert pages[0]["headerForImage"] == {"Referer": server.url("/chapter-1")}
+
+    provider = MangaPill()
+    provider.base_url = server.url("")
+    pages = provider.fetch_chapter_pages("1")
+    _assert_shared_and_read_only(pages)
+    # The same mapping for every chapter
+    assert provider.fetch_chapter_pages("2")[0]["headerForImage"] is pages[0]["headerForImage"]
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+import singleflight
+from singleflight import call_key, coalesce
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    @coalesce
+    async def fetch(self, key, delay=0.05):
+        self.calls += 1
+        await asyncio.sleep(delay)
+        if key == "bad":
+            raise ValueError("bad key")
+        return {"key": key}
+
+
+def test_identical_calls_share_one_fetch():
+    counter = Counter()
+
+    async def main():
+        return await asyncio.gather(*(counter.fetch("a") for _ in range(5)), counter.fetch("b"))
+
+    results = asyncio.run(main())
+    assert counter.calls == 2
+    assert results[0] is results[4]
+    assert results[5] == {"key": "b"}
+
+
+def test_errors_are_shared():
+    counter = Counter()
+
+    async def main():
+        return await asyncio.gather(
+            counter.fetch("bad"), counter.fetch("bad"), return_exceptions=True
+        )
+
+    errors = asyncio.run(main())
+    assert counter.calls == 1
+    assert all(isinstance(e, ValueError) for e in errors)
+
+
+def test_sequential_calls_fetch_again():
+    counter = Counter()
+
+    async def main():
+        await counter.fetch("a", delay=0)
+        await counter.fetch("a", delay=0)
+
+    asyncio.run(main())
+    assert counter.calls == 2
+
+
+def test_one_caller_cancelling_does_not_cancel_the_others():
+    counter = Counter()
+
+    async def main():
+        first = asyncio.ensure_future(counter.fetch("a", delay=0.1))
+        second = asyncio.ensure_future(counter.fetch("a", delay=0.1))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == {"key": "a"}
+    assert counter.calls == 1
+
+
+def test_unhashable_arguments_are_not_shared():
+    assert call_key("P", "m", ([1],), {}) is None
+    assert call_key("P", "m", (1,), {"b": 2}) == call_key("P", "m", (1,), {"b": 2})
+
+    class Lists:
+        calls = 0
+
+        @coalesce
+        async def fetch(self, items):
+            Lists.calls += 1
+            await asyncio.sleep(0.01)
+            return len(items)
+
+    async def main():
+        provider = Lists()
+        return await asyncio.gather(provider.fetch([1]), provider.fetch([1]))
+
+    assert asyncio.run(main()) == [1, 1]
+    assert Lists.calls == 2
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(singleflight, "_enabled", False)
+    counter = Counter()
+
+    async def main():
+        await asyncio.gather(counter.fetch("a"), counter.fetch("a"))
+
+    asyncio.run(main())
+    assert counter.calls == 2
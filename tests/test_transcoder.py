@@ -0,0 +1,89 @@
+import io
+
+import pytest
+from aiohttp import web
+
+Image = pytest.importorskip("PIL.Image")
+
+import transcoder  # noqa: E402
+from transcoder import Transcoder, Variant, _transcode  # noqa: E402
+
+
+def _png(tmp_path, size=(40, 20), mode="RGBA"):
+    path = tmp_path / "source.png"
+    Image.new(mode, size).save(path, format="PNG")
+    return str(path)
+
+
+def test_variant_validation():
+    assert Variant("webp", 100).key == "100w-q80.webp"
+    assert Variant("jpeg").media_type == "image/jpeg"
+    for args in (("gif",), ("png", 0), ("png", transcoder.MAX_WIDTH + 1), ("png", None, 101)):
+        with pytest.raises(ValueError):
+            Variant(*args)
+
+
+def test_variant_refuses_formats_pillow_cannot_write(monkeypatch):
+    monkeypatch.delitem(Image.SAVE, "AVIF", raising=False)
+    with pytest.raises(ValueError, match="can't encode avif"):
+        Variant("avif")
+
+
+def test_transcode_resizes_and_converts(tmp_path):
+    source = _png(tmp_path)
+    destination = str(tmp_path / "out")
+    _transcode(source, destination, "jpeg", 10, 80)
+
+    with Image.open(destination) as image:
+        assert image.format == "JPEG"
+        assert image.size == (10, 5)
+        assert image.mode == "RGB"
+
+    # Never upscaled
+    _transcode(source, destination, "png", 400, 80)
+    with Image.open(destination) as image:
+        assert image.size == (40, 20)
+
+
+def test_transcode_raises_oserror_for_bad_sources(tmp_path, monkeypatch):
+    junk = tmp_path / "junk"
+    junk.write_bytes(b"<html>not an image</html>")
+    with pytest.raises(OSError):
+        _transcode(str(junk), str(tmp_path / "out"), "png", None, 80)
+
+    source = _png(tmp_path, size=(100, 100))
+    # Pillow raises DecompressionBombError past twice the limit
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    with pytest.raises(OSError, match="too large"):
+        _transcode(source, str(tmp_path / "out"), "png", None, 80)
+
+
+def test_transcode_raises_oserror_without_an_encoder(tmp_path, monkeypatch):
+    source = _png(tmp_path)
+    monkeypatch.setitem(transcoder.FORMATS, "webp", ("NOPE", "image/webp"))
+    with pytest.raises(OSError, match="No webp encoder"):
+        _transcode(source, str(tmp_path / "out"), "webp", None, 80)
+
+
+def test_variant_async_fetches_and_stores(serve, tmp_path):
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 32)).save(buffer, format="PNG")
+    fetched = []
+
+    async def image(request):
+        fetched.append(request.path)
+        return web.Response(body=buffer.getvalue(), content_type="image/png")
+
+    url = serve({"/a.png": image}).url("/a.png")
+    instance = Transcoder(str(tmp_path / "variants"), max_workers=1)
+    try:
+        first = instance.variant(url, Variant("png", 16))
+        second = instance.variant(url, Variant("png", 16))
+    finally:
+        instance.close()
+
+    assert first.path == second.path
+    assert first.content_type == "image/png"
+    assert fetched == ["/a.png"]
+    with Image.open(first.path) as result:
+        assert result.size == (16, 8)